@@ -0,0 +1,87 @@
+"""Benchmark columnar 'fast' sheet writer against DataFrame.to_excel
+
+Write stage (write_sheets: cells, formats, column widths) and save stage
+(ExcelWriter.close: XlsxWriter XML and zip) are timed separately.
+
+Usage:
+    python scripts/benchmarks/excel_writer.py [rows] [columns]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from easy_reports.base import ReportConfig
+from easy_reports.config import Config
+from easy_reports.excel import Excel
+
+
+def create_df(rows, columns):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f'value_{c}': rng.random(rows) * 1000 for c in range(columns)})
+    df['qty'] = rng.integers(0, 100, rows)
+    df['created'] = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        rng.integers(0, 86400 * 365, rows), unit='s'
+    )
+    df.loc[::10, 'value_0'] = np.nan
+    return df
+
+
+def create_config(path):
+    options = SimpleNamespace(
+        symbol='BENCH',
+        name='Benchmark',
+        report_path=path,
+        db_list={'db': {'url': 'sqlite://'}},
+        sql_list=[('bench', 'db')],
+    )
+    config = ReportConfig(Config(path), options)
+    config.report_arch_path.mkdir(parents=True, exist_ok=True)
+    return config
+
+
+def write(config, df, write_mode):
+    file_config = dict(config.report_rpt_config[1], filename=f'{write_mode}.xlsx')
+    file_config['write_mode'] = write_mode
+    xls = Excel(file_config, config, {'df_final': df})
+    start = time.perf_counter()
+    xls.write_sheets()
+    written = time.perf_counter() - start
+    xls.close()
+    return written, time.perf_counter() - start
+
+
+def main(rows=200000, columns=20):
+    df = create_df(rows, columns)
+    config = create_config(Path(tempfile.mkdtemp()))
+
+    t_default, t_default_total = write(config, df, 'default')
+    t_fast, t_fast_total = write(config, df, 'fast')
+    save_default = t_default_total - t_default
+    save_fast = t_fast_total - t_fast
+
+    print(f'rows={rows} columns={df.shape[1]}')
+    print(
+        f'to_excel:      {t_default:.3f} s write, {save_default:.3f} s save, '
+        f'{t_default_total:.3f} s total'
+    )
+    print(
+        f'write_columns: {t_fast:.3f} s write ({t_default / t_fast:.1f}x), '
+        f'{save_fast:.3f} s save ({save_default / save_fast:.1f}x), '
+        f'{t_fast_total:.3f} s total ({t_default_total / t_fast_total:.1f}x)'
+    )
+    # save is XlsxWriter XML serialization and zip compression of the
+    # workbook, the same for both writers
+    print(
+        'Speedup of fast mode applies to write stage (cells, formats and '
+        'column widths), save stage is the same for both modes.'
+    )
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
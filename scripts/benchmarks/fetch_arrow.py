@@ -0,0 +1,94 @@
+"""Benchmark Arrow-native fetch against pd.read_sql on local SQLite database
+
+sqlite3 driver returns row tuples, which arrow fetch mode converts to
+Arrow arrays column-wise. With duckdb_engine installed the same table is
+also fetched from DuckDB, which returns Arrow record batches natively.
+
+Usage:
+    python scripts/benchmarks/fetch_arrow.py [rows] [string_columns]
+"""
+
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+from easy_reports.data import DataCreator
+
+
+def create_db(db_path, rows, string_columns):
+    columns = [f's{i} text' for i in range(string_columns)] + ['n integer', 'x real']
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f'create table facts ({", ".join(columns)})')
+        conn.executemany(
+            f'insert into facts values ({", ".join(["?"] * len(columns))})',
+            (
+                tuple(f'value_{(r * (i + 1)) % 997}' for i in range(string_columns))
+                + (r, r / 3)
+                for r in range(rows)
+            ),
+        )
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def fetch(data, url):
+    """Time sql_to_df and sql_to_arrow of facts table, return results"""
+    sql = text('select * from facts')
+    with create_engine(url).connect() as conn:
+        t_pandas, df_pandas = timed(lambda: data.sql_to_df(sql, conn))
+        t_arrow, df_arrow = timed(lambda: data.sql_to_arrow(sql, conn))
+    return [('read_sql', t_pandas, df_pandas), ('arrow', t_arrow, df_arrow)]
+
+
+def main(rows=200000, string_columns=20):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db_path = tmp / 'bench.db'
+        create_db(db_path, rows, string_columns)
+
+        config = SimpleNamespace(
+            report_sql_list=[('facts', 'sqlite')],
+            report_db_list={'sqlite': {'url': f'sqlite:///{db_path}'}},
+            report_cache_path=tmp,
+        )
+        data = DataCreator(config=config)
+        for name, t_fetch, df in fetch(data, config.report_db_list['sqlite']['url']):
+            results.append((f'sqlite {name}', t_fetch, df))
+
+        try:
+            import duckdb
+            import duckdb_engine  # noqa: F401
+        except ImportError:
+            duckdb = None
+        if duckdb is not None:
+            duckdb_path = tmp / 'bench.duckdb'
+            with duckdb.connect(str(duckdb_path)) as conn:
+                conn.register('src', results[-1][2])
+                conn.execute('create table facts as select * from src')
+            for name, t_fetch, df in fetch(data, f'duckdb:///{duckdb_path}'):
+                results.append((f'duckdb {name}', t_fetch, df))
+
+        print(f'rows={rows} string_columns={string_columns}')
+        print(f'{"":<18}{"fetch [s]":>12}{"cache [s]":>12}{"memory [MB]":>14}')
+        for i, (name, t_fetch, df) in enumerate(results):
+            t_cache, _ = timed(lambda: df.to_parquet(tmp / f'{i}.parquet'))
+            mb = df.memory_usage(deep=True).sum() / 2**20
+            print(f'{name:<18}{t_fetch:>12.3f}{t_cache:>12.3f}{mb:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""Benchmark JoinPlanner against chained pd.merge on multi-way left joins
+
+Usage:
+    python scripts/benchmarks/join_planner.py [rows] [joins] [columns]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from easy_reports.join import JoinPlanner
+
+
+def create_df_list(rows, joins, columns):
+    rng = np.random.default_rng(0)
+    keys = rng.integers(0, rows // 10, rows)
+    base = pd.DataFrame({'key': keys, 'country': rng.choice(['PL', 'DE', 'FR'], rows)})
+    for c in range(columns):
+        base[f'base_{c}'] = rng.random(rows)
+
+    df_list = [[base, None]]
+    for j in range(joins):
+        right = pd.DataFrame({'key': np.arange(rows // 10)})
+        for c in range(columns):
+            right[f'j{j}_{c}'] = rng.random(rows // 10)
+        right[f'j{j}_name'] = [f'name_{i}' for i in range(rows // 10)]
+        df_list.append([right, ['key']])
+    return df_list
+
+
+def merge_loop(df_list):
+    df = df_list[0][0]
+    for right, keys in df_list[1:]:
+        df = pd.merge(df, right, how='left', on=keys)
+    return df
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(rows=1000000, joins=6, columns=5):
+    df_list = create_df_list(rows, joins, columns)
+
+    t_merge, expected = timed(lambda: merge_loop(df_list))
+    t_planner, df = timed(lambda: JoinPlanner().join(df_list))
+    pd.testing.assert_frame_equal(df, expected)
+
+    print(f'rows={rows} joins={joins} columns={columns}')
+    print(f'pd.merge loop: {t_merge:.3f} s')
+    print(f'JoinPlanner:   {t_planner:.3f} s ({t_merge / t_planner:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
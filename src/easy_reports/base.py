@@ -13,17 +13,15 @@ from shutil import copyfile
 from .config import Config
 from .data import DataCreator
 from .excel import ExcelCreator
-from .email import EmailCreator
+from .email import EmailCreator, EmailDispatcher
+from .email_smtplib import SMTPSessionPool, AttachmentCache
+from .engines import registry
+from .outbox import outbox_path
+from .processors import processor
 
 import traceback
 
 
-def processor(fn):
-    """Mark decoreted function as processor"""
-    fn.__processor__ = True
-    return fn
-
-
 class ReportConfig:
     """Create base config by merging default config with passed options"""
 
@@ -103,6 +101,19 @@ class ReportConfig:
                     options, 'CACHE_DIR', base_config.CACHE_DIR
                 )
 
+        # configure shared query result cache
+        self.report_query_cache_path = None
+        if getattr(base_config, 'CACHE_BASE_PATH', None):
+            self.report_query_cache_path = (
+                Path(getattr(base_config, 'CACHE_BASE_PATH')).resolve()
+                / base_config.QUERY_CACHE_DIR
+            )
+        self.report_query_cache_ttl = getattr(
+            options, 'query_cache_ttl', base_config.QUERY_CACHE_TTL
+        )
+        self.report_query_cache_max_size = base_config.QUERY_CACHE_MAX_SIZE
+        self.report_query_cache_lock_timeout = base_config.QUERY_CACHE_LOCK_TIMEOUT
+
         # configure templates path
         self.report_templ_path = getattr(options, 'templ_path', None)
         if self.report_templ_path is None:
@@ -144,7 +155,10 @@ class ReportConfig:
 
         self.report_sql_params = getattr(options, 'sql_params', None)
         # check if all db aliases declared in db_list
-        if self.report_sql_params is not None:
+        # dict of bound params is not tied to db alias
+        if self.report_sql_params is not None and not isinstance(
+            self.report_sql_params, dict
+        ):
             for i, value in enumerate(self.report_sql_params):
                 if value[1] not in self.report_db_list.keys():
                     raise ValueError(
@@ -180,6 +194,12 @@ class ReportConfig:
         self.email_user = copy.deepcopy(base_config.EMAIL_USER)
         self.email_password = copy.deepcopy(base_config.EMAIL_PASSWORD)
 
+        # configure email outbox
+        self.report_outbox = getattr(options, 'outbox', base_config.OUTBOX)
+        self.report_outbox_path = outbox_path(base_config)
+        self.report_outbox_max_attempts = base_config.OUTBOX_MAX_ATTEMPTS
+        self.report_outbox_retry_delay = base_config.OUTBOX_RETRY_DELAY
+
         # Configure Email
         self.report_email_config = getattr(options, 'email_config', None)
         if self.report_email_config is None:
@@ -241,6 +261,7 @@ class ReportBase(metaclass=ReportMetaclass):
         self.report_config = ReportConfig(base_config, self._meta)
         self.data_results = dict()
         self.logger = None
+        self.log_filepath = None
         self._setup_dirs = False
 
     def init_logger(self, logging_level=logging.INFO):
@@ -260,6 +281,7 @@ class ReportBase(metaclass=ReportMetaclass):
         if not path.exists():
             path.mkdir(parents=True)
         filepath = path / filename
+        self.log_filepath = filepath
 
         file_handler = logging.FileHandler(filepath, mode='w')
         file_handler.setFormatter(formatter)
@@ -295,9 +317,16 @@ class ReportBase(metaclass=ReportMetaclass):
         self._data = DataCreator(
             config=self.report_config, logger=self.logger, **kwargs
         )
+        self._data.track_consumers(self._processors)
         self._data.run(**kwargs)
+        if self.log_filepath is not None:
+            # query profiles are written next to run log
+            self._data.write_profile(
+                self.log_filepath.with_name(f'{self.log_filepath.stem}_profile.jsonl'),
+                report=self._meta.symbol,
+            )
         # process data
-        self._data.run_processors(self._processors)
+        self._data.run_processors(self._processors, **kwargs)
         return self._data
 
     def run_excel(self, **kwargs):
@@ -410,8 +439,27 @@ class EasyReport:
                     except ImportError as e:
                         print(e.msg)
 
+        if self.base_config.DB_WARM_UP:
+            self.warm_up()
+
         return self._reports
 
+    def warm_up(self):
+        """Open pooled connections for db aliases used by loaded reports"""
+
+        db_list = dict()
+        for rpt in self._reports:
+            for filename, db_alias, *args in rpt.report_config.report_sql_list or []:
+                db_config = rpt.report_config.report_db_list.get(db_alias)
+                db_list.setdefault(db_alias, db_config)
+        print(f'Warming up db connections: {", ".join(db_list.keys())}')
+        registry.warm_up(db_list)
+
+    def dispose_engines(self):
+        """Close all pooled db connections"""
+
+        registry.dispose()
+
     def get_rpt(self, name):
         """Get report class from modules"""
 
@@ -467,6 +515,38 @@ class EasyReport:
             self.refresh(rpt, **kwargs)
 
     def run(self, **kwargs):
-        """Run all loaded and configured reports"""
-
-        self.refresh_reports(**kwargs)
+        """Run all loaded and configured reports
+
+        Reports share one pool of SMTP sessions, closed after the run. Emails
+        are sent in background by parallel_emails threads, so next report
+        starts when emails of previous one are queued. Run ends after all
+        emails are delivered, then pooled db connections are closed.
+        """
+
+        smtp_pool = kwargs.pop('smtp_pool', None)
+        own_pool = smtp_pool is None
+        if own_pool:
+            smtp_pool = SMTPSessionPool(
+                max_messages=kwargs.get('smtp_max_messages', 100)
+            )
+        dispatcher = kwargs.pop('email_dispatcher', None)
+        own_dispatcher = dispatcher is None
+        if own_dispatcher:
+            dispatcher = EmailDispatcher(
+                max_workers=kwargs.get('parallel_emails', 1) or 1,
+                pool=smtp_pool,
+                attachment_cache=AttachmentCache(
+                    kwargs.get('attachment_zip_threshold')
+                ),
+            )
+        try:
+            self.refresh_reports(
+                smtp_pool=smtp_pool, email_dispatcher=dispatcher, **kwargs
+            )
+        finally:
+            if own_dispatcher:
+                dispatcher.close()
+                dispatcher.attachment_cache.close()
+            if own_pool:
+                smtp_pool.close()
+            self.dispose_engines()
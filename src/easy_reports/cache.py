@@ -0,0 +1,460 @@
+import io
+import os
+import re
+import json
+import time
+import uuid
+import glob
+import shutil
+import pickle
+import hashlib
+import inspect
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def remove_file(path):
+    """Remove file if it still exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def new_checksum():
+    return hashlib.blake2b(digest_size=20)
+
+
+class ChecksumFile(io.BufferedIOBase):
+    """Binary file computing checksum of content while it is written
+
+    Can be passed to writers accepting file objects, so written file is not
+    read again to get its checksum.
+    """
+
+    def __init__(self, filepath):
+        self._file = open(filepath, 'wb')
+        self._hash = new_checksum()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._hash.update(b)
+        return self._file.write(b)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._file.close()
+
+    @property
+    def checksum(self) -> str:
+        return f'blake2b:{self._hash.hexdigest()}'
+
+
+def copy_file(src, dst) -> str:
+    """Copy file, return checksum of copied content"""
+    with open(src, 'rb') as fsrc, ChecksumFile(dst) as fdst:
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    return fdst.checksum
+
+
+class FileLock:
+    """Lock shared by threads and processes based on locked file
+
+    Lock file is locked with flock (msvcrt.locking on Windows) and stores
+    pid of owner. Lock of stopped process is released by operating system,
+    so it is never left stale. TimeoutError is raised when lock is not
+    acquired in timeout seconds (None waits forever).
+    """
+
+    def __init__(self, path, timeout=600, poll_interval=0.1):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    @staticmethod
+    def lock_file(fd) -> bool:
+        """Lock open file without waiting, return False if locked by other"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def is_current(self, fd) -> bool:
+        """Check if open lock file was not removed by previous owner"""
+        if fcntl is None:
+            # open file can not be removed on Windows
+            return True
+        try:
+            return os.path.samestat(os.fstat(fd), os.stat(self.path))
+        except FileNotFoundError:
+            return False
+
+    def try_acquire(self) -> bool:
+        """Lock file without waiting, return False if locked by other"""
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        if self.lock_file(fd) and self.is_current(fd):
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            return True
+        os.close(fd)
+        return False
+
+    def acquire(self):
+        start = time.monotonic()
+        while not self.try_acquire():
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                raise TimeoutError(f'Lock {self.path.name} not acquired!')
+            time.sleep(self.poll_interval)
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            # file is removed while locked, so waiting process opening it
+            # before sees it removed
+            remove_file(self.path)
+            os.close(self._fd)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            try:
+                remove_file(self.path)
+            except PermissionError:
+                # opened by other process
+                pass
+        self._fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class QueryCache:
+    """Content-addressed cache of sql query results shared across reports
+
+    Results are stored as parquet files named by hash of query. Entries older
+    than ttl seconds are expired and least recently used entries are evicted
+    when total size exceeds max_size bytes. Query waits for concurrent run of
+    the same query at most lock_timeout seconds.
+    """
+
+    def __init__(self, path, ttl=0, max_size=0, logger=None, lock_timeout=600):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock_timeout = lock_timeout
+        self.logger = logger or logging.getLogger('dummy')
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(sql, url, params=None, session_params=None) -> str:
+        """Hash resolved sql text, bound params, session params and db url"""
+        content = json.dumps(
+            [str(sql), str(url), params or {}, session_params or []],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def filepath(self, key) -> Path:
+        return self.path / f'{key}.parquet'
+
+    def lock(self, key) -> FileLock:
+        """Lock single-flighting query of given key"""
+        return FileLock(self.path / f'{key}.lock', timeout=self.lock_timeout)
+
+    def is_expired(self, filepath) -> bool:
+        return bool(self.ttl) and time.time() - filepath.stat().st_mtime > self.ttl
+
+    def get(self, key):
+        """Get path of cached result or None if missing or expired"""
+        filepath = self.filepath(key)
+        try:
+            if self.is_expired(filepath):
+                remove_file(filepath)
+                return None
+            # access time is used for LRU eviction
+            os.utime(filepath, (time.time(), filepath.stat().st_mtime))
+        except FileNotFoundError:
+            return None
+        self.logger.debug(f'Query cache hit: {key}')
+        return filepath
+
+    def put(self, key, result) -> Path:
+        """Store DataFrame or existing parquet file as cached result"""
+        filepath = self.filepath(key)
+        tmp_filepath = self.path / f'{key}.{uuid.uuid4().hex}.tmp'
+        try:
+            if isinstance(result, Path):
+                shutil.copyfile(result, tmp_filepath)
+            else:
+                result.to_parquet(tmp_filepath)
+            os.replace(tmp_filepath, filepath)
+        finally:
+            remove_file(tmp_filepath)
+        self.logger.debug(f'Query cache stored: {key}')
+        self.evict()
+        return filepath
+
+    def evict(self):
+        """Remove expired and least recently used entries over max_size"""
+        entries = []
+        for filepath in self.path.glob('*.parquet'):
+            try:
+                if self.is_expired(filepath):
+                    remove_file(filepath)
+                else:
+                    entries.append((filepath.stat().st_atime, filepath))
+            except FileNotFoundError:
+                continue
+
+        if not self.max_size:
+            return
+        entries.sort()
+        total_size = sum(filepath.stat().st_size for _, filepath in entries)
+        for _, filepath in entries:
+            if total_size <= self.max_size:
+                break
+            total_size -= filepath.stat().st_size
+            remove_file(filepath)
+            self.logger.debug(f'Query cache evicted: {filepath.stem}')
+
+
+class CacheManifest:
+    """Manifest of result files stored in report cache folder
+
+    For each cached file format, schema, rows, bytes, checksum, hash of
+    source sql query and creation time are recorded. Checksum is computed
+    while file is written (or read once when not given) and files of
+    unchanged size and mtime are verified without reading them.
+    """
+
+    filename = 'cache_manifest.json'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @property
+    def filepath(self) -> Path:
+        return self.path / self.filename
+
+    def load(self) -> dict:
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    def get(self, name):
+        """Get manifest entry of cache file name"""
+        return self.load().get(name)
+
+    @staticmethod
+    def checksum(filepath) -> str:
+        h = new_checksum()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return f'blake2b:{h.hexdigest()}'
+
+    @staticmethod
+    def inspect(filepath, format, df=None):
+        """Get schema and row count of cache file"""
+        if format == 'parquet':
+            metadata = pq.read_metadata(filepath)
+            schema = metadata.schema.to_arrow_schema()
+            rows = metadata.num_rows
+        elif format == 'feather':
+            with pa.memory_map(str(filepath)) as source:
+                reader = pa.ipc.open_file(source)
+                schema = reader.schema
+                rows = sum(
+                    reader.get_batch(i).num_rows
+                    for i in range(reader.num_record_batches)
+                )
+        else:
+            return [[str(c), str(t)] for c, t in df.dtypes.items()], len(df)
+        return [[field.name, str(field.type)] for field in schema], rows
+
+    def record(self, filepath, format, sql_hash=None, df=None, checksum=None) -> dict:
+        """Record cache file in manifest"""
+        filepath = Path(filepath)
+        schema, rows = self.inspect(filepath, format, df)
+        stat = filepath.stat()
+        entry = {
+            'format': format,
+            'schema': schema,
+            'rows': rows,
+            'bytes': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'checksum': checksum or self.checksum(filepath),
+            'sql_hash': sql_hash,
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            manifest = self.load()
+            manifest[filepath.name] = entry
+            tmp_filepath = self.filepath.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+            with open(tmp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_filepath, self.filepath)
+        return entry
+
+    def verify(self, filepath) -> bool:
+        """Check if cache file matches checksum recorded in manifest"""
+        entry = self.get(Path(filepath).name)
+        if not entry:
+            return False
+        stat = Path(filepath).stat()
+        if entry['bytes'] != stat.st_size:
+            return False
+        if entry.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+        return entry['checksum'] == self.checksum(filepath)
+
+
+def fingerprint(value) -> str:
+    """Hash schema and content of DataFrame or any picklable value"""
+    h = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        h.update(repr([(str(c), str(t)) for c, t in value.dtypes.items()]).encode())
+        h.update(repr(value.index.names).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(value, index=True).to_numpy())
+            return h.hexdigest()
+        except TypeError:
+            # unhashable cell values like lists
+            pass
+    h.update(pickle.dumps(value))
+    return h.hexdigest()
+
+
+class ProcessorCache:
+    """Cache of processor outputs reused while inputs and code are unchanged
+
+    Key is hash of processor source code and fingerprints of its declared
+    inputs. Outputs are stored as parquet files, only latest entry of each
+    processor is kept.
+    """
+
+    def __init__(self, path, logger=None):
+        self.path = Path(path)
+        self.logger = logger or logging.getLogger('dummy')
+        self._fingerprints = dict()
+        self._lock = threading.Lock()
+
+    def input_fingerprint(self, name, value) -> str:
+        """Fingerprint of result, computed once per result object"""
+        with self._lock:
+            cached = self._fingerprints.get(name)
+            if cached is not None and cached[0] is value:
+                return cached[1]
+        digest = fingerprint(value)
+        with self._lock:
+            self._fingerprints[name] = (value, digest)
+        return digest
+
+    def make_key(self, fn, inputs):
+        """Hash processor source and inputs, None if source is not available"""
+        try:
+            source = inspect.getsource(fn)
+        except (OSError, TypeError):
+            return None
+        content = [fn.__qualname__, source] + [
+            [name, self.input_fingerprint(name, value)]
+            for name, value in sorted(inputs.items())
+        ]
+        return hashlib.sha256(json.dumps(content).encode('utf-8')).hexdigest()
+
+    def entry_path(self, fn_name, key) -> Path:
+        return self.path / f'{fn_name}__{key}.json'
+
+    def entry_files(self, fn_name) -> list:
+        """Get files of all entries of processor, not of other processors
+
+        Name of processor may contain '__' or be prefix of other processor
+        name, so files are matched by full name pattern with key.
+        """
+        pattern = re.compile(
+            rf'{re.escape(fn_name)}__[0-9a-f]{{64}}(__\d+\.parquet|\.json)'
+        )
+        return [
+            filepath
+            for filepath in self.path.glob(f'{glob.escape(fn_name)}__*')
+            if pattern.fullmatch(filepath.name)
+        ]
+
+    def get(self, fn_name, key):
+        """Get dict of cached outputs or None"""
+        try:
+            with open(self.entry_path(fn_name, key), 'r', encoding='utf-8') as f:
+                names = json.load(f)
+            return {
+                name: pd.read_parquet(self.path / f'{fn_name}__{key}__{i}.parquet')
+                for i, name in enumerate(names)
+            }
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def put(self, fn_name, key, outputs) -> bool:
+        """Store outputs if all are DataFrames storable as parquet"""
+        if not all(isinstance(v, pd.DataFrame) for v in outputs.values()):
+            self.logger.debug(f'- processor {fn_name} outputs not cached')
+            return False
+        self.path.mkdir(parents=True, exist_ok=True)
+        for filepath in self.entry_files(fn_name):
+            remove_file(filepath)
+
+        tmp_files = []
+        try:
+            for i, df in enumerate(outputs.values()):
+                filepath = self.path / f'{fn_name}__{key}__{i}.parquet'
+                tmp_filepath = filepath.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+                tmp_files.append(tmp_filepath)
+                df.to_parquet(tmp_filepath)
+                os.replace(tmp_filepath, filepath)
+        except (ValueError, TypeError, pa.ArrowException) as e:
+            self.logger.debug(f'- processor {fn_name} outputs not cached: {e}')
+            for filepath in self.path.glob(f'{fn_name}__{key}__*'):
+                remove_file(filepath)
+            return False
+        finally:
+            for tmp_filepath in tmp_files:
+                remove_file(tmp_filepath)
+
+        # entry file is written last and marks complete entry
+        with open(self.entry_path(fn_name, key), 'w', encoding='utf-8') as f:
+            json.dump(list(outputs), f)
+        return True
@@ -1,5 +1,7 @@
+import time
 import click
 from easy_reports import EasyReport
+from easy_reports.outbox import Outbox, smtp_config
 from pathlib import Path
 
 
@@ -26,6 +28,39 @@ def create(symbol):
     app.create_boilerplate(symbol)
 
 
+@cli.command("send-outbox")
+@click.option(
+    "--batch-size",
+    type=click.INT,
+    default=50,
+    show_default=True,
+    help="Number of emails taken from outbox at once",
+)
+@click.option(
+    "--interval",
+    type=click.INT,
+    default=0,
+    help="Keep sending, check outbox every INTERVAL seconds",
+)
+def send_outbox(batch_size, interval):
+    """Send emails written to outbox by reports"""
+    app = EasyReport()
+
+    if Path('settings.py').exists():
+        app.base_config.from_pyfile('settings.py')
+    outbox = Outbox.from_config(app.base_config)
+    config = smtp_config(app.base_config)
+    while True:
+        stats = outbox.send(config, batch_size=batch_size)
+        click.echo(
+            f"Sent {stats['sent']}, retried {stats['retried']}, "
+            f"failed {stats['failed']} emails from {outbox.path}"
+        )
+        if not interval:
+            break
+        time.sleep(interval)
+
+
 def main() -> None:
     cli()
 
@@ -1,14 +1,162 @@
 from datetime import datetime
 import os
-import glob
+import re
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import hashlib
 import pickle
-from functools import reduce
-import contextlib
-from sqlalchemy import create_engine, text
+from collections import Counter
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from sqlalchemy import text, event
 from pathlib import Path
 import logging
 
+from .cache import QueryCache, CacheManifest, ProcessorCache, ChecksumFile, copy_file
+from .engines import registry
+from .join import JoinPlanner
+from .dtypes import compact_dtypes, memory_usage
+from .processors import ProcessorGraph, is_declared, used_results
+from .results import ResultsStore, LazyResult
+from .profiling import QueryProfiler, STAGES
+
+
+def rows_to_array(values) -> pa.Array:
+    """Convert column of python values into Arrow array"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed python types in one column are stored as strings
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def arrow_reader(cursor, arraysize=50000):
+    """Get Arrow record batch reader of DB-API cursor, None if not supported
+
+    Drivers with native Arrow fetch (DuckDB, ADBC drivers) return result
+    columns as Arrow arrays without building Python row tuples.
+    """
+    if hasattr(cursor, 'to_arrow_reader'):
+        return cursor.to_arrow_reader(arraysize)
+    if hasattr(cursor, 'fetch_record_batch'):
+        return cursor.fetch_record_batch()
+    return None
+
+
+def is_bind_param(name) -> bool:
+    """Check if params key is bound param name, not SET statement"""
+    return isinstance(name, str) and name.isidentifier()
+
+
+def entry_options(args) -> dict:
+    """Get options dict from sql_list entry arguments following join keys"""
+    options = (args[1:2] or (None,))[0]
+    return options if isinstance(options, dict) else {}
+
+
+def unify_schemas(schemas, null_type=pa.string()) -> pa.Schema:
+    """Merge schemas of record batches fetched from one query
+
+    NULL-only columns take type from other batches or fallback to null_type.
+    Mixed integer and floating columns are promoted to float64, other
+    conflicting types to string.
+    """
+    fields = []
+    for i, field in enumerate(schemas[0]):
+        types = []
+        for schema in schemas:
+            t = schema.field(i).type
+            if not pa.types.is_null(t) and t not in types:
+                types.append(t)
+        if not types:
+            field_type = null_type
+        elif len(types) == 1:
+            field_type = types[0]
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            field_type = pa.float64()
+        else:
+            field_type = pa.string()
+        fields.append(field.with_type(field_type))
+    return pa.schema(fields, metadata=schemas[0].metadata)
+
+
+ORDER_BY = re.compile(r'order\s+by\b', re.I)
+
+
+def top_level_order_by(sql_text) -> int:
+    """Get position of ORDER BY clause ending query or -1
+
+    Clauses inside parentheses, quotes and comments are skipped.
+    """
+    depth = 0
+    position = -1
+    i = 0
+    while i < len(sql_text):
+        c = sql_text[i]
+        if c in '\'"[':
+            end = sql_text.find(']' if c == '[' else c, i + 1)
+            i = len(sql_text) if end < 0 else end + 1
+            continue
+        if sql_text.startswith('--', i):
+            end = sql_text.find('\n', i)
+            i = len(sql_text) if end < 0 else end + 1
+            continue
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0 and ORDER_BY.match(sql_text, i):
+            if i == 0 or not (sql_text[i - 1].isalnum() or sql_text[i - 1] == '_'):
+                position = i
+        i += 1
+    return position
+
+
+def incremental_sql(sql_text, column, dialect) -> str:
+    """Wrap query in filter of rows with column greater than :watermark
+
+    Trailing semicolon is removed and column is quoted for dialect. MSSQL
+    does not allow ORDER BY in derived table without TOP or OFFSET, so such
+    ending ORDER BY is dropped.
+    """
+    sql_text = sql_text.strip().rstrip(';').rstrip()
+    if dialect.name == 'mssql':
+        position = top_level_order_by(sql_text)
+        # ORDER BY with TOP or OFFSET is allowed and limits rows
+        limited = re.match(
+            r'\s*select\s+(distinct\s+)?top\b', sql_text, re.I
+        ) or re.search(r'\boffset\b', sql_text[position:], re.I)
+        if position >= 0 and not limited:
+            sql_text = sql_text[:position].rstrip()
+    column = dialect.identifier_preparer.quote(column)
+    return f'SELECT * FROM (\n{sql_text}\n) wm_src WHERE wm_src.{column} > :watermark'
+
+
+def partition_max(filepath, column):
+    """Get max of column in parquet file from row group statistics
+
+    Column is read only when statistics are missing.
+    """
+    metadata = pq.read_metadata(filepath)
+    index = metadata.schema.to_arrow_schema().get_field_index(column)
+    values = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(index).statistics
+        if statistics is None or not statistics.has_min_max:
+            if (
+                statistics is not None
+                and statistics.null_count == statistics.num_values
+            ):
+                continue
+            table = pq.read_table(filepath, columns=[column])
+            return pc.max(table.column(column)).as_py()
+        values.append(statistics.max)
+    return max(values) if values else None
+
 
 class DataCreator:
     def __init__(self, config=None, logger=None, **kwargs):
@@ -25,10 +173,32 @@ class DataCreator:
         self.config = config
         self.logger = logger or logging.getLogger('dummy')
         self.db_conn = dict()
+        self._session_params_set = set()
         self.email_placeholders = dict()
-        self.results = dict()
+        self.results = ResultsStore(self.logger)
         self.from_cache = kwargs.get('from_cache', False)
         self.cache_format = kwargs.get('cache_format', 'parquet')
+        self.stream_results = kwargs.get('stream_results', False)
+        self.chunksize = kwargs.get('chunksize', 50000)
+        self.fetch_mode = kwargs.get('fetch_mode', 'pandas')
+        self.manifest = CacheManifest(config.report_cache_path)
+        self.profiler = QueryProfiler()
+        self._connect_times = dict()
+        # processors of report, set by track_consumers
+        self.processors = None
+
+        # shared query result cache is enabled by QUERY_CACHE_TTL
+        self.query_cache = None
+        query_cache_path = getattr(config, 'report_query_cache_path', None)
+        query_cache_ttl = getattr(config, 'report_query_cache_ttl', 0)
+        if query_cache_path and query_cache_ttl:
+            self.query_cache = QueryCache(
+                query_cache_path,
+                ttl=query_cache_ttl,
+                max_size=getattr(config, 'report_query_cache_max_size', 0),
+                lock_timeout=getattr(config, 'report_query_cache_lock_timeout', 600),
+                logger=self.logger,
+            )
 
         # check if all db aliases from sql_list are present in db_list
         if self.from_cache == False:
@@ -44,26 +214,54 @@ class DataCreator:
             conn = f[1]
             if conn not in self.db_conn:
                 self.logger.debug(f'Connecting db: {conn}')
-                url = self.config.report_db_list.get(conn).get('url')
-                self.db_conn[conn] = create_engine(url).connect()
+                db_config = self.config.report_db_list.get(conn)
+                start = time.perf_counter()
+                self.db_conn[conn] = registry.connect(db_config)
+                # connect time is profiled with first query of db alias
+                self._connect_times[conn] = time.perf_counter() - start
 
     def close_db_conn(self):
         self.logger.debug('Closing db connections...')
         for alias in self.db_conn:
             self.logger.debug(f'Closing db: {self.db_conn[alias]}')
+            if alias in self._session_params_set:
+                # do not return connection with session state to pool
+                self.db_conn[alias].invalidate()
             self.db_conn[alias].close()
+        self._session_params_set = set()
 
-    def read_from_cache(self, filename, format='parquet'):
+    def read_from_cache(self, filename, format='parquet', columns=None):
+        """Read cache file, parquet and feather files are memory-mapped
+
+        Only passed columns are decoded. Uncompressed feather (Arrow IPC)
+        files are read without copying.
+        """
         filepath = self.config.report_cache_path / f'{filename}.{format}'
+        types_mapper = pd.ArrowDtype if self.fetch_mode == 'arrow' else None
         if format == 'parquet':
-            df = pd.read_parquet(filepath)
+            if types_mapper:
+                df = pq.read_table(
+                    filepath, columns=columns, memory_map=True
+                ).to_pandas(types_mapper=types_mapper)
+            else:
+                df = pd.read_parquet(filepath, columns=columns, memory_map=True)
+        elif format == 'feather':
+            table = feather.read_table(filepath, columns=columns, memory_map=True)
+            df = table.to_pandas(types_mapper=types_mapper)
         elif format == 'csv':
-            df = pd.read_csv(filepath, delimiter=';', decimal=',', encoding='utf-8')
+            df = pd.read_csv(
+                filepath, delimiter=';', decimal=',', encoding='utf-8', usecols=columns
+            )
         else:
             raise AttributeError(f'Unsupported cache file format: {format}')
         self.logger.debug(f'Read cache file: {filename}.{format}')
         return df
 
+    @property
+    def profile(self) -> dict:
+        """Profiles of sql_list queries of last run"""
+        return self.profiler.queries
+
     def get_email_placeholders(self):
         return self.email_placeholders
 
@@ -73,42 +271,455 @@ class DataCreator:
         return sql
 
     def sql_to_df(self, sql, conn):
-        df = pd.read_sql(sql, con=conn)
+        """Fetch sql query result into DataFrame with pd.read_sql
+
+        Statement execution is profiled as execute stage, rest of read_sql
+        (fetch of rows and DataFrame construction) as fetch stage.
+        """
+        timer = {'execute': 0.0}
+
+        def before_execute(*args):
+            timer['start'] = time.perf_counter()
+
+        def after_execute(*args):
+            timer['execute'] += time.perf_counter() - timer['start']
+
+        event.listen(conn, 'before_cursor_execute', before_execute)
+        event.listen(conn, 'after_cursor_execute', after_execute)
+        start = time.perf_counter()
+        try:
+            df = pd.read_sql(sql, con=conn)
+        finally:
+            event.remove(conn, 'before_cursor_execute', before_execute)
+            event.remove(conn, 'after_cursor_execute', after_execute)
+        self.profiler.add('execute', timer['execute'])
+        self.profiler.add('fetch', time.perf_counter() - start - timer['execute'])
         return df
 
-    def write_to_cache(self, df, filename, format='parquet'):
+    def iter_record_batches(self, sql, conn, arraysize=50000, fetch_mode='pandas'):
+        """Fetch sql query result with fetchmany into Arrow record batches
+
+        Rows are fetched with server side cursor (SSCursor on MySQL).
+        In 'arrow' fetch mode batches are taken straight from drivers with
+        native Arrow fetch (see arrow_reader), rows of other drivers are
+        converted column-wise into Arrow arrays, skipping pandas object
+        dtype inference.
+        """
+        with self.profiler.stage('execute'):
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=arraysize
+            ).execute(sql)
+        columns = list(result.keys())
+        reader = None
+        if fetch_mode == 'arrow':
+            reader = arrow_reader(result.cursor, arraysize)
+        empty = True
+        partitions = (
+            iter(reader) if reader is not None else result.partitions(arraysize)
+        )
+        try:
+            while True:
+                with self.profiler.stage('fetch'):
+                    rows = next(partitions, None)
+                if rows is None:
+                    break
+                empty = False
+                if reader is not None:
+                    yield rows
+                    continue
+                with self.profiler.stage('frame'):
+                    if fetch_mode == 'arrow':
+                        batch = pa.RecordBatch.from_arrays(
+                            [rows_to_array(col) for col in zip(*rows)], names=columns
+                        )
+                    else:
+                        df = pd.DataFrame.from_records(
+                            rows, columns=columns, coerce_float=True
+                        )
+                        batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+                yield batch
+        finally:
+            result.close()
+
+        if empty and reader is not None:
+            yield pa.RecordBatch.from_pylist([], schema=reader.schema)
+        elif empty:
+            yield pa.RecordBatch.from_arrays(
+                [pa.array([], pa.string()) for _ in columns], names=columns
+            )
+
+    def sql_to_arrow(self, sql, conn, arraysize=50000) -> pd.DataFrame:
+        """Fetch sql query result into Arrow-backed DataFrame"""
+        batches = list(self.iter_record_batches(sql, conn, arraysize, 'arrow'))
+        with self.profiler.stage('frame'):
+            schema = unify_schemas([b.schema for b in batches])
+            table = pa.concat_tables(
+                [pa.Table.from_batches([batch]).cast(schema) for batch in batches]
+            )
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    def sql_to_cache(
+        self, sql, conn, filename, chunksize=50000, fetch_mode='pandas', sql_hash=None
+    ) -> Path:
+        """Stream sql query result in chunks straight into parquet cache file
+
+        Each chunk is appended to the parquet file, so peak memory is bounded
+        by chunksize rather than result size. Column types are widened when
+        later chunk does not fit them (NULL-only, integer then float), and
+        already written chunks are rewritten. Columns with only NULLs in all
+        chunks are written as strings.
+        """
         path = self.config.report_cache_path
         if not path.exists():
             path.mkdir(parents=True)
 
-        filepath = path / f'{filename}.{format}'
+        filepath = path / f'{filename}.parquet'
+        sink = None
+        writer = None
+        try:
+            for batch in self.iter_record_batches(sql, conn, chunksize, fetch_mode):
+                with self.profiler.stage('cache_write'):
+                    if writer is None:
+                        schema = unify_schemas([batch.schema], pa.null())
+                    else:
+                        schema = unify_schemas([writer.schema, batch.schema], pa.null())
+                    if writer is None or not schema.equals(writer.schema):
+                        sink, writer = self.rewrite_cache_file(
+                            filepath, schema, sink, writer
+                        )
+                    writer.write_table(
+                        pa.Table.from_batches([batch]).cast(writer.schema)
+                    )
+            with self.profiler.stage('cache_write'):
+                schema = unify_schemas([writer.schema])
+                if not schema.equals(writer.schema):
+                    sink, writer = self.rewrite_cache_file(
+                        filepath, schema, sink, writer
+                    )
+        finally:
+            with self.profiler.stage('cache_write'):
+                if writer is not None:
+                    writer.close()
+                if sink is not None:
+                    sink.close()
 
-        if format == 'parquet':
-            df.to_parquet(filepath)
-        elif format == 'csv':
-            df.to_csv(filepath, sep=';', index=False, decimal=',', encoding='utf-8')
+        with self.profiler.stage('cache_write'):
+            self.manifest.record(
+                filepath, 'parquet', sql_hash, checksum=getattr(sink, 'checksum', None)
+            )
+        self.logger.debug(f'Zapisano plik cache: {filename}.parquet')
+        return filepath
+
+    def rewrite_cache_file(self, filepath, schema, sink=None, writer=None):
+        """Open parquet writer of schema, copying rows already written
+
+        Already written file is closed and its row groups are cast to schema
+        one by one. Returns new checksum file and parquet writer.
+        """
+        tmp_filepath = None
+        if writer is not None:
+            writer.close()
+            sink.close()
+            tmp_filepath = filepath.with_suffix('.tmp')
+            os.replace(filepath, tmp_filepath)
+            self.logger.debug(f'Widened schema of {filepath.name}: {schema}')
+        sink = ChecksumFile(filepath)
+        writer = pq.ParquetWriter(sink, schema)
+        if tmp_filepath is not None:
+            try:
+                written = pq.ParquetFile(tmp_filepath)
+                for i in range(written.num_row_groups):
+                    writer.write_table(written.read_row_group(i).cast(schema))
+                written.close()
+            finally:
+                tmp_filepath.unlink()
+        return sink, writer
+
+    def load_df(self, value) -> pd.DataFrame:
+        """Return DataFrame, reading it from cache file if result was streamed"""
+        if isinstance(value, Path):
+            self.logger.debug(f'Read cache file: {value.name}')
+            if self.fetch_mode == 'arrow':
+                return pq.read_table(value).to_pandas(types_mapper=pd.ArrowDtype)
+            return pd.read_parquet(value)
+        return value
+
+    def extract(self, filename, db_alias, conn, **kwargs):
+        """Run sql query of sql_list entry
+
+        Returns DataFrame or, when streaming, path of parquet cache file.
+        When query cache is enabled, same query run by any report is taken
+        from cache and concurrent runs of it wait for the first one.
+        """
+        sql = self.bind_params(text(self.sql_from_file(filename)), **kwargs)
+        watermark = self.get_sql_options(filename).get('watermark')
+        if watermark:
+            return self.extract_incremental(
+                sql, filename, db_alias, conn, watermark, **kwargs
+            )
+        if self.query_cache is None or not kwargs.get('query_cache', True):
+            return self.fetch(sql, filename, db_alias, conn, **kwargs)
+
+        key = self.query_cache.make_key(
+            sql,
+            self.config.report_db_list.get(db_alias).get('url'),
+            params=self.get_bind_params(sql, **kwargs),
+            session_params=self.get_session_params(db_alias, **kwargs),
+        )
+        try:
+            with self.query_cache.lock(key):
+                filepath = self.query_cache.get(key)
+                if filepath is not None:
+                    try:
+                        return self.load_cached_query(filename, filepath, **kwargs)
+                    except FileNotFoundError:
+                        # entry evicted by concurrent run of other query
+                        self.logger.debug(f'Query cache entry {key} removed')
+                result = self.fetch(sql, filename, db_alias, conn, **kwargs)
+                self.query_cache.put(key, result)
+                return result
+        except TimeoutError as e:
+            self.logger.warning(f'{e} Query {filename} run without query cache.')
+            return self.fetch(sql, filename, db_alias, conn, **kwargs)
+
+    def load_cached_query(self, filename, filepath, **kwargs):
+        """Get result of query from query cache file"""
+        if self.is_streamed(**kwargs):
+            cache_filepath = (
+                self.config.report_cache_path / f'df_{filename}__cache.parquet'
+            )
+            checksum = copy_file(filepath, cache_filepath)
+            self.manifest.record(
+                cache_filepath, 'parquet', self.sql_hash(filename), checksum=checksum
+            )
+            result = cache_filepath
+        else:
+            result = self.load_df(filepath)
+        self.logger.info(f'Query {filename} result taken from query cache')
+        self.profiler.record(query_cache_hit=True)
+        return result
+
+    def get_sql_options(self, filename) -> dict:
+        """Get options dict of sql_list entry"""
+        for name, db_alias, *args in self.config.report_sql_list:
+            if name == filename:
+                return entry_options(args)
+        return {}
+
+    def dataset_path(self, filename) -> Path:
+        """Get path of partitioned parquet dataset of incremental query"""
+        return self.config.report_cache_path / f'df_{filename}__dataset'
+
+    def get_watermark(self, filename, column):
+        """Get high-water mark of column stored in dataset of incremental query"""
+        path = self.dataset_path(filename)
+        values = [
+            partition_max(part, column)
+            for part in (path.glob('*.parquet') if path.exists() else [])
+        ]
+        values = [value for value in values if value is not None]
+        return max(values) if values else None
+
+    def extract_incremental(self, sql, filename, db_alias, conn, column, **kwargs):
+        """Fetch rows newer than stored watermark and append them to dataset
+
+        New rows are written as next partition of parquet dataset.
+        Returns path of dataset with full result.
+        """
+        watermark = self.get_watermark(filename, column)
+        if watermark is not None:
+            self.logger.info(f'Fetching {filename} rows with {column} > {watermark}')
+            sql = self.bind_params(
+                text(incremental_sql(sql.text, column, conn.dialect)),
+                **kwargs,
+            ).bindparams(watermark=watermark)
+
+        kwargs['stream_results'] = False
+        df = self.load_df(self.fetch(sql, filename, db_alias, conn, **kwargs))
+
+        path = self.dataset_path(filename)
+        path.mkdir(parents=True, exist_ok=True)
+        parts = sorted(path.glob('*.parquet'))
+        if not len(df) and parts:
+            return path
+
+        # empty partitions only keep columns until first rows are fetched
+        for part in parts:
+            if len(df) and pq.read_metadata(part).num_rows == 0:
+                part.unlink()
+        parts = [part for part in parts if part.exists()]
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if parts:
+            schema = pq.read_schema(parts[0])
         else:
+            schema = unify_schemas([table.schema])
+        partname = f'part-{datetime.now():%Y%m%d%H%M%S%f}.parquet'
+        pq.write_table(table.cast(schema), path / partname)
+        self.logger.debug(f'Appended {len(df)} rows to {path.name}/{partname}')
+        return path
+
+    def is_streamed(self, **kwargs) -> bool:
+        """Check if query results are streamed into parquet cache"""
+        stream_results = kwargs.get('stream_results', self.stream_results)
+        cache_format = kwargs.get('cache_format', self.cache_format)
+        return bool(stream_results) and cache_format == 'parquet'
+
+    def fetch(self, sql, filename, db_alias, conn, **kwargs):
+        """Fetch sql query result from database"""
+        # fetchmany arraysize can be tuned per db alias in db_list
+        chunksize = self.config.report_db_list.get(db_alias, {}).get(
+            'arraysize', kwargs.get('chunksize', self.chunksize)
+        )
+        if self.is_streamed(**kwargs):
+            return self.sql_to_cache(
+                sql,
+                conn,
+                f'df_{filename}__cache',
+                chunksize,
+                self.fetch_mode,
+                self.sql_hash(filename),
+            )
+        if kwargs.get('stream_results', self.stream_results):
+            self.logger.warning(
+                f'Streaming supported only for parquet cache. '
+                f'Query {filename} loaded at once.'
+            )
+        if self.fetch_mode == 'arrow':
+            return self.sql_to_arrow(sql, conn, chunksize)
+        return self.sql_to_df(sql=sql, conn=conn)
+
+    def write_to_cache(self, df, filename, format='parquet', sql_hash=None):
+        path = self.config.report_cache_path
+        if not path.exists():
+            path.mkdir(parents=True)
+
+        filepath = path / f'{filename}.{format}'
+        if format not in ('parquet', 'feather', 'csv'):
             raise AttributeError(f'Unsupported cache file format: {format}')
+
+        with ChecksumFile(filepath) as f:
+            if format == 'parquet':
+                df.to_parquet(f)
+            elif format == 'feather':
+                # uncompressed Arrow IPC file can be memory-mapped without copying
+                feather.write_feather(df, f, compression='uncompressed')
+            else:
+                df.to_csv(
+                    f, sep=';', index=False, decimal=',', encoding='utf-8', mode='wb'
+                )
+        self.manifest.record(filepath, format, sql_hash, df, checksum=f.checksum)
         self.logger.debug(f'Zapisano plik cache: {filename}.{format}')
         return filepath
 
-    def load_from_cache(self, format='parquet'):
+    def sql_hash(self, filename) -> str:
+        """Get hash of sql query file"""
+        sql = self.sql_from_file(filename)
+        return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+    def check_cache_stale(self, filename, format='parquet'):
+        """Warn if sql query changed since its result was cached
+
+        Cache file not matching checksum recorded in manifest (changed or
+        truncated after it was written) is not loaded.
+        """
+        name = f'df_{filename}__cache.{format}'
+        entry = self.manifest.get(name)
+        if entry is None:
+            self.logger.warning(f'Cache file of {filename} missing in manifest')
+            return
+        if not self.manifest.verify(self.config.report_cache_path / name):
+            raise ValueError(
+                f'Cache file {name} does not match its checksum, it was changed '
+                f'since {entry["created"]}!'
+            )
+        if entry.get('sql_hash') and entry['sql_hash'] != self.sql_hash(filename):
+            self.logger.warning(
+                f'Cache file of {filename} is stale, sql query changed since '
+                f'{entry["created"]}'
+            )
+
+    def cache_columns(self, format='parquet') -> dict:
+        """Get columns of sql_list results read by report sheets
+
+        Columns are taken from output_columns of sheets with data_src of
+        sql_list result or df_final. Join keys and columns present in more
+        results (suffixed by merge) are always read. Results read by
+        processors, by sheets without output_columns or not read by any
+        sheet are read whole.
+        """
+        names = [f'df_{filename}' for filename, *_ in self.config.report_sql_list]
+        if self.processors is None:
+            return dict()
+        for fn in self.processors:
+            if not is_declared(fn) or set(fn.__inputs__) & {'df_final', *names}:
+                return dict()
+
+        wanted = {name: set() for name in names}
+        for file_config in self.config.report_rpt_config.values():
+            for sheet_config in (file_config.get('sheets') or {}).values():
+                data_src = sheet_config.get('data_src')
+                targets = names if data_src == 'df_final' else [data_src]
+                output_columns = sheet_config.get('output_columns') or []
+                for name in targets:
+                    if name not in wanted or wanted[name] is None:
+                        continue
+                    if output_columns:
+                        wanted[name].update(output_columns)
+                    else:
+                        wanted[name] = None
+
+        keys = set()
+        for _, _, *args in self.config.report_sql_list:
+            dfjoin = (args[0:1] or (None,))[0]
+            keys.update([dfjoin] if isinstance(dfjoin, str) else dfjoin or [])
+        schemas = dict()
+        for name in names:
+            entry = self.manifest.get(f'{name}__cache.{format}')
+            if entry is not None:
+                schemas[name] = [column for column, _ in entry['schema']]
+        counts = Counter(c for schema in schemas.values() for c in set(schema))
+        shared = {c for c, count in counts.items() if count > 1}
+
+        columns = dict()
+        for name, schema in schemas.items():
+            if not wanted[name]:
+                continue
+            kept = [c for c in schema if c in wanted[name] | keys | shared]
+            if len(kept) < len(schema):
+                columns[name] = kept
+        return columns
+
+    def load_from_cache(self, format='parquet', columns=None):
+        """Load sql_list results from cache files
+
+        Results are lazy and cache files are read on first access. Columns
+        to decode can be limited by passing dict of
+        {dataframe name: list of columns}.
+        """
         self.logger.debug('Reading cache files...')
-        self.email_placeholders = pickle.load(
-            open(os.path.join(self.cache_dir, 'email_placeholders__cache.pickle'), 'rb')
-        )
+        path = self.config.report_cache_path
+        with open(path / 'email_placeholders__cache.pickle', 'rb') as f:
+            self.email_placeholders = pickle.load(f)
 
-        cache_files = [
-            f for f in glob.glob(os.path.join(self.cache_dir, f'*__cache.{format}'))
-        ]
         # read only known files from sql list
         for filename, db_alias, *args in self.config.report_sql_list:
-            filename = f'df_{filename}__cache'
             dfname = f'df_{filename}'
-            if args:
-                dfjoin = (args[0:1] or (None,))[0]
-
-            self.results[dfname] = [self.read_from_cache(filename, format), dfjoin]
+            dfjoin = (args[0:1] or (None,))[0]
+            if entry_options(args).get('watermark'):
+                # incremental results are kept in partitioned dataset
+                value = self.dataset_path(filename)
+            else:
+                self.check_cache_stale(filename, format)
+                value = LazyResult(
+                    partial(
+                        self.read_from_cache,
+                        f'{dfname}__cache',
+                        format,
+                        (columns or {}).get(dfname),
+                    )
+                )
+            self.results[dfname] = [value, dfjoin]
 
     def save_to_cache(self):
         self.logger.debug('Writing cache files...')
@@ -122,19 +733,75 @@ class DataCreator:
 
         for result_df_name, result_df in self.results.items():
             if isinstance(result_df, pd.DataFrame):
-                self.write_to_cache(result_df, f'{result_df_name}__cache')
+                self.write_to_cache(
+                    result_df, f'{result_df_name}__cache', self.cache_format
+                )
             elif type(result_df) is list:
-                self.write_to_cache(result_df[0], f'{result_df_name}__cache')
+                # streamed results are already written to cache
+                if not isinstance(result_df[0], Path):
+                    filename = result_df_name.removeprefix('df_')
+                    with self.profiler.stage('cache_write', filename):
+                        self.write_to_cache(
+                            result_df[0],
+                            f'{result_df_name}__cache',
+                            self.cache_format,
+                            self.sql_hash(filename),
+                        )
             else:
                 raise ValueError(
                     'Value of result_df variable is neither DataFrame nor List of Dataframe and list of ON fileds!'
                 )
+            if not isinstance(result_df, list) or not isinstance(result_df[0], Path):
+                # released result can be read again from cache file
+                self.results.back(
+                    result_df_name,
+                    partial(
+                        self.read_from_cache,
+                        f'{result_df_name}__cache',
+                        self.cache_format,
+                    ),
+                )
+
+    def get_bind_params(self, sql=None, **kwargs) -> dict:
+        """Get bound params of definition and run params
+
+        Bound params are declared as dict in Meta.sql_params and passed in
+        run params under names which are valid identifiers. When sql is
+        passed only params used in it are returned.
+        """
+        params = dict()
+        if isinstance(self.config.report_sql_params, dict):
+            params.update(self.config.report_sql_params)
+        for name, value in (kwargs.get('params', None) or {}).items():
+            if is_bind_param(name):
+                params[name] = value
+        if sql is not None:
+            names = sql.compile().params
+            params = {k: v for k, v in params.items() if k in names}
+        return params
+
+    def bind_params(self, sql, **kwargs):
+        """Bind params used in sql text"""
+        params = self.get_bind_params(sql, **kwargs)
+        return sql.bindparams(**params) if params else sql
+
+    def get_legacy_params(self, **kwargs) -> list:
+        """Get (SET statement, db alias) session params of definition and run"""
+        params = []
+        if not isinstance(self.config.report_sql_params, dict):
+            params += list(self.config.report_sql_params or [])
+        params += [
+            f
+            for f in (kwargs.get('params', None) or {}).items()
+            if not is_bind_param(f[0])
+        ]
+        return params
 
     def set_def_params(self):
         """Set SQL params defined in report definition file"""
         if self.config.report_sql_params is None:
             return
-        for f in self.config.report_sql_params:
+        for f in self.get_legacy_params():
             if f[1] == 'mssql':
                 self.logger.error('Setting run params for MSSQL not working. Tested.')
             else:
@@ -142,12 +809,15 @@ class DataCreator:
                 conn = self.db_conn.get(f[1])
                 conn.execute(text(f[0]))
                 conn.commit()
+                self._session_params_set.add(f[1])
 
     def set_run_params(self, **kwargs):
         """Set SQL params passed as kwargs to run method"""
         params = kwargs.get('params', None)
         if params:
             for f in params.items():
+                if is_bind_param(f[0]):
+                    continue
                 if f[1] == 'mssql':
                     self.logger.error(
                         'Setting run params for MSSQL not working. Tested.'
@@ -157,40 +827,182 @@ class DataCreator:
                     conn = self.db_conn.get(f[1])
                     conn.execute(text(f[0]))
                     conn.commit()
+                    self._session_params_set.add(f[1])
+
+    def get_session_params(self, db_alias, **kwargs) -> list:
+        """Get definition and run SQL params statements of db alias"""
+        return [f[0] for f in self.get_legacy_params(**kwargs) if f[1] == db_alias]
+
+    def set_session_params(self, conn, db_alias, **kwargs) -> bool:
+        """Set definition and run SQL params on single connection of db alias
+
+        Returns True if any session param was set on connection.
+        """
+        session_set = False
+        for param in self.get_session_params(db_alias, **kwargs):
+            if db_alias == 'mssql':
+                self.logger.error('Setting run params for MSSQL not working. Tested.')
+            else:
+                self.logger.debug(f'Sets SQL params: {param}')
+                conn.execute(text(param))
+                conn.commit()
+                session_set = True
+        return session_set
+
+    def run_query(self, filename, db_alias, **kwargs):
+        """Run single sql query on its own pooled connection"""
+        self.logger.info(f'Running sql query: {filename}')
+        db_config = self.config.report_db_list.get(db_alias)
+        with self.profiler.query(filename, db_alias):
+            with self.profiler.stage('connect'):
+                conn = registry.connect(db_config)
+            with conn:
+                with self.profiler.stage('connect'):
+                    session_set = self.set_session_params(conn, db_alias, **kwargs)
+                try:
+                    return self.extract(filename, db_alias, conn, **kwargs)
+                finally:
+                    if session_set:
+                        # do not return connection with session state to pool
+                        conn.invalidate()
+
+    def run_queries_parallel(self, **kwargs) -> list:
+        """Run sql_list queries in bounded thread pool
+
+        Each in-flight query uses its own connection. Results are returned
+        in sql_list order. When any query fails pending queries are cancelled,
+        running ones are drained and the first error is raised.
+        """
+        parallel_queries = kwargs.get('parallel_queries', 1) or 1
+        sql_list = self.config.report_sql_list
+        self.logger.debug(
+            f'Running {len(sql_list)} sql queries in {parallel_queries} threads'
+        )
+        with ThreadPoolExecutor(max_workers=parallel_queries) as executor:
+            futures = [
+                executor.submit(self.run_query, filename, db_alias, **kwargs)
+                for filename, db_alias, *args in sql_list
+            ]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [f for f in futures if f in done and f.exception() is not None]
+            if failed:
+                for f in not_done:
+                    f.cancel()
+                wait(not_done)
+                raise failed[0].exception()
+        return [f.result() for f in futures]
+
+    def load_from_database(self, **kwargs):
+        parallel_queries = kwargs.get('parallel_queries', 1) or 1
+        if parallel_queries > 1:
+            frames = self.run_queries_parallel(**kwargs)
+        else:
+            frames = None
 
-    def load_from_database(self):
         query_count = 0
-        for filename, db_alias, *args in self.config.report_sql_list:
-            self.logger.info(f'Running sql query: {filename}')
-            sql = self.sql_from_file(filename)
+        for i, (filename, db_alias, *args) in enumerate(self.config.report_sql_list):
             if args:
                 dfjoin = (args[0:1] or (None,))[0]
             else:
                 dfjoin = None
-            self.results[f'df_{filename}'] = [
-                self.sql_to_df(sql=text(sql), conn=self.db_conn.get(db_alias)),
-                dfjoin,
-            ]
+            if frames is None:
+                self.logger.info(f'Running sql query: {filename}')
+                conn = self.db_conn.get(db_alias)
+                with self.profiler.query(filename, db_alias):
+                    df = self.extract(filename, db_alias, conn, **kwargs)
+                self.profiler.add(
+                    'connect', self._connect_times.pop(db_alias, 0.0), filename
+                )
+            else:
+                df = frames[i]
+            self.results[f'df_{filename}'] = [df, dfjoin]
+            self.profile_result(filename, df)
             query_count += 1
 
             self.email_placeholders.update(self.get_email_placeholders())
 
         self.save_to_cache()
+        for filename, *_ in self.config.report_sql_list:
+            self.profile_cache_file(filename)
         if self.results:
             self.logger.info(f'Total {query_count} sql query run')
 
-    # TODO add more advanced merging logic
-    def merge_data_frames(self, df_list, df_name='df_final', write_to_cache=True):
+    def profile_result(self, filename, value):
+        """Record shape and memory of query result"""
+        if isinstance(value, pd.DataFrame):
+            self.profiler.record(
+                filename,
+                rows=len(value),
+                columns=len(value.columns),
+                memory_bytes=memory_usage(value),
+            )
+        elif isinstance(value, Path):
+            # streamed results are not kept in memory
+            files = sorted(value.glob('*.parquet')) if value.is_dir() else [value]
+            metadata = [pq.read_metadata(f) for f in files]
+            self.profiler.record(
+                filename,
+                rows=sum(m.num_rows for m in metadata),
+                columns=metadata[0].num_columns if metadata else 0,
+            )
+
+    def profile_cache_file(self, filename):
+        """Record size of query cache file and log query profile"""
+        entry = self.profile.get(filename)
+        if entry is None:
+            return
+        path = self.config.report_cache_path
+        filepath = path / f'df_{filename}__cache.{self.cache_format}'
+        if self.get_sql_options(filename).get('watermark'):
+            filepath = self.dataset_path(filename)
+        elif not filepath.exists():
+            filepath = path / f'df_{filename}__cache.parquet'
+        if filepath.is_dir():
+            entry['cache_bytes'] = sum(f.stat().st_size for f in filepath.glob('*'))
+        elif filepath.exists():
+            entry['cache_bytes'] = filepath.stat().st_size
+        self.logger.debug(
+            f"- {filename}: {entry['rows']} rows, {entry['total']:.3f}s "
+            + ', '.join(f'{stage} {entry[stage]:.3f}s' for stage in STAGES)
+        )
+
+    def write_profile(self, filepath, **fields):
+        """Write query profiles as JSON lines file"""
+        if not self.profile:
+            return None
+        self.profiler.write(filepath, **fields)
+        self.logger.debug(f'Query profile written: {filepath}')
+        return filepath
+
+    def merge_data_frames(
+        self,
+        df_list,
+        df_name='df_final',
+        write_to_cache=True,
+        join_options=None,
+        max_expansion=None,
+    ):
+        """Merge list of [DataFrame, join keys] into one
+
+        Join options (how, suffixes, validate, max_expansion) are taken from
+        sql_list entries when df_list follows sql_list.
+        """
+        sql_list = self.config.report_sql_list
+        names = None
+        if join_options is None and len(df_list) == len(sql_list):
+            join_options = [entry_options(args) for _, _, *args in sql_list]
+            names = [f'df_{filename}' for filename, *_ in sql_list]
+
         # merge dataframes
         if len(df_list) > 1:
-            """Loop df_list and merge using specified list of fields"""
-            df = df_list[0][0]
-            for i in range(1, len(df_list)):
-                # merge only DF with list of keys
-                if not df_list[i][1] is None:
-                    df = pd.merge(df, df_list[i][0], how='left', on=df_list[i][1])
+            planner = JoinPlanner(self.logger, max_expansion)
+            df = planner.join(
+                [[self.load_df(value[0]), value[1]] for value in df_list],
+                join_options,
+                names,
+            )
         else:
-            df = df_list[0][0]
+            df = self.load_df(df_list[0][0])
 
         self.logger.debug(
             f'Total {len(self.config.report_sql_list)} dataframes merged into one. Shape: {df.shape}'
@@ -199,6 +1011,24 @@ class DataCreator:
             f = self.write_to_cache(df, f'{df_name}')
         return df
 
+    def compact_results(self, max_category_ratio=0.5):
+        """Compact dtypes of extracted DataFrames before merge
+
+        Join keys are left out of category conversion. Memory usage of each
+        DataFrame before and after is logged.
+        """
+        for name, value in self.results.items():
+            df, keys = self.load_df(value[0]), value[1]
+            keys = [keys] if isinstance(keys, str) else keys or []
+            before = memory_usage(df)
+            df = compact_dtypes(df, max_category_ratio, exclude=keys)
+            after = memory_usage(df)
+            self.logger.debug(
+                f'- {name} compacted: {before / 1024**2:.2f} MB -> '
+                f'{after / 1024**2:.2f} MB'
+            )
+            value[0] = df
+
     def get_results(self) -> dict:
         return self.results
 
@@ -206,7 +1036,28 @@ class DataCreator:
         return self.results.get(name, None)
 
     def reset_results(self):
-        self.results = dict()
+        self.results.clear()
+
+    def track_consumers(self, processors=[]):
+        """Count consumers of results: merge, processors and report sheets
+
+        Results are released after their last consumer is done. Processors
+        without declared inputs can read any result, so with them results
+        are not released.
+        """
+        self.processors = list(processors)
+        if not all(is_declared(fn) for fn in processors):
+            self.logger.debug('Results not released, undeclared processors')
+            return
+        for filename, *_ in self.config.report_sql_list:
+            self.results.retain(f'df_{filename}')
+        for fn in processors:
+            for name in fn.__inputs__:
+                self.results.retain(name)
+        for file_config in self.config.report_rpt_config.values():
+            for sheet_config in (file_config.get('sheets') or {}).values():
+                if sheet_config.get('data_src'):
+                    self.results.retain(sheet_config['data_src'])
 
     def run(self, **kwargs):
         self.logger.debug('Data extraxction started...')
@@ -216,17 +1067,31 @@ class DataCreator:
         cache_format = kwargs.get('cache_format', self.cache_format)
 
         if from_cache:
-            self.load_from_cache(format=cache_format)
+            columns = kwargs.get('cache_columns')
+            if columns is None:
+                columns = self.cache_columns(cache_format)
+            self.load_from_cache(format=cache_format, columns=columns)
+        elif (kwargs.get('parallel_queries', 1) or 1) > 1:
+            # each query opens its own connection and sets its session params
+            self.load_from_database(**kwargs)
         else:
             self.open_db_conn()
             self.set_def_params()
             self.set_run_params(**kwargs)
-            self.load_from_database()
+            self.load_from_database(**kwargs)
             self.close_db_conn()
 
+        if kwargs.get('compact_dtypes', False):
+            self.compact_results(kwargs.get('max_category_ratio', 0.5))
+
         # merge dataframes
         df_list = list(self.results.values())
-        df_final = self.merge_data_frames(df_list, 'df_final')
+        df_final = self.merge_data_frames(
+            df_list, 'df_final', max_expansion=kwargs.get('max_join_expansion')
+        )
+        del df_list
+        for filename, *_ in self.config.report_sql_list:
+            self.results.release(f'df_{filename}')
 
         # TODO test releasing
         # release memory
@@ -235,26 +1100,34 @@ class DataCreator:
 
         # store merged result dataframe
         self.results['df_final'] = df_final
+        self.results.back('df_final', partial(self.read_from_cache, 'df_final'))
         self.logger.debug('Data extraxction finished')
 
-    def run_processors(self, processors=[]):
-        self.logger.info('Data processing started...')
+    def run_processors(self, processors=[], **kwargs):
+        """Run processors in order of their dependencies
 
-        for fn in processors:
-            self.logger.debug(f'- running processor {fn.__name__}')
-            try:
-                df_dict = fn(self)
-            except Exception as e:
-                print(e)
+        Declared processors which outputs are not used by report sheets are
+        skipped unless prune_processors=False. Independent processors run in
+        parallel_processors threads. Outputs of processors declared with
+        cache=True, or all declared when processor_cache=True, are cached.
+        """
+        self.logger.info('Data processing started...')
 
-            # add datafre to results dictionary
-            self.logger.debug(f'- {len(df_dict)} results added')
-            for name, value in df_dict.items():
-                self.results[name] = value
+        graph = ProcessorGraph(processors, self.logger)
+        if kwargs.get('prune_processors', True):
+            graph.prune(used_results(self.config.report_rpt_config))
+        graph.run(
+            self,
+            max_workers=kwargs.get('parallel_processors', 1) or 1,
+            cache=ProcessorCache(
+                self.config.report_cache_path / 'processors', self.logger
+            ),
+            cache_all=kwargs.get('processor_cache', False),
+        )
 
         self.logger.info('Data processing finished')
 
     def flush(self):
         """Clean after run"""
         self.email_placeholders = dict()
-        self.results = dict()
+        self.results = ResultsStore(self.logger)
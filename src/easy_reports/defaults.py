@@ -5,14 +5,31 @@ ARCH_DIR = 'arch'
 SQL_DIR = 'sql'
 CACHE_DIR = 'cache'
 TEMPL_DIR = 'templ'
+# shared query result cache lives in CACHE_BASE_PATH / QUERY_CACHE_DIR
+QUERY_CACHE_DIR = '_query_cache'
+# seconds, 0 disables query result cache
+QUERY_CACHE_TTL = 0
+# bytes, least recently used results are evicted above this size
+QUERY_CACHE_MAX_SIZE = 1024**3
+# seconds to wait for concurrent run of the same query
+QUERY_CACHE_LOCK_TIMEOUT = 600
 
 EMAIL_ENGINE = 'smtplib'
 EMAIL_SERVER = 'localhost'
 EMAIL_PORT = 1025
 EMAIL_USER = ''
 EMAIL_PASSWORD = ''
+# emails are written to OUTBOX_BASE_PATH (or BASE_PATH / OUTBOX_DIR)
+# and sent by easy-reports send-outbox instead of during report run
+OUTBOX = False
+OUTBOX_DIR = 'outbox'
+OUTBOX_MAX_ATTEMPTS = 5
+# seconds before first retry, doubled after each failed attempt
+OUTBOX_RETRY_DELAY = 60
 
 DB_LIST = {}
+# open pooled connections of used db aliases when reports are loaded
+DB_WARM_UP = False
 
 _SHEET_CONFIG = {
     'sheet_name': 'dane',
@@ -28,6 +45,11 @@ _SHEET_CONFIG = {
 _RPT_CONFIG = {
     'filename': 'report.xlsx',
     'send_email': False,
+    # 'xlsx', 'csv', 'tsv' or 'parquet', compression None, 'gzip' or 'zip'
+    'format': 'xlsx',
+    'compression': None,
+    # 'streaming' writes rows in XlsxWriter constant_memory mode
+    'write_mode': 'default',
     'sheets': {1: _SHEET_CONFIG},
 }
 
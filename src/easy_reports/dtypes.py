@@ -0,0 +1,59 @@
+import pandas as pd
+
+
+def memory_usage(df) -> int:
+    """Get deep memory usage of DataFrame in bytes"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def is_text(s) -> bool:
+    """Check if series holds only strings (and nulls)"""
+    if s.dtype == object:
+        return pd.api.types.infer_dtype(s, skipna=True) == 'string'
+    return pd.api.types.is_string_dtype(s.dtype)
+
+
+def compact_series(s, max_category_ratio=0.5, categorize=True) -> pd.Series:
+    """Convert series to more compact dtype without loss of values
+
+    Integers are downcast to smallest type holding all values. Floats are
+    downcast to float32 only when all values round-trip unchanged. Text with
+    ratio of unique values up to max_category_ratio becomes category, other
+    text is stored as Arrow strings.
+    """
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    if s.dtype.kind in 'iu' and not isinstance(
+        s.dtype, pd.api.extensions.ExtensionDtype
+    ):
+        downcast = 'unsigned' if s.dtype.kind == 'u' else 'integer'
+        return pd.to_numeric(s, downcast=downcast)
+    if s.dtype.kind == 'f' and not isinstance(
+        s.dtype, pd.api.extensions.ExtensionDtype
+    ):
+        downcast = s.astype('float32')
+        if ((downcast.astype(s.dtype) == s) | s.isna()).all():
+            return downcast
+        return s
+    if is_text(s):
+        if categorize and len(s) and s.nunique() / len(s) <= max_category_ratio:
+            return s.astype('category')
+        if s.dtype == object:
+            return s.astype('string[pyarrow]')
+    return s
+
+
+def compact_dtypes(df, max_category_ratio=0.5, exclude=()) -> pd.DataFrame:
+    """Compact dtypes of all DataFrame columns
+
+    Columns in exclude (e.g. join keys) are never converted to category.
+    """
+    return pd.DataFrame(
+        {
+            col: compact_series(
+                df[col], max_category_ratio, categorize=col not in exclude
+            )
+            for col in df.columns
+        },
+        index=df.index,
+    )
@@ -1,14 +1,94 @@
 import os
+import time
+import logging
+import threading
 from pathlib import Path
-from datetime import date
-from . import email_smtplib
+from concurrent.futures import ThreadPoolExecutor, wait
+from . import email_smtplib, templates
+from .outbox import Outbox
 import copy
 
 
 def replace_common_placeholders(text: str) -> str:
     """Replace known placeholders in text"""
-    t = text.replace(r'{date}', date.today().strftime("%Y-%m-%d"))
-    return t
+    return templates.render(text)
+
+
+class EmailDispatcher:
+    """Background delivery of emails in thread pool
+
+    Emails are sent by max_workers threads through shared SMTP session pool
+    and attachments cache. Delivery result of each email is logged and
+    collected when it finishes, wait blocks until all submitted emails are
+    done.
+    """
+
+    def __init__(self, max_workers=1, pool=None, attachment_cache=None, logger=None):
+        self.logger = logger or logging.getLogger('dummy')
+        self.own_pool = pool is None
+        self.pool = pool or email_smtplib.SMTPSessionPool(self.logger)
+        self.own_cache = attachment_cache is None
+        self.attachment_cache = attachment_cache or email_smtplib.AttachmentCache(
+            logger=self.logger
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='email'
+        )
+        self.futures = []
+        self.results = []
+        self._lock = threading.Lock()
+
+    def submit(self, email, report=None):
+        """Queue email, return future of its delivery"""
+        start = time.perf_counter()
+
+        def done(future):
+            error = future.exception() or getattr(email, 'error', None)
+            result = {
+                'report': report,
+                'subject': email.subject,
+                'to': email.to,
+                'sent': future.exception() is None and future.result() is not False,
+                'error': str(error) if error else None,
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+            with self._lock:
+                self.results.append(result)
+            logger = email.logger or self.logger
+            if result['sent']:
+                logger.debug(
+                    f'- email delivered in {result["seconds"]}s: {email.subject}'
+                )
+            else:
+                logger.error(f'- email not delivered: {email.subject} {error}')
+
+        future = self.executor.submit(email.send)
+        future.add_done_callback(done)
+        with self._lock:
+            self.futures.append(future)
+        return future
+
+    def wait(self) -> list:
+        """Wait for all submitted emails, return their delivery results"""
+        with self._lock:
+            futures = list(self.futures)
+        wait(futures)
+        with self._lock:
+            results = list(self.results)
+        if results:
+            sent = sum(result['sent'] for result in results)
+            self.logger.info(f'{sent} of {len(results)} emails delivered')
+        return results
+
+    def close(self):
+        """Wait for outstanding emails and stop threads"""
+        results = self.wait()
+        self.executor.shutdown()
+        if self.own_pool:
+            self.pool.close()
+        if self.own_cache:
+            self.attachment_cache.close()
+        return results
 
 
 class EmailCreator:
@@ -33,6 +113,28 @@ class EmailCreator:
 
         self.placeholders = kwargs.get('placeholders', dict())
         self.attachments = kwargs.get('attachments', dict())
+        # SMTP sessions shared by emails of run (or of all reports)
+        self.smtp_pool = kwargs.get('smtp_pool')
+        # emails are queued to dispatcher instead of being sent in run
+        self.dispatcher = kwargs.get('email_dispatcher')
+        # attachments encoded once for all emails
+        self.attachment_cache = kwargs.get('attachment_cache')
+        # emails are put in outbox and sent later by send-outbox worker
+        self.outbox = kwargs.get('outbox')
+        if self.outbox is None:
+            self.outbox = getattr(config, 'report_outbox', False)
+        if self.outbox is True:
+            self.outbox = Outbox(
+                config.report_outbox_path,
+                logger,
+                max_attempts=config.report_outbox_max_attempts,
+                retry_delay=config.report_outbox_retry_delay,
+            )
+        if self.dispatcher is not None:
+            self.smtp_pool = self.smtp_pool or self.dispatcher.pool
+            self.attachment_cache = (
+                self.attachment_cache or self.dispatcher.attachment_cache
+            )
 
     def send_email(self, email_config):
         if email_config['to'] == '':
@@ -45,16 +147,14 @@ class EmailCreator:
         # if os.path.isfile(os.path.join(self.templ_dir, email_config.get('template'))):
         templ_file_path = self.config.report_templ_path / email_config.get('template')
         if templ_file_path.is_file():
-            template = open(templ_file_path, 'r', encoding='UTF8').read()
-            # Replace template placeholders
-            for i in self.placeholders:
-                template = template.replace('@' + i, str(self.placeholders[i]))
-
             # Replace body with template content
-            email_config['body'] = replace_common_placeholders(template)
+            template = templates.load_template(templ_file_path)
+            email_config['body'] = template.render(self.placeholders)
 
         # Replace placeholders in subject
-        email_config['subject'] = replace_common_placeholders(email_config['subject'])
+        email_config['subject'] = templates.render(
+            email_config['subject'], self.placeholders
+        )
 
         def get_attachment_filepath(file_id):
             """Get by ID attachment filepath"""
@@ -66,18 +166,56 @@ class EmailCreator:
 
         for file_id in email_config.get('attachments_rpt_id'):
             filepath = get_attachment_filepath(file_id)
-            if filepath:
+            if isinstance(filepath, list):
+                # report file written to many files (e.g. CSV of each sheet)
+                email_config.get('attachments', []).extend(filepath)
+            elif filepath:
                 email_config.get('attachments', []).append(filepath)
             else:
                 self.logger.info(
                     f'Attachment Id: {file_id} not found or has set send_email=False'
                 )
 
-        email = self._email(email_config, self.config, self.logger)
+        email = self._email(
+            email_config,
+            self.config,
+            self.logger,
+            pool=self.smtp_pool,
+            attachment_cache=self.attachment_cache,
+        )
+        if self.outbox:
+            self.outbox.put(email, report=self.config.report_symbol)
+            return
+        if self.dispatcher is not None:
+            self.dispatcher.submit(email, report=self.config.report_symbol)
+            return
         email.send()
 
     def run(self, **kwargs):
+        if self.outbox:
+            self.logger.info('Zapisywanie wiadomosci email do outbox...')
+            for i, config in self.email_config.items():
+                self.send_email(copy.deepcopy(config))
+            return
         self.logger.info('Wysyłanie wiadomosci email...')
-        for i, config in self.email_config.items():
-            email_config = copy.deepcopy(config)
-            self.send_email(email_config)
+        own_pool = self.smtp_pool is None
+        if own_pool:
+            self.smtp_pool = email_smtplib.SMTPSessionPool(
+                self.logger, max_messages=kwargs.get('smtp_max_messages', 100)
+            )
+        own_cache = self.attachment_cache is None
+        if own_cache:
+            self.attachment_cache = email_smtplib.AttachmentCache(
+                kwargs.get('attachment_zip_threshold'), self.logger
+            )
+        try:
+            for i, config in self.email_config.items():
+                email_config = copy.deepcopy(config)
+                self.send_email(email_config)
+        finally:
+            if own_pool:
+                self.smtp_pool.close()
+                self.smtp_pool = None
+            if own_cache:
+                self.attachment_cache.close()
+                self.attachment_cache = None
@@ -1,9 +1,239 @@
 from datetime import datetime
-import os
+import io
+import uuid
+import base64
+import shutil
+import logging
+import zipfile
+import tempfile
+import threading
+import contextlib
 import smtplib, ssl
-from email.mime.application import MIMEApplication
+from pathlib import Path
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email.policy import compat32
+
+# compat32 encodes non-ASCII headers and parameters of MIME classes
+# (RFC 2047 and RFC 2231) as Message.as_string does
+SMTP_COMPAT32 = compat32.clone(linesep='\r\n')
+
+
+def send_data(session, from_addr, to_addrs, fp, chunksize=64 * 1024):
+    """Send message read from binary file with CRLF line endings
+
+    Works like smtplib.SMTP.sendmail, but message is streamed in DATA
+    command in chunks, with lines starting with dot escaped.
+    """
+    session.ehlo_or_helo_if_needed()
+    code, resp = session.mail(from_addr)
+    if code != 250:
+        session.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+    refused = {}
+    for addr in to_addrs:
+        code, resp = session.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(to_addrs):
+        session.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, resp = session.docmd('data')
+    if code != 354:
+        session.rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+    buffer = bytearray()
+    line = b'\r\n'
+    for line in fp:
+        if line.startswith(b'.'):
+            buffer += b'.'
+        buffer += line
+        if len(buffer) >= chunksize:
+            session.send(bytes(buffer))
+            buffer.clear()
+    if not line.endswith(b'\r\n'):
+        buffer += b'\r\n'
+    buffer += b'.\r\n'
+    session.send(bytes(buffer))
+    code, resp = session.getreply()
+    if code != 250:
+        session.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+class AttachmentCache:
+    """Attachments encoded to base64 once and shared by messages of run
+
+    Encoded attachments are kept in temporary files removed on close.
+    Files with suffix in zip_suffixes and size over zip_threshold bytes
+    are attached as zip archives.
+    """
+
+    chunksize = 57 * 1024
+    zip_suffixes = ('.xlsx', '.csv')
+
+    def __init__(self, zip_threshold=None, logger=None):
+        self.zip_threshold = zip_threshold
+        self.logger = logger or logging.getLogger('dummy')
+        self._dir = None
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """Number of encoded attachments"""
+        return len(self._entries)
+
+    def get(self, filepath) -> dict:
+        """Get filename and path of encoded attachment, encode it once"""
+        filepath = Path(filepath)
+        stat = filepath.stat()
+        key = (str(filepath.resolve()), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = self.encode(filepath, stat.st_size)
+            return self._entries[key]
+
+    def encode(self, filepath, size) -> dict:
+        if self._dir is None:
+            self._dir = tempfile.TemporaryDirectory(prefix='easy_reports_mail_')
+        dirpath = Path(self._dir.name)
+        n = len(self._entries)
+        filename = filepath.name
+        source = filepath
+        if (
+            self.zip_threshold is not None
+            and size > self.zip_threshold
+            and filepath.suffix.lower() in self.zip_suffixes
+        ):
+            source = dirpath / f'{n}.zip'
+            with zipfile.ZipFile(source, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+                z.write(filepath, arcname=filename)
+            filename += '.zip'
+            self.logger.debug(f'- attachment {filepath.name} compressed to zip')
+        encoded = dirpath / f'{n}.b64'
+        with open(source, 'rb') as src, open(encoded, 'wb') as dst:
+            while chunk := src.read(self.chunksize):
+                dst.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+        return {'filename': filename, 'path': encoded}
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            if self._dir is not None:
+                self._dir.cleanup()
+                self._dir = None
+
+
+class SMTPSessionPool:
+    """Authenticated SMTP sessions reused for many messages
+
+    Session is connected (with STARTTLS and login when server supports
+    them) on first use and returned to pool after message, reset with RSET.
+    Session is closed after max_messages messages. Message interrupted by
+    server disconnect is sent again once with new session. Pool can be
+    shared by threads, each session is used by one thread at a time.
+    """
+
+    def __init__(self, logger=None, max_messages=100, timeout=60):
+        self.logger = logger or logging.getLogger('dummy')
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._context = None
+        self._idle = dict()
+        self._lock = threading.Lock()
+        self.connections = 0
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = ssl.create_default_context()
+        return self._context
+
+    def connect(self, server, port, user, password):
+        self.logger.debug(f'Connecting to SMTP server {server}:{port}')
+        session = smtplib.SMTP(server, port, timeout=self.timeout)
+        session.ehlo_or_helo_if_needed()
+        if session.has_extn('STARTTLS'):
+            session.starttls(context=self.context)
+            session.ehlo()
+        if session.has_extn('auth') and user:
+            session.login(user, password)
+        session.messages = 0
+        self.connections += 1
+        return session
+
+    def acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return self.connect(*key)
+
+    def release(self, key, session):
+        """Reset session and return it to pool, close used up one"""
+        try:
+            if session.messages >= self.max_messages:
+                session.quit()
+                return
+            session.rset()
+        except smtplib.SMTPException:
+            session.close()
+            return
+        with self._lock:
+            self._idle.setdefault(key, []).append(session)
+
+    @contextlib.contextmanager
+    def session(self, server, port, user='', password=''):
+        """Get session of server, it is returned to pool when block succeeds"""
+        key = (server, port, user, password)
+        session = self.acquire(key)
+        try:
+            yield session
+        except smtplib.SMTPServerDisconnected:
+            session.close()
+            raise
+        except smtplib.SMTPException:
+            # refused message or recipients, session is still usable
+            self.release(key, session)
+            raise
+        except BaseException:
+            session.close()
+            raise
+        self.release(key, session)
+
+    def sendmail(self, server, port, user, password, from_addr, to_addrs, msg):
+        """Send message, reconnect once when server closed session
+
+        Message can be binary file, which is streamed to server.
+        """
+        for attempt in range(2):
+            try:
+                with self.session(server, port, user, password) as session:
+                    session.messages += 1
+                    if isinstance(msg, (str, bytes)):
+                        return session.sendmail(from_addr, to_addrs, msg)
+                    msg.seek(0)
+                    return send_data(session, from_addr, to_addrs, msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                if attempt:
+                    raise
+                self.logger.debug(f'SMTP session disconnected, reconnecting: {e}')
+
+    def close(self):
+        """Quit all idle sessions"""
+        with self._lock:
+            idle, self._idle = self._idle, dict()
+        for sessions in idle.values():
+            for session in sessions:
+                try:
+                    session.quit()
+                except (smtplib.SMTPException, OSError):
+                    session.close()
 
 
 class Email:
@@ -28,6 +258,11 @@ class Email:
         self.attachments = email_config.get('attachments', [])
 
         self.logger = logger
+        # session pool of run, own one is used for single email
+        self.pool = kwargs.get('pool')
+        # encoded attachments of run, own ones are used for single email
+        self.attachment_cache = kwargs.get('attachment_cache')
+        self.error = None
 
     def __repr__(self):
         x = '\n\t To:' + self.to + '\n'
@@ -38,11 +273,55 @@ class Email:
         x += '\t Body:' + self.body + '\n'
         return x
 
+    @property
+    def recipients(self) -> list:
+        return [
+            email.strip()
+            for email in (self.to + ";" + self.cc).split(";")
+            if email.strip()
+        ]
+
+    def write_message(self, fp, cache):
+        """Write MIME message to binary file
+
+        Message without attachments is written by BytesGenerator, encoded
+        attachments from cache are copied after it as next parts.
+        """
+        msg = MIMEMultipart('alternative')
+
+        msg['To'] = self.to
+        if self.cc:
+            msg['Cc'] = self.cc
+
+        msg['Subject'] = self.subject
+        msg.attach(MIMEText(self.body, 'html'))
+
+        boundary = f'==============={uuid.uuid4().hex}=='
+        msg.set_boundary(boundary)
+        head = io.BytesIO()
+        BytesGenerator(head, policy=SMTP_COMPAT32).flatten(msg)
+        closing = f'--{boundary}--\r\n'.encode()
+        fp.write(head.getvalue()[: -len(closing)])
+
+        for a in self.attachments:
+            attachment = cache.get(a)
+            part = MIMEBase('application', 'octet-stream', name=attachment['filename'])
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header(
+                'Content-Disposition', 'attachment', filename=attachment['filename']
+            )
+            fp.write(f'--{boundary}\r\n'.encode())
+            BytesGenerator(fp, policy=SMTP_COMPAT32).flatten(part)
+            with open(attachment['path'], 'rb') as f:
+                shutil.copyfileobj(f, fp)
+        fp.write(closing)
+
     @property
     def context_time(self):
         return f'[{self.context}  {datetime.now()}]'
 
-    def send(self):
+    def send(self) -> bool:
+        """Send email, log error and return False when it is not sent"""
         try:
             self.logger.debug(f'On behalf: {self.onbehalf}')
             self.logger.debug(f'To: {self.to}')
@@ -50,41 +329,30 @@ class Email:
             self.logger.debug(f'Server: {self.server}')
             self.logger.debug(f'Port: {self.port}')
 
-            context = ssl.create_default_context()
-            self.logger.debug(f'Context: {context}')
-
-            with smtplib.SMTP(self.server, self.port) as server:
-                if server.has_extn('STARTTLS'):
-                    server.starttls(context=context)
-                if 'auth' in server.esmtp_features:
-                    server.login(self.user, self.password)
-
-                msg = MIMEMultipart('alternative')
-
-                msg['To'] = self.to
-                if self.cc:
-                    msg['Cc'] = self.cc
-
-                msg['Subject'] = self.subject
-                msg.attach(MIMEText(self.body, 'html'))
-
-                for a in self.attachments:
-                    with open(a, "rb") as f:
-                        part = MIMEApplication(f.read(), Name=os.path.basename(a))
-                    # After the file is closed
-                    part[
-                        'Content-Disposition'
-                    ] = 'attachment; filename="%s"' % os.path.basename(a)
-                    msg.attach(part)
-
-                server.sendmail(
-                    self.onbehalf,
-                    [email.strip() for email in (self.to).split(";")]
-                    + [email.strip() for email in (self.cc).split(";")],
-                    msg.as_string(),
-                )
+            pool = self.pool or SMTPSessionPool(self.logger)
+            cache = self.attachment_cache or AttachmentCache(logger=self.logger)
+            try:
+                with tempfile.SpooledTemporaryFile(max_size=1024**2) as fp:
+                    self.write_message(fp, cache)
+                    pool.sendmail(
+                        self.server,
+                        self.port,
+                        self.user,
+                        self.password,
+                        self.onbehalf,
+                        self.recipients,
+                        fp,
+                    )
+            finally:
+                if pool is not self.pool:
+                    pool.close()
+                if cache is not self.attachment_cache:
+                    cache.close()
 
             self.logger.info(f'Email has been sent. Subject: {self.subject}')
+            return True
 
         except Exception as e:
+            self.error = e
             self.logger.error(f'Error while sending Email! {e}')
+            return False
@@ -0,0 +1,68 @@
+import threading
+import logging
+from sqlalchemy import create_engine
+
+# db_list alias keys passed to create_engine as pool options
+POOL_OPTIONS = (
+    'pool_size',
+    'max_overflow',
+    'pool_pre_ping',
+    'pool_recycle',
+    'pool_timeout',
+)
+
+
+class EngineRegistry:
+    """Process-wide registry of SQLAlchemy engines shared by all reports
+
+    Engines are keyed by url and pool options, so reports using the same
+    database alias check out connections from one connection pool.
+    """
+
+    def __init__(self):
+        self._engines = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    @staticmethod
+    def pool_options(db_config: dict) -> dict:
+        """Get pool options defined for db alias"""
+        return {key: db_config[key] for key in POOL_OPTIONS if key in db_config}
+
+    def get_engine(self, db_config: dict):
+        """Get engine for db alias config, create it on first use"""
+        url = db_config.get('url')
+        options = self.pool_options(db_config)
+        key = (str(url), tuple(sorted(options.items())))
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = create_engine(url, **options)
+                self._engines[key] = engine
+        return engine
+
+    def connect(self, db_config: dict):
+        """Check out connection from engine pool"""
+        return self.get_engine(db_config).connect()
+
+    def warm_up(self, db_list: dict, logger=None):
+        """Open pooled connection for each db alias config"""
+        logger = logger or logging.getLogger('dummy')
+        for alias, db_config in db_list.items():
+            try:
+                self.connect(db_config).close()
+                logger.debug(f'Warmed up db: {alias}')
+            except Exception as e:
+                logger.error(f'Warm up of db {alias} failed! {e}')
+
+    def dispose(self):
+        """Dispose all engines and close their pooled connections"""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+registry = EngineRegistry()
@@ -1,17 +1,156 @@
-from datetime import date
 import os
+import pickle
+import tempfile
+import weakref
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from xlsxwriter.utility import xl_range
+
+from .results import ResultsStore
+from .formats import FormatRegistry, FormatPlan, is_valid_excel_col_range
+from .writers import FileWriter, CsvWriter, WRITERS, register_writer
+
+# number formats of date columns, as written by DataFrame.to_excel
+DATE_FORMATS = {'date': 'yyyy-mm-dd', 'datetime': 'yyyy-mm-dd hh:mm:ss'}
+
+
+def excel_serial(s) -> np.ndarray:
+    """Convert datetime series to Excel 1900 date system serial numbers
+
+    NaT is converted to NaN. As in Excel (and XlsxWriter) serials after
+    1900-02-28 are shifted by non-existing 1900-02-29.
+    """
+    values = ((s - pd.Timestamp('1899-12-31')) / pd.Timedelta(days=1)).to_numpy(
+        dtype='float64', na_value=np.nan
+    )
+    return np.where(values > 59, values + 1, values)
+
+
+def column_kind(s) -> str:
+    """Get dtype class of series: bool, integer, float, date, datetime or text
+
+    Object columns of datetime.date or datetime.datetime values (as read
+    from SQL DATE columns by many drivers) are classified as date and
+    datetime, Arrow date columns (fetch_mode='arrow') as date.
+    """
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return 'integer'
+    if pd.api.types.is_float_dtype(s.dtype):
+        return 'float'
+    if isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_date(s.dtype.pyarrow_dtype):
+        return 'date'
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return 'datetime'
+    if s.dtype == object:
+        inferred = pd.api.types.infer_dtype(s, skipna=True)
+        if inferred in ('date', 'datetime'):
+            return inferred
+    return 'text'
+
+
+def column_width(s, kind=None) -> int:
+    """Get max length of series values displayed as text, 0 for no values
+
+    Width of integers and datetimes is taken from their extremes, other
+    values are converted to text at once.
+    """
+    s = s.dropna()
+    if not len(s):
+        return 0
+    kind = kind or column_kind(s)
+    if kind == 'bool':
+        return max(len(str(v)) for v in s.unique())
+    if kind == 'integer':
+        return max(len(str(s.min())), len(str(s.max())))
+    if kind == 'date':
+        return 10
+    if kind == 'datetime' and s.dtype == object:
+        return len('yyyy-mm-dd hh:mm:ss')
+    if kind == 'datetime':
+        # datetimes at midnight are displayed as dates
+        return len(str(s.max())) if (s.dt.normalize() != s).any() else 10
+    if s.dtype == np.float64:
+        # str of Python floats is faster than converting to string series
+        return max(map(len, map(str, s.tolist())))
+    if isinstance(s.dtype, pd.StringDtype):
+        return int(s.str.len().max())
+    return int(s.astype(str).str.len().max())
+
+
+class ColumnStats:
+    """Statistics of DataFrame columns computed once on first use
+
+    For each column dtype class, null count and max display width is kept.
+    With sample_size width of DataFrames with more rows is taken from
+    random sample of rows.
+    """
+
+    def __init__(self, df, sample_size=None):
+        self._df = weakref.ref(df)
+        self.sample_size = sample_size
+        self.rows = len(df)
+        self._stats = dict()
+
+    def __getitem__(self, column) -> dict:
+        if column not in self._stats:
+            df = self._df()
+            if df is None:
+                raise KeyError(column)
+            s = df[column]
+            kind = column_kind(s)
+            if self.sample_size and len(s) > self.sample_size:
+                sample = s.sample(self.sample_size, random_state=0)
+            else:
+                sample = s
+            self._stats[column] = {
+                'kind': kind,
+                'nulls': int(s.isna().sum()),
+                'width': column_width(sample, kind),
+            }
+        return self._stats[column]
+
+    def __contains__(self, column):
+        df = self._df()
+        return column in self._stats or (df is not None and column in df.columns)
+
+    def width(self, column) -> int:
+        return self[column]['width']
+
+    def kind(self, column) -> str:
+        return self[column]['kind']
+
+    def nulls(self, column) -> int:
+        return self[column]['nulls']
+
+
+class ColumnStatsCache:
+    """Column statistics of source DataFrames shared by sheets"""
 
-from xlsxwriter.utility import xl_range, xl_cell_to_rowcol
-import re
-import fnmatch
+    def __init__(self, sample_size=None):
+        self.sample_size = sample_size
+        self._cache = dict()
 
+    def get(self, name, df) -> ColumnStats:
+        """Get statistics of DataFrame, computed again when DataFrame changed"""
+        stats = self._cache.get(name)
+        if stats is None or stats._df() is not df:
+            stats = self._cache[name] = ColumnStats(df, self.sample_size)
+        return stats
 
-def is_valid_excel_col_range(c):
-    """Check if string literal is valid Excel column range"""
-    m = re.match(r'^([A-Z]{1,2}:[A-Z]{1,2})$', c)
-    return bool(m)
+    def clear(self):
+        self._cache.clear()
 
 
 class Sheet:
@@ -30,24 +169,124 @@ class Sheet:
         self.sheet_config = sheet_config
         self.sheet_name = sheet_config.get('sheet_name')
         self.logger = logger or logging.getLogger('dummy')
+        if not isinstance(formats, FormatRegistry):
+            formats = FormatRegistry(
+                writer.book, {tag: f['format_def'] for tag, f in formats.items()}
+            )
         self.formats = formats
+        self.plan = FormatPlan(sheet_config, formats, self.logger)
+        self.write_mode = kwargs.get('write_mode', 'default')
+        self.column_stats = kwargs.get('column_stats') or ColumnStatsCache()
+        # column index -> (format, options) set on worksheet column
+        self.column_settings = dict()
         self.df = self.setup_df(data_results)
-
-        self.df.to_excel(writer, self.sheet_name, index=False)
         self.workbook = writer.book
-        self.sheet = writer.sheets[self.sheet_name]
+        self.write(writer, apply_formats)
+
+    def write(self, writer, apply_formats=True):
+        """Write DataFrame to the sheet and apply formatting
+
+        In 'fast' write mode DataFrame with flat columns is written by
+        columns straight to worksheet.
+        """
+        fast = self.sheet_config.get('write_mode', self.write_mode) == 'fast'
+        if fast and not isinstance(self.df.columns, pd.MultiIndex):
+            self.write_columns()
+        else:
+            self.df.to_excel(writer, sheet_name=self.sheet_name, index=False)
+            self.sheet = writer.sheets[self.sheet_name]
         if apply_formats:
             self.apply_formatting()
 
+    def write_columns(self):
+        """Write DataFrame to new worksheet column by column
+
+        Header is written with global header format, columns are written
+        by dtype: numbers from NumPy arrays, datetimes as Excel serial
+        numbers converted at once, missing values are left blank.
+        """
+        self.sheet = self.workbook.add_worksheet(self.sheet_name)
+        header_fmt = self.formats.get('header')
+        self.sheet.write_row(
+            0,
+            0,
+            [str(c) for c in self.df.columns],
+            header_fmt['format_obj'] if header_fmt else None,
+        )
+        for col in range(self.df.shape[1]):
+            self._write_column(col, self.df.iloc[:, col])
+
+    def _write_column(self, col, s):
+        if pd.api.types.is_bool_dtype(s.dtype):
+            values = s.astype(object).where(s.notna(), None).tolist()
+            self.sheet.write_column(1, col, values)
+
+        elif pd.api.types.is_numeric_dtype(
+            s.dtype
+        ) and not pd.api.types.is_complex_dtype(s.dtype):
+            values = s.to_numpy(dtype='float64', na_value=np.nan)
+            finite = np.isfinite(values)
+            if finite.all():
+                self.sheet.write_column(1, col, values.tolist())
+                return
+            data = values.astype(object)
+            data[~finite] = None
+            self.sheet.write_column(1, col, data.tolist())
+            # infinity is written as text like in DataFrame.to_excel
+            for row in np.flatnonzero(np.isinf(values)).tolist():
+                self.sheet.write_string(
+                    row + 1, col, 'inf' if values[row] > 0 else '-inf'
+                )
+
+        elif pd.api.types.is_datetime64_any_dtype(s.dtype) or (
+            s.dtype == object and self.stats.kind(s.name) in DATE_FORMATS
+        ):
+            # datetime.date objects and Arrow dates are written as dates
+            # like in to_excel
+            self._write_dates(col, s, DATE_FORMATS[self.stats.kind(s.name)])
+
+        elif s.dtype == object and self.stats.nulls(s.name) == 0:
+            self.sheet.write_column(1, col, s.tolist())
+
+        else:
+            values = s.astype(object).where(s.notna(), None).tolist()
+            self.sheet.write_column(1, col, values)
+
+    def _write_dates(self, col, s, num_format):
+        """Write datetime series as Excel serials with date format
+
+        Object and Arrow columns are converted to datetime64 first.
+        """
+        if s.dtype == object or isinstance(s.dtype, pd.ArrowDtype):
+            s = pd.to_datetime(s)
+        if getattr(s.dt, 'tz', None) is not None:
+            raise ValueError(
+                f"Column '{s.name}' has timezone, which is not supported by Excel!"
+            )
+        values = excel_serial(s)
+        fmt = self.formats.add({'num_format': num_format})
+        valid = ~np.isnan(values)
+        if valid.all():
+            self.sheet.write_column(1, col, values.tolist(), fmt)
+            return
+        for row in np.flatnonzero(valid).tolist():
+            self.sheet.write_number(row + 1, col, values[row], fmt)
+
     def setup_df(self, data_results) -> pd.DataFrame:
-        """Prepare dataframe before writing to the sheet"""
+        """Prepare dataframe before writing to the sheet
+
+        Column statistics are taken from whole data_src DataFrame, so they
+        are shared by all sheets writing it.
+        """
         df = None
-        if type(data_results) is dict:
-            df = data_results.get(self.sheet_config.get('data_src'), None)
-        if df is None:
+        data_src = self.sheet_config.get('data_src')
+        if isinstance(data_results, Mapping):
+            df = data_results.get(data_src, None)
+        if not isinstance(df, pd.DataFrame):
             raise ValueError(
                 f"Sheet's '{self.sheet_name}' data_src points to not existing DataFrame!"
             )
+        self.stats = self.column_stats.get(data_src, df)
 
         output_columns = self.sheet_config.get('output_columns', [])
         if len(output_columns):
@@ -61,21 +300,8 @@ class Sheet:
         # Write the column headers with the defined format.
         for col, header in enumerate(headers):
             # get first format from resolution order [explicit, implicit, default]
-            fmt = [
-                *filter(None, [header_formats.get(_) for _ in [header, '*']]),
-                'header',
-            ][0]
-
-            if type(fmt) is dict:
-                tag = self.sheet_name + '_header_' + str(col)
-                self.formats[tag] = {
-                    'format_def': fmt,
-                    'format_obj': self.workbook.add_format(fmt),
-                }
-            else:
-                tag = fmt
-
-            self.sheet.write(0, col, header, self.formats.get(tag)['format_obj'])
+            fmt = self.formats.format_obj(self.plan.header_format(header))
+            self.sheet.write(0, col, header, fmt)
 
     def is_header_text_wrapped(self, header, header_formats) -> bool:
         """Check if header has TEXT_WRAP set to True"""
@@ -101,85 +327,40 @@ class Sheet:
         }
 
         tag = ''
-        for format, word_list in format_word_list.items():
-            if any(s.upper() in header.upper() for s in word_list):
-                tag = format
+        for word_tag, word_list in format_word_list.items():
+            if any(s.upper() in str(header).upper() for s in word_list):
+                tag = word_tag
 
-        if tag:
-            fmt = {}
-            try:
-                fmt = {**format, **self.xls_formats[tag]}
-            except TypeError:
-                self.logger.error("TypeError for Header: ", header, " format:", format)
-
-            return fmt
+        global_format = self.formats.get(tag) if tag else None
+        if global_format is not None:
+            # explicit column format takes precedence
+            return {**global_format['format_def'], **format}
 
-        return {}
+        return format
 
     def _get_column_width(self, df, header=None):
         """Get column width"""
         if header is None:
             return 20
 
-        column_width = max(df[header].astype(str).map(len).max(), len(header))
-        return column_width + 3
-
-    def _get_column_formats(self, header, headers, column_formats):
-        """Collect given header options and return them in one dictionary"""
-
-        header_idx = headers.index(header)
-        fmt = {}
-        for format_target, col_formats in column_formats.items():
-            apply_format = False
-            if is_valid_excel_col_range(format_target):
-                col_name_1, col_name_2 = format_target.split(':')
-                col_1 = xl_cell_to_rowcol(col_name_1.upper() + '1')[1]
-                col_2 = xl_cell_to_rowcol(col_name_2.upper() + '1')[1]
-                if col_1 <= header_idx <= col_2:
-                    apply_format = True
-
-            # if format_target == header or format_target == '*' or fnmatch.fnmatch(string, pattern):
-            #     apply_format = True
-
-            if fnmatch.fnmatch(header, format_target):
-                apply_format = True
-
-            if apply_format:
-                if type(col_formats) is dict:
-                    fmt.update(col_formats)
-                elif type(col_formats) is str:
-                    global_format = self.formats.get(col_formats, None)
-
-                    if global_format is not None:
-                        fmt.update(global_format['format_def'])
-                else:
-                    self.logger.error(
-                        f'Format literal: {col_formats} is not defined in global XLS_FORMATS!'
-                    )
+        stats = getattr(self, 'stats', None)
+        if stats is not None and header in stats:
+            width = stats.width(header)
+        else:
+            width = column_width(df[header])
+        return max(width, len(header)) + 3
 
-        fmt = self._append_number_format(header, fmt)
-        return fmt
+    def _get_column_formats(self, col, header):
+        """Collect formats of column matched by sheet config and number format"""
 
-    def _get_column_options(self, header, headers, column_options):
-        """Collect given header options and return them in one dictionary"""
+        return self._append_number_format(header, self.plan.column_format(col, header))
 
-        header_idx = headers.index(header)
-        opt = {}
-        for option_target, col_options in column_options.items():
-            if is_valid_excel_col_range(option_target):
-                col_name_1, col_name_2 = option_target.split(':')
-                col_1 = xl_cell_to_rowcol(col_name_1.upper() + '1')[1]
-                col_2 = xl_cell_to_rowcol(col_name_2.upper() + '1')[1]
-                if col_1 <= header_idx <= col_2:
-                    opt.update(col_options)
-            elif option_target == header:
-                opt.update(col_options)
+    def _get_column_options(self, col, header):
+        """Collect options of column matched by sheet config"""
 
-        return opt
+        return self.plan.column_options(col, header)
 
-    def _add_column_format(
-        self, headers, column_formats, column_options, df, width_ratio=1
-    ):
+    def _add_column_format(self, headers, df, width_ratio=1):
         """Adding field formats"""
 
         for col, header in enumerate(headers):
@@ -188,22 +369,14 @@ class Sheet:
             if col_width > 20:
                 col_width = col_width * width_ratio
 
-            col_fmt_def = self._get_column_formats(header, headers, column_formats)
-            col_fmt = self.workbook.add_format(col_fmt_def)
-            self.formats[self.sheet_name + '_fmt_' + str(col)] = {
-                'format_def': col_fmt_def,
-                'format_obj': col_fmt,
-            }
-
-            col_opt_def = self._get_column_options(header, headers, column_options)
-            self.formats[self.sheet_name + '_opt_' + str(col)] = {
-                'format_def': col_opt_def,
-                'format_obj': None,
-            }
+            col_fmt_def = self._get_column_formats(col, header)
+            col_fmt = self.formats.add(col_fmt_def)
+            col_opt_def = self._get_column_options(col, header)
 
             self.sheet.set_column(
                 xl_range(0, col, 1048575, col), col_width, col_fmt, col_opt_def
             )
+            self.column_settings[col] = (col_fmt, col_opt_def)
 
     def _add_data_validation(self, headers, data_validations):
         """Adding data validation"""
@@ -231,42 +404,41 @@ class Sheet:
 
                 for i in range(len(cond_list)):
                     if conditional_formats.get('*'):
-                        cond_format = cond_list[i].get('format')
                         cell_range = xl_range(0, 0, shape[0], shape[1] - 1)
                     else:
-                        cond_format = cond_list[i].get('format')
                         cell_range = xl_range(0, col, shape[0], col)
 
-                    if type(cond_format) is dict:
-                        format = self.workbook.add_format(cond_format)
-                        tag = self.sheet_name + '_cond_' + str(i) + '_' + str(col)
-                        self.formats[tag] = format
-                        cond_list[i]['format'] = format
-                        self.sheet.conditional_format(cell_range, cond_list[i])
-                    else:
-                        cond_list[i]['format'] = self.formats.get(cond_format)
-                        self.sheet.conditional_format(cell_range, cond_list[i])
+                    # sheet config is not changed, format object is set on copy
+                    cond_format = cond_list[i].get('format')
+                    self.sheet.conditional_format(
+                        cell_range,
+                        {
+                            **cond_list[i],
+                            'format': self.formats.format_obj(cond_format),
+                        },
+                    )
 
     def auto_adjust_all_columns_width(self, df):
         """Auto-adjust all columns' width"""
 
         for column in df:
-            column_width = max(df[column].astype(str).map(len).max(), len(column))
-            col_idx = df.columns.get_loc(column)
-            self.sheet.set_column(col_idx, col_idx, column_width + 3)
+            self.auto_adjust_column_width(df, column)
 
     def auto_adjust_column_width(self, df, column_name):
         """Auto-adjust columns' width"""
 
-        column_width = max(df[column_name].astype(str).map(len).max(), len(column_name))
-        col_idx = df.columns.get_loc(column_name)
-        self.sheet.set_column(col_idx, col_idx, column_width + 3)
+        column_width = self._get_column_width(df, column_name)
+        self.set_column_width(df, column_name, column_width)
 
     def set_column_width(self, df, column_name, column_width):
-        """Manually adjust the wifth of column 'this_is_a_long_column_name"""
+        """Manually adjust the wifth of column 'this_is_a_long_column_name
+
+        Format and options already set on column are kept.
+        """
 
         col_idx = df.columns.get_loc(column_name)
-        self.sheet.set_column(col_idx, col_idx, column_width)
+        col_fmt, col_opt_def = self.column_settings.get(col_idx, (None, None))
+        self.sheet.set_column(col_idx, col_idx, column_width, col_fmt, col_opt_def)
 
     def set_freeze_panes(self, cell):
         """Freeze panes abowe and left to passed row/col zero indexed"""
@@ -282,22 +454,16 @@ class Sheet:
     def apply_formatting(self):
         self.logger.debug('- appying header formats')
         width_ratio = 0.5
+        headers = self.df.columns.tolist()
         header_formats = self.sheet_config.get('header_formats', {})
         if header_formats:
-            headers = self.df.columns.tolist()
             self._add_header_format(headers, header_formats)
 
         self.logger.debug('- appying columns formats and/or options')
         column_formats = self.sheet_config.get('column_formats', {})
         column_options = self.sheet_config.get('column_options', {})
         if column_formats or column_options:
-            self._add_column_format(
-                headers,
-                column_formats,
-                column_options,
-                self.df,
-                width_ratio,
-            )
+            self._add_column_format(headers, self.df, width_ratio)
 
         self.logger.debug('- appying conditional formats')
         conditional_formats = self.sheet_config.get('conditional_formats', [])
@@ -321,76 +487,270 @@ class Sheet:
         self.set_autofilter(self.df.shape)
 
 
-class Excel:
-    filepath = ''
-    formats = {}
-    options = {}
+class StreamingSheet(Sheet):
+    """Sheet written row by row in XlsxWriter constant_memory mode
+
+    Header, column widths and formats are set before rows are written,
+    as written rows are flushed to file. Rows over Excel limit are written
+    to next sheets named <sheet_name>_2, <sheet_name>_3... with the same
+    header and formatting.
+    """
+
+    max_rows = 1048575
+    chunksize = 10000
+
+    def write(self, writer, apply_formats=True):
+        """Write DataFrame in parts of max_rows rows"""
+        self.sheets = []
+        base_name = self.sheet_name
+        df = self.df
+        for i, start in enumerate(range(0, max(len(df), 1), self.max_rows)):
+            if i:
+                suffix = f'_{i + 1}'
+                self.sheet_name = base_name[: 31 - len(suffix)] + suffix
+            self.sheet = self.workbook.add_worksheet(self.sheet_name)
+            self.sheets.append(self.sheet)
+            self.df = df.iloc[start : start + self.max_rows]
+            self.write_part(apply_formats)
+        if len(self.sheets) > 1:
+            self.logger.debug(
+                f'- sheet {base_name} split into {len(self.sheets)} sheets'
+            )
+        self.sheet_name = base_name
+        self.df = df
 
-    def __init__(
-        self, file_config=None, config=None, data_results=None, logger=None, **kwargs
-    ):
-        # perform checks
-        if not file_config:
-            raise ValueError("Empty File config!")
+    def write_part(self, apply_formats=True):
+        headers = self.df.columns.tolist()
+        header_formats = self.sheet_config.get('header_formats', {})
+        if apply_formats and header_formats:
+            self._add_header_format(headers, header_formats)
+        else:
+            header_fmt = self.formats.get('header')
+            self.sheet.write_row(
+                0, 0, headers, header_fmt['format_obj'] if header_fmt else None
+            )
+        if apply_formats:
+            self._set_columns(headers)
+        self._write_rows()
+        if apply_formats:
+            self._apply_sheet_formatting(headers)
 
-        if not config:
-            raise ValueError("Empty Report config!")
+    def _set_columns(self, headers):
+        """Set width, format and options of all columns before rows"""
+        for col, header in enumerate(headers):
+            col_width = self._get_column_width(self.df, header)
+            col_fmt_def = self._get_column_formats(col, header)
+            kind = self.stats.kind(header)
+            if kind in DATE_FORMATS:
+                col_fmt_def = {'num_format': DATE_FORMATS[kind], **col_fmt_def}
+            col_fmt = self.formats.add(col_fmt_def) if col_fmt_def else None
+            col_opt_def = self._get_column_options(col, header)
+            self.sheet.set_column(col, col, col_width, col_fmt, col_opt_def)
+
+    def _write_rows(self):
+        """Write rows in order, NaN and NaT are written as blank cells"""
+        for start in range(0, len(self.df), self.chunksize):
+            chunk = self.df.iloc[start : start + self.chunksize]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row, values in enumerate(
+                chunk.itertuples(index=False, name=None), start=start + 1
+            ):
+                self.sheet.write_row(row, 0, values)
+
+    def _apply_sheet_formatting(self, headers):
+        conditional_formats = self.sheet_config.get('conditional_formats', [])
+        if conditional_formats:
+            self._add_conditional_format(headers, conditional_formats, self.df.shape)
 
-        if not data_results:
-            raise ValueError("Empty Data Results!")
+        data_validations = self.sheet_config.get('data_validations', {})
+        if data_validations:
+            self._add_data_validation(headers, data_validations)
+
+        cell = self.sheet_config.get('freeze_panes', 'A2')
+        if cell:
+            self.set_freeze_panes(cell)
+
+        self.set_autofilter(self.df.shape)
 
-        self.file_config = file_config
-        self.config = config
-        self.data_results = data_results
-        self.logger = logger or logging.getLogger('dummy')
 
-        self.filepath = self.config.report_arch_path / self.format_filename(
-            self.file_config.get('filename')
+class Excel(FileWriter):
+    filepath = ''
+
+    def __init__(
+        self, file_config=None, config=None, data_results=None, logger=None, **kwargs
+    ):
+        super().__init__(file_config, config, data_results, logger, **kwargs)
+        self.column_stats = kwargs.get('column_stats') or ColumnStatsCache()
+        # sheets over csv_fallback_rows rows are written to compressed CSV
+        self.csv_fallback_rows = self.file_config.get('csv_fallback_rows')
+        if self.csv_fallback_rows is None:
+            self.csv_fallback_rows = kwargs.get('csv_fallback_rows')
+        self.fallback_files = []
+        self.sheets_written = 0
+
+        # streaming mode writes rows straight to file in constant memory
+        self.write_mode = self.file_config.get('write_mode', 'default')
+        options = {'constant_memory': True} if self.write_mode == 'streaming' else {}
+        self.writer = pd.ExcelWriter(
+            self.filepath, engine='xlsxwriter', engine_kwargs={'options': options}
         )
-        self.writer = pd.ExcelWriter(self.filepath, engine='xlsxwriter')
         # self.workbook = self.writer.book
 
         self.load_formats()
 
-    def format_filename(self, filename, options=None):
-        """Replace known placeholders in filename
-        or passed as tuples({placeholder}, value)
+    def load_formats(self):
+        """Load global formats and store definition dict and format object
+
+        Formats are kept per workbook, equal definitions share one format.
         """
+        self.formats = FormatRegistry(self.writer.book, self.config.report_xls_formats)
 
-        f = filename.replace(r'{date}', date.today().strftime("%Y-%m-%d"))
-        if options:
-            for placeholder, value in options:
-                f = f.replace(placeholder, value)
-        return f
+    def write_sheet(self, sheet_id):
+        """Create new Sheet instance which writes DF and applies formatting
 
-    def load_formats(self):
-        """Load global formats and store definition dict and format object"""
-        for format_tag, format_def in self.config.report_xls_formats.items():
-            self.formats[format_tag] = {
-                'format_def': format_def,
-                'format_obj': self.writer.book.add_format(format_def),
-            }
+        Sheet is a consumer of its data_src in results store.
+        """
 
-    def write_sheet(self, sheet_id):
-        """Create new Sheet instance which writes DF and applies formatting"""
+        sheet_config = self.file_config['sheets'][sheet_id]
+        if self.csv_fallback_rows is not None:
+            df = self.data_results.get(sheet_config.get('data_src'))
+            if isinstance(df, pd.DataFrame) and len(df) > self.csv_fallback_rows:
+                self.write_fallback_sheet(sheet_id, len(df))
+                return
 
-        Sheet(
+        sheet_cls = StreamingSheet if self.write_mode == 'streaming' else Sheet
+        sheet_cls(
             self.writer,
             self.data_results,
-            self.file_config['sheets'][sheet_id],
+            sheet_config,
             self.formats,
+            logger=self.logger,
+            write_mode=self.write_mode,
+            column_stats=self.column_stats,
         )
+        self.sheets_written += 1
+        self.release(sheet_config)
 
-    def write_sheets(self):
-        """Write all sheets"""
+    def write_fallback_sheet(self, sheet_id, rows):
+        """Write sheet to gzip compressed CSV <filename>_<sheet_name>.csv.gz"""
 
-        for sheet_id in self.file_config.get('sheets'):
-            self.write_sheet(sheet_id)
+        sheet_config = self.file_config['sheets'][sheet_id]
+        filename = (
+            f'{self.filepath.stem}_{sheet_config.get("sheet_name")}'
+            f'{self.filepath.suffix}'
+        )
+        self.logger.warning(
+            f'- sheet {sheet_config.get("sheet_name")} has {rows} rows over '
+            f'{self.csv_fallback_rows}, written to compressed CSV'
+        )
+        csv = CsvWriter(
+            {
+                **self.file_config,
+                'filename': filename,
+                'format': 'csv',
+                'compression': 'gzip',
+                'sheets': {sheet_id: sheet_config},
+            },
+            self.config,
+            self.data_results,
+            self.logger,
+        )
+        csv.write_sheets()
+        self.fallback_files.append(csv.close())
 
     def close(self):
-        """Save excel"""
+        """Save excel, return its filepath or list with fallback CSV files
+
+        Excel file without any written sheet is removed.
+        """
         self.writer.close()
-        return self.filepath
+        if not self.fallback_files:
+            return self.filepath
+        if not self.sheets_written:
+            self.filepath.unlink()
+            filepaths = self.fallback_files
+        else:
+            filepaths = [self.filepath, *self.fallback_files]
+        return filepaths[0] if len(filepaths) == 1 else filepaths
+
+
+def share_frame(df, dirpath, name) -> Path:
+    """Write DataFrame for worker process, read back with load_shared_frame
+
+    DataFrame is written as uncompressed Arrow IPC file, which worker maps
+    into memory. Index is not written as sheets are written without it.
+    DataFrames not convertible to Arrow are pickled.
+    """
+    filepath = Path(dirpath) / f'{name}.arrow'
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        filepath = filepath.with_suffix('.pkl')
+        df.reset_index(drop=True).to_pickle(filepath)
+        return filepath
+    feather.write_feather(table, filepath, compression='uncompressed')
+    return filepath
+
+
+def load_shared_frame(filepath) -> pd.DataFrame:
+    filepath = Path(filepath)
+    if filepath.suffix == '.pkl':
+        return pd.read_pickle(filepath)
+    return feather.read_table(filepath, memory_map=True).to_pandas()
+
+
+def get_writer(file_config):
+    """Get writer class of rpt_config entry format, Excel by default"""
+    file_format = file_config.get('format') or 'xlsx'
+    if file_format not in WRITERS:
+        raise ValueError(f'Unknown file format {file_format}!')
+    return WRITERS[file_format]
+
+
+def worker_kwargs(kwargs) -> dict:
+    """Get run kwargs which can be passed to worker process
+
+    Objects living in parent process only (SMTP pool, email dispatcher,
+    column statistics) are not passed.
+    """
+    passed = dict()
+    for name, value in kwargs.items():
+        if name == 'column_stats':
+            continue
+        try:
+            pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            continue
+        passed[name] = value
+    return passed
+
+
+class ForwardHandler(logging.Handler):
+    """Handle log records of worker processes by loggers of parent process"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def init_worker(queue, level):
+    """Send log records of worker process to queue read by parent process"""
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(queue)]
+    root.setLevel(level)
+
+
+def create_file_worker(file_config, config, sources, logger_name, **kwargs):
+    """Write one report file in worker process from shared DataFrames"""
+    logger = logging.getLogger(logger_name)
+    data_results = {name: load_shared_frame(path) for name, path in sources.items()}
+    writer = get_writer(file_config)(
+        file_config, config, data_results, logger, **kwargs
+    )
+    writer.write_sheets()
+    return writer.close()
+
+
+register_writer('xlsx', Excel)
 
 
 class ExcelCreator:
@@ -403,8 +763,14 @@ class ExcelCreator:
         self.logger = logger or logging.getLogger('dummy')
         self.data_results = dict()
         self.email_attachments = dict()
+        # statistics of data_src columns shared by all sheets and files
+        self.column_stats = ColumnStatsCache(kwargs.get('stats_sample_size'))
 
     def set_data_results(self, data_results):
+        # results store is shared to not keep released results alive
+        if isinstance(data_results, ResultsStore):
+            self.data_results = data_results
+            return
         for name, value in data_results.items():
             if isinstance(value, pd.DataFrame):
                 self.data_results[name] = value
@@ -415,19 +781,105 @@ class ExcelCreator:
     def create_file(self, file_id, file_config, **kwargs):
         self.logger.info(f'Writing Excel file in: {self.config.report_arch_path}')
 
-        xls = Excel(file_config, self.config, self.data_results, self.logger, **kwargs)
+        kwargs['column_stats'] = self.column_stats
+        writer_cls = get_writer(file_config)
+        xls = writer_cls(
+            file_config, self.config, self.data_results, self.logger, **kwargs
+        )
         xls.write_sheets()
         filepath = xls.close()
-        self.logger.info(f'Excel file created: {os.path.split(filepath)[-1]}')
+        for path in filepath if isinstance(filepath, list) else [filepath]:
+            self.logger.info(f'Excel file created: {os.path.split(path)[-1]}')
 
         if file_config.get('send_email', False):
             self.email_attachments[file_id] = filepath
 
         return filepath
 
+    def create_files_parallel(self, **kwargs) -> dict:
+        """Write Excel files in parallel_files worker processes
+
+        DataFrames used by sheets are passed to workers as Arrow IPC files,
+        each one written once. Files are returned and added to attachments
+        in report config order. First error of worker is raised.
+        """
+        parallel_files = kwargs.get('parallel_files', 1) or 1
+        rpt_config = self.config.report_rpt_config
+        config = SimpleNamespace(
+            report_arch_path=self.config.report_arch_path,
+            report_xls_formats=self.config.report_xls_formats,
+        )
+        self.logger.info(
+            f'Writing {len(rpt_config)} Excel files in: {self.config.report_arch_path}'
+            f' ({parallel_files} processes)'
+        )
+
+        with tempfile.TemporaryDirectory(prefix='easy_reports_') as tmp:
+            shared = dict()
+            file_sources = dict()
+            for file_id, file_config in rpt_config.items():
+                file_sources[file_id] = dict()
+                for sheet_config in file_config.get('sheets').values():
+                    name = sheet_config.get('data_src')
+                    df = self.data_results.get(name)
+                    if not isinstance(df, pd.DataFrame):
+                        continue
+                    if name not in shared:
+                        shared[name] = share_frame(df, tmp, len(shared))
+                    file_sources[file_id][name] = shared[name]
+
+            # workers are spawned, forking process with running email and db
+            # pool threads could deadlock
+            context = multiprocessing.get_context('spawn')
+            queue = context.Queue()
+            listener = QueueListener(queue, ForwardHandler())
+            listener.start()
+            executor = ProcessPoolExecutor(
+                max_workers=parallel_files,
+                mp_context=context,
+                initializer=init_worker,
+                initargs=(queue, self.logger.getEffectiveLevel()),
+            )
+            try:
+                futures = {
+                    file_id: executor.submit(
+                        create_file_worker,
+                        file_config,
+                        config,
+                        file_sources[file_id],
+                        self.logger.name,
+                        **worker_kwargs(kwargs),
+                        column_stats=ColumnStatsCache(self.column_stats.sample_size),
+                    )
+                    for file_id, file_config in rpt_config.items()
+                }
+                filepaths = {
+                    file_id: future.result() for file_id, future in futures.items()
+                }
+            finally:
+                executor.shutdown()
+                listener.stop()
+
+        for file_id, file_config in rpt_config.items():
+            filepath = filepaths[file_id]
+            for path in filepath if isinstance(filepath, list) else [filepath]:
+                self.logger.info(f'Excel file created: {os.path.split(path)[-1]}')
+            if file_config.get('send_email', False):
+                self.email_attachments[file_id] = filepath
+            if isinstance(self.data_results, ResultsStore):
+                for sheet_config in file_config.get('sheets').values():
+                    self.data_results.release(sheet_config.get('data_src'))
+
+        return filepaths
+
     def run(self, **kwargs):
         self.logger.info('Creation of Excel files...')
 
+        parallel_files = kwargs.get('parallel_files', 1) or 1
+        if parallel_files > 1 and len(self.config.report_rpt_config) > 1:
+            self.create_files_parallel(**kwargs)
+            return
+
         for file_id, file_config in self.config.report_rpt_config.items():
             self.create_file(file_id, file_config, **kwargs)
 
@@ -435,3 +887,4 @@ class ExcelCreator:
         """Clean after run"""
         self.data_results = dict()
         self.email_attachments = dict()
+        self.column_stats.clear()
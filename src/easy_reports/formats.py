@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import fnmatch
+import logging
+from collections.abc import Mapping
+
+from xlsxwriter.utility import xl_cell_to_rowcol
+
+
+def is_valid_excel_col_range(c):
+    """Check if string literal is valid Excel column range"""
+    m = re.match(r'^([A-Z]{1,2}:[A-Z]{1,2})$', c)
+    return bool(m)
+
+
+def format_key(format_def) -> str:
+    """Get hashable key of format definition, same for equal definitions"""
+    return json.dumps(format_def, sort_keys=True, default=str)
+
+
+class FormatRegistry(Mapping):
+    """Formats of one workbook
+
+    Named formats (global XLS_FORMATS) are kept as tag -> {format_def,
+    format_obj}. Formats added by definition are deduplicated: equal
+    definitions share one workbook format.
+    """
+
+    def __init__(self, workbook, format_defs=None):
+        self.workbook = workbook
+        self._named = dict()
+        self._objects = dict()
+        for tag, format_def in (format_defs or {}).items():
+            self.register(tag, format_def)
+
+    def __getitem__(self, tag):
+        return self._named[tag]
+
+    def __iter__(self):
+        return iter(self._named)
+
+    def __len__(self):
+        return len(self._named)
+
+    def register(self, tag, format_def):
+        """Add named format"""
+        self._named[tag] = {
+            'format_def': format_def,
+            'format_obj': self.add(format_def),
+        }
+        return self._named[tag]
+
+    def add(self, format_def):
+        """Get workbook format of definition, create it once"""
+        key = format_key(format_def)
+        if key not in self._objects:
+            self._objects[key] = self.workbook.add_format(format_def)
+        return self._objects[key]
+
+    def format_def(self, tag_or_def) -> dict:
+        """Get definition of named format or definition itself"""
+        if isinstance(tag_or_def, dict):
+            return tag_or_def
+        named = self._named.get(tag_or_def)
+        return named['format_def'] if named else None
+
+    def format_obj(self, tag_or_def):
+        """Get workbook format of named format or of definition"""
+        if isinstance(tag_or_def, dict):
+            return self.add(tag_or_def)
+        named = self._named.get(tag_or_def)
+        return named['format_obj'] if named else None
+
+    @property
+    def count(self) -> int:
+        """Number of workbook formats created"""
+        return len(self._objects)
+
+
+class Rule:
+    """Target of column rule: Excel column range, header or header pattern"""
+
+    def __init__(self, target, patterns=True):
+        self.target = target
+        self.columns = None
+        self.pattern = None
+        if isinstance(target, str) and is_valid_excel_col_range(target):
+            col_name_1, col_name_2 = target.split(':')
+            self.columns = (
+                xl_cell_to_rowcol(col_name_1.upper() + '1')[1],
+                xl_cell_to_rowcol(col_name_2.upper() + '1')[1],
+            )
+        if patterns and isinstance(target, str):
+            self.pattern = re.compile(fnmatch.translate(os.path.normcase(target)))
+
+    def match(self, col, header) -> bool:
+        if self.columns is not None and self.columns[0] <= col <= self.columns[1]:
+            return True
+        if self.pattern is not None:
+            return bool(self.pattern.match(os.path.normcase(str(header))))
+        return header == self.target
+
+
+class FormatPlan:
+    """Column formats, column options and header formats of sheet config
+
+    Rules of sheet config are compiled once, formats and options of each
+    column are resolved once and reused by all worksheets of the sheet.
+    Column format rules match Excel column ranges and header patterns,
+    column options rules match ranges and exact headers.
+    """
+
+    def __init__(self, sheet_config, formats, logger=None):
+        self.formats = formats
+        self.logger = logger or logging.getLogger('dummy')
+        self.header_formats = sheet_config.get('header_formats', {}) or {}
+        self.format_rules = [
+            (Rule(target), value)
+            for target, value in (sheet_config.get('column_formats', {}) or {}).items()
+        ]
+        self.option_rules = [
+            (Rule(target, patterns=False), value)
+            for target, value in (sheet_config.get('column_options', {}) or {}).items()
+        ]
+        self._column_formats = dict()
+        self._column_options = dict()
+
+    def column_format(self, col, header) -> dict:
+        """Get definition of column format merged from matching rules"""
+        if (col, header) not in self._column_formats:
+            fmt = {}
+            for rule, value in self.format_rules:
+                if not rule.match(col, header):
+                    continue
+                format_def = (
+                    self.formats.format_def(value)
+                    if isinstance(value, (dict, str))
+                    else None
+                )
+                if format_def is None:
+                    self.logger.error(
+                        f'Format literal: {value} is not defined in global XLS_FORMATS!'
+                    )
+                    continue
+                fmt.update(format_def)
+            self._column_formats[(col, header)] = fmt
+        return dict(self._column_formats[(col, header)])
+
+    def column_options(self, col, header) -> dict:
+        """Get column options merged from matching rules"""
+        if (col, header) not in self._column_options:
+            opt = {}
+            for rule, value in self.option_rules:
+                if rule.match(col, header):
+                    opt.update(value)
+            self._column_options[(col, header)] = opt
+        return dict(self._column_options[(col, header)])
+
+    def header_format(self, header):
+        """Get header format: explicit, '*' or global header format"""
+        for key in (header, '*'):
+            fmt = self.header_formats.get(key)
+            if fmt:
+                return fmt
+        return 'header'
@@ -0,0 +1,148 @@
+import logging
+import pandas as pd
+from pandas.errors import MergeError
+
+
+def join_codes(left, right, keys):
+    """Factorize join keys of both DataFrames into shared integer codes
+
+    Keys are aligned first: numeric keys joined with text keys are compared
+    as strings. NULL keys match each other like in pd.merge.
+    """
+    left_codes = None
+    right_codes = None
+    for key in keys:
+        lkey, rkey = left[key], right[key]
+        if pd.api.types.is_numeric_dtype(lkey) != pd.api.types.is_numeric_dtype(rkey):
+            lkey, rkey = lkey.astype(str), rkey.astype(str)
+        codes, uniques = pd.factorize(
+            pd.concat([lkey, rkey], ignore_index=True), use_na_sentinel=False
+        )
+        if left_codes is None:
+            combined = codes
+        else:
+            previous = pd.concat(
+                [pd.Series(left_codes), pd.Series(right_codes)], ignore_index=True
+            ).to_numpy()
+            combined, _ = pd.factorize(previous * len(uniques) + codes)
+        left_codes, right_codes = combined[: len(lkey)], combined[len(lkey) :]
+    return left_codes, right_codes
+
+
+class JoinPlanner:
+    """Join sql_list DataFrames into one
+
+    Left joins on unique right keys are resolved by lookup of shared integer
+    key codes in right index and all looked up columns are concatenated once.
+    Other joins run through pd.merge. Row count expansion of each join is
+    logged and can be limited with max_expansion ratio.
+    """
+
+    def __init__(self, logger=None, max_expansion=None):
+        self.logger = logger or logging.getLogger('dummy')
+        self.max_expansion = max_expansion
+
+    def check_expansion(self, name, rows_before, rows_after, max_expansion):
+        ratio = rows_after / rows_before if rows_before else 1
+        self.logger.debug(
+            f'- join {name}: {rows_before} -> {rows_after} rows (x{ratio:.2f})'
+        )
+        if max_expansion is not None and ratio > max_expansion:
+            raise ValueError(
+                f'Join of {name} expands rows x{ratio:.2f} '
+                f'over limit x{max_expansion}!'
+            )
+
+    @staticmethod
+    def validate_unique(validate, left_codes):
+        """Check pd.merge validate argument when right keys are unique"""
+        if validate in ('1:1', 'one_to_one', '1:m', 'one_to_many'):
+            if not pd.Index(left_codes).is_unique:
+                raise MergeError(
+                    f'Merge keys are not unique in left dataset; not a {validate} merge'
+                )
+
+    def join(self, df_list, options=None, names=None) -> pd.DataFrame:
+        """Join list of [DataFrame, join keys] in order
+
+        Options of each join may set: how, suffixes, validate, max_expansion.
+        DataFrames without join keys are skipped.
+        """
+        options = options or [{}] * len(df_list)
+        names = names or [str(i) for i in range(len(df_list))]
+
+        base = df_list[0][0].reset_index(drop=True)
+        blocks = []
+
+        def materialize():
+            return pd.concat([base] + blocks, axis=1) if blocks else base
+
+        def rename(df, overlap, suffix):
+            df.columns = [f'{c}{suffix}' if c in overlap else c for c in df.columns]
+
+        for i in range(1, len(df_list)):
+            right, keys = df_list[i][0], df_list[i][1]
+            if keys is None:
+                continue
+            keys = [keys] if isinstance(keys, str) else list(keys)
+            opts = options[i] or {}
+            how = opts.get('how', 'left')
+            suffixes = tuple(opts.get('suffixes', ('_x', '_y')))
+            validate = opts.get('validate')
+            max_expansion = opts.get('max_expansion', self.max_expansion)
+
+            if how == 'left' and all(k in base.columns for k in keys):
+                left_codes, right_codes = join_codes(base, right, keys)
+                right_index = pd.Index(right_codes)
+                if right_index.is_unique:
+                    self.validate_unique(validate, left_codes)
+                    self.check_expansion(names[i], len(base), len(base), max_expansion)
+                    right_columns = [c for c in right.columns if c not in keys]
+                    current = set(base.columns).union(*[b.columns for b in blocks])
+                    overlap = set(right_columns) & (current - set(keys))
+                    renamed = [
+                        f'{c}{suffixes[0]}' if c in overlap else c for c in current
+                    ] + [
+                        f'{c}{suffixes[1]}' if c in overlap else c
+                        for c in right_columns
+                    ]
+                    if len(renamed) != len(set(renamed)):
+                        raise MergeError(
+                            f'Passing suffixes {suffixes} causes duplicate columns '
+                            f'in join of {names[i]}'
+                        )
+                    for df in [base] + blocks:
+                        rename(df, overlap, suffixes[0])
+                    block = (
+                        right[right_columns]
+                        .reset_index(drop=True)
+                        .reindex(right_index.get_indexer(left_codes))
+                    )
+                    block.index = base.index
+                    rename(block, overlap, suffixes[1])
+                    blocks.append(block)
+                    continue
+
+            # fallback to pd.merge on materialized result
+            df = materialize()
+            left_codes, right_codes = join_codes(df, right, keys)
+            if how in ('left', 'inner'):
+                counts = pd.Series(right_codes).value_counts()
+                matches = pd.Series(left_codes).map(counts)
+                rows = matches.sum() + (matches.isna().sum() if how == 'left' else 0)
+                self.check_expansion(names[i], len(df), int(rows), max_expansion)
+            right = right.copy()
+            for key in keys:
+                if pd.api.types.is_numeric_dtype(
+                    df[key]
+                ) != pd.api.types.is_numeric_dtype(right[key]):
+                    df[key], right[key] = df[key].astype(str), right[key].astype(str)
+            rows_before = len(df)
+            df = pd.merge(
+                df, right, how=how, on=keys, suffixes=suffixes, validate=validate
+            )
+            if how not in ('left', 'inner'):
+                self.check_expansion(names[i], rows_before, len(df), max_expansion)
+            base, blocks = df, []
+
+        return materialize()
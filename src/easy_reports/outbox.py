@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+from types import SimpleNamespace
+
+from . import email_smtplib
+
+STATES = ('pending', 'processing', 'sent', 'failed')
+
+
+def outbox_path(base_config) -> Path:
+    """Get outbox folder: OUTBOX_BASE_PATH or OUTBOX_DIR in BASE_PATH"""
+    if getattr(base_config, 'OUTBOX_BASE_PATH', None):
+        return Path(base_config.OUTBOX_BASE_PATH).resolve()
+    return Path(base_config.BASE_PATH).resolve() / base_config.OUTBOX_DIR
+
+
+def email_id(message) -> str:
+    """Get id of message, the same for the same message and attachment files"""
+    files = []
+    for filepath in message['attachments']:
+        stat = Path(filepath).stat()
+        files.append((str(filepath), stat.st_size, stat.st_mtime_ns))
+    key = json.dumps(
+        [message[k] for k in ('from', 'to', 'cc', 'subject', 'body')] + [files]
+    )
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+class Outbox:
+    """Spool of rendered emails sent later by easy-reports send-outbox
+
+    Each email is JSON file with recipients, subject, body and paths of
+    attachments moved between pending, processing, sent and failed folders.
+    Email already pending or sent is not added again. Email not sent is
+    retried with delay doubled after each attempt and is moved to failed
+    after max_attempts attempts.
+    """
+
+    def __init__(self, path, logger=None, max_attempts=5, retry_delay=60):
+        self.path = Path(path)
+        self.logger = logger or logging.getLogger('dummy')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        for state in STATES:
+            (self.path / state).mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, base_config, logger=None):
+        return cls(
+            outbox_path(base_config),
+            logger,
+            max_attempts=base_config.OUTBOX_MAX_ATTEMPTS,
+            retry_delay=base_config.OUTBOX_RETRY_DELAY,
+        )
+
+    def filepath(self, state, id) -> Path:
+        return self.path / state / f'{id}.json'
+
+    def write(self, state, entry):
+        """Write entry file at once, so it is never read half written"""
+        filepath = self.filepath(state, entry['id'])
+        tmp = filepath.with_suffix('.tmp')
+        tmp.write_text(json.dumps(entry, indent=2, default=str), encoding='UTF8')
+        tmp.replace(filepath)
+
+    def entries(self, state='pending') -> list:
+        return sorted((self.path / state).glob('*.json'))
+
+    def put(self, email, report=None):
+        """Add email to outbox, return its id or None when not added
+
+        Email already added or with missing attachment file is not added.
+        """
+        entry = {
+            'from': email.onbehalf,
+            'to': email.to,
+            'cc': email.cc,
+            'subject': email.subject,
+            'body': email.body,
+            'attachments': [str(Path(a).resolve()) for a in email.attachments],
+        }
+        try:
+            entry['id'] = email_id(entry)
+        except OSError as e:
+            self.logger.error(
+                f'Email not added to outbox! {e}. Subject: {email.subject}'
+            )
+            return None
+        for state in ('pending', 'processing', 'sent'):
+            if self.filepath(state, entry['id']).exists():
+                self.logger.info(
+                    f'Email already in outbox ({state}). Subject: {email.subject}'
+                )
+                return None
+        entry.update(
+            report=report,
+            created=datetime.now().isoformat(timespec='seconds'),
+            attempts=0,
+            next_attempt=0,
+            error=None,
+        )
+        self.write('pending', entry)
+        self.filepath('failed', entry['id']).unlink(missing_ok=True)
+        self.logger.info(f'Email added to outbox. Subject: {email.subject}')
+        return entry['id']
+
+    def claim(self, limit=None, now=None, skip=()) -> list:
+        """Move due pending emails to processing, return their entries
+
+        Emails of ids in skip and moved by other worker first are skipped.
+        Modification time of claimed file is set to claim time, which is
+        checked by recover.
+        """
+        now = time.time() if now is None else now
+        claimed = []
+        for filepath in self.entries('pending'):
+            if limit is not None and len(claimed) >= limit:
+                break
+            if filepath.stem in skip:
+                continue
+            try:
+                entry = json.loads(filepath.read_text(encoding='UTF8'))
+                if entry['next_attempt'] > now:
+                    continue
+                os.utime(filepath)
+                filepath.replace(self.filepath('processing', entry['id']))
+            except FileNotFoundError:
+                continue
+            claimed.append(entry)
+        return claimed
+
+    def complete(self, entry):
+        entry['sent'] = datetime.now().isoformat(timespec='seconds')
+        self.write('sent', entry)
+        self.filepath('processing', entry['id']).unlink(missing_ok=True)
+
+    def retry(self, entry, error, now=None):
+        """Return email to pending with backoff or move it to failed"""
+        now = time.time() if now is None else now
+        entry['attempts'] += 1
+        entry['error'] = str(error)
+        if entry['attempts'] >= self.max_attempts:
+            state = 'failed'
+            self.logger.error(
+                f'Email failed after {entry["attempts"]} attempts. '
+                f'Subject: {entry["subject"]} {error}'
+            )
+        else:
+            state = 'pending'
+            entry['next_attempt'] = now + self.retry_delay * 2 ** (
+                entry['attempts'] - 1
+            )
+        self.write(state, entry)
+        self.filepath('processing', entry['id']).unlink(missing_ok=True)
+
+    def recover(self, stale_after=3600, now=None) -> int:
+        """Return emails left in processing by stopped worker to pending
+
+        Email is stale when it was claimed more than stale_after seconds ago.
+        """
+        now = time.time() if now is None else now
+        count = 0
+        for filepath in self.entries('processing'):
+            try:
+                if now - filepath.stat().st_mtime < stale_after:
+                    continue
+                filepath.replace(self.path / 'pending' / filepath.name)
+            except FileNotFoundError:
+                continue
+            count += 1
+        return count
+
+    def send(self, config, batch_size=50, pool=None, attachment_cache=None) -> dict:
+        """Send all due emails in batches, return count of sent and retried
+
+        Config gives SMTP server settings (email_server, email_port,
+        email_user, email_password). Emails share SMTP sessions and encoded
+        attachments. Each email is tried at most once per call.
+        """
+        own_pool = pool is None
+        pool = pool or email_smtplib.SMTPSessionPool(self.logger)
+        own_cache = attachment_cache is None
+        cache = attachment_cache or email_smtplib.AttachmentCache(logger=self.logger)
+        stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        tried = set()
+        self.recover()
+        try:
+            while True:
+                batch = self.claim(batch_size, skip=tried)
+                if not batch:
+                    break
+                tried.update(entry['id'] for entry in batch)
+                for entry in batch:
+                    email = email_smtplib.Email(
+                        {
+                            'to': entry['to'],
+                            'cc': entry['cc'],
+                            'onbehalf': entry['from'],
+                            'subject': entry['subject'],
+                            'body': entry['body'],
+                            'attachments': entry['attachments'],
+                        },
+                        config,
+                        self.logger,
+                        pool=pool,
+                        attachment_cache=cache,
+                    )
+                    if email.send():
+                        self.complete(entry)
+                        stats['sent'] += 1
+                        continue
+                    self.retry(entry, email.error)
+                    if entry['attempts'] >= self.max_attempts:
+                        stats['failed'] += 1
+                    else:
+                        stats['retried'] += 1
+        finally:
+            if own_pool:
+                pool.close()
+            if own_cache:
+                cache.close()
+        return stats
+
+
+def smtp_config(base_config):
+    """Get SMTP server settings of base config"""
+    return SimpleNamespace(
+        email_server=base_config.EMAIL_SERVER,
+        email_port=base_config.EMAIL_PORT,
+        email_user=base_config.EMAIL_USER,
+        email_password=base_config.EMAIL_PASSWORD,
+    )
@@ -0,0 +1,209 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def processor(fn=None, *, inputs=None, outputs=None, cache=False):
+    """Mark decorated function as processor
+
+    Processor can declare names of results it reads (inputs) and returns
+    (outputs). Declared processors run as soon as their inputs are ready and
+    are skipped when none of their outputs is used. Processors without
+    declaration run in order after all previous processors. Outputs of
+    declared processor with cache=True are reused between runs while its
+    inputs and source code are unchanged.
+    """
+
+    def decorate(fn):
+        fn.__processor__ = True
+        fn.__inputs__ = None if inputs is None else list(inputs)
+        fn.__outputs__ = None if outputs is None else list(outputs)
+        fn.__cache__ = cache
+        return fn
+
+    if fn is None:
+        return decorate
+    return decorate(fn)
+
+
+def is_declared(fn) -> bool:
+    """Check if processor declares both inputs and outputs"""
+    return (
+        getattr(fn, '__inputs__', None) is not None
+        and getattr(fn, '__outputs__', None) is not None
+    )
+
+
+def used_results(rpt_config) -> set:
+    """Get names of results used as data_src of report sheets"""
+    used = set()
+    for file_config in (rpt_config or {}).values():
+        for sheet_config in (file_config.get('sheets') or {}).values():
+            if sheet_config.get('data_src'):
+                used.add(sheet_config['data_src'])
+    return used
+
+
+class ProcessorGraph:
+    """Dependency graph of report processors
+
+    Processors without declared inputs and outputs are barriers: they run
+    after all previous processors and before all next ones. Between barriers
+    declared processors reading a result depend on all processors returning
+    it, processors returning the same result run in order of processors list.
+    """
+
+    def __init__(self, processors, logger=None):
+        self.processors = list(processors)
+        self.logger = logger or logging.getLogger('dummy')
+        self.dependencies = self.build()
+        self.order = self.sort()
+        self.skipped = set()
+
+    def build(self) -> dict:
+        dependencies = {i: set() for i in range(len(self.processors))}
+        barrier = None
+        segment = []
+
+        def link(segment):
+            producers = dict()
+            for i in segment:
+                for name in self.processors[i].__outputs__:
+                    if name in producers:
+                        dependencies[i].add(producers[name][-1])
+                    producers.setdefault(name, []).append(i)
+            for i in segment:
+                fn = self.processors[i]
+                for name in set(fn.__inputs__) - set(fn.__outputs__):
+                    dependencies[i].update(producers.get(name, []))
+
+        for i, fn in enumerate(self.processors):
+            if is_declared(fn):
+                if barrier is not None:
+                    dependencies[i].add(barrier)
+                segment.append(i)
+                continue
+            link(segment)
+            dependencies[i].update(segment)
+            if barrier is not None:
+                dependencies[i].add(barrier)
+            barrier = i
+            segment = []
+        link(segment)
+        return dependencies
+
+    def sort(self) -> list:
+        """Get topological order of processors, raise on dependency cycle"""
+        order = []
+        done = set()
+        while len(order) < len(self.processors):
+            ready = [
+                i
+                for i in range(len(self.processors))
+                if i not in done and self.dependencies[i] <= done
+            ]
+            if not ready:
+                names = [
+                    self.processors[i].__name__
+                    for i in range(len(self.processors))
+                    if i not in done
+                ]
+                raise ValueError(f'Processors dependency cycle: {names}!')
+            order.extend(ready)
+            done.update(ready)
+        return order
+
+    def prune(self, used):
+        """Skip declared processors which outputs are not used
+
+        Processors followed by barrier are kept as barrier can read any result.
+        """
+        barriers = [i for i, fn in enumerate(self.processors) if not is_declared(fn)]
+        last_barrier = max(barriers, default=-1)
+        needed = set(used)
+        self.skipped = set()
+        for i in reversed(self.order):
+            fn = self.processors[i]
+            if (
+                is_declared(fn)
+                and i > last_barrier
+                and not needed.intersection(fn.__outputs__)
+            ):
+                self.skipped.add(i)
+                self.logger.debug(f'- processor {fn.__name__} skipped, unused')
+                continue
+            if is_declared(fn):
+                needed.update(fn.__inputs__)
+        return self.skipped
+
+    def run(self, data, max_workers=1, cache=None, cache_all=False):
+        """Run processors passing data creator, add returned results to it
+
+        Error of processor is logged and its results are not added. With
+        processor cache declared processors marked with cache (or all when
+        cache_all) are taken from cache. Inputs of declared processors are
+        released in results store after processor is done or skipped.
+        """
+
+        def release_inputs(fn):
+            if is_declared(fn) and hasattr(data.results, 'release'):
+                for name in fn.__inputs__:
+                    data.results.release(name)
+
+        def run_one(fn):
+            key = None
+            if cache is not None and is_declared(fn):
+                if cache_all or getattr(fn, '__cache__', False):
+                    inputs = {
+                        name: (
+                            data.load_df(data.results[name][0])
+                            if isinstance(data.results.get(name), list)
+                            else data.results.get(name)
+                        )
+                        for name in fn.__inputs__
+                    }
+                    key = cache.make_key(fn, inputs)
+            if key is not None:
+                df_dict = cache.get(fn.__name__, key)
+                if df_dict is not None:
+                    self.logger.debug(f'- processor {fn.__name__} taken from cache')
+                    return df_dict
+
+            self.logger.debug(f'- running processor {fn.__name__}')
+            df_dict = fn(data)
+            if key is not None:
+                cache.put(fn.__name__, key, df_dict)
+            return df_dict
+
+        for i in self.skipped:
+            release_inputs(self.processors[i])
+
+        done = set(self.skipped)
+        running = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(done) < len(self.processors):
+                for i in self.order:
+                    if (
+                        i not in done
+                        and i not in running.values()
+                        and self.dependencies[i] <= done
+                        and len(running) < max_workers
+                    ):
+                        running[executor.submit(run_one, self.processors[i])] = i
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    done.add(i)
+                    try:
+                        df_dict = future.result()
+                    except Exception as e:
+                        self.logger.error(
+                            f'- processor {self.processors[i].__name__} failed: {e}'
+                        )
+                        continue
+                    finally:
+                        release_inputs(self.processors[i])
+
+                    # add datafre to results dictionary
+                    self.logger.debug(f'- {len(df_dict)} results added')
+                    for name, value in df_dict.items():
+                        data.results[name] = value
@@ -0,0 +1,99 @@
+import json
+import time
+import threading
+import contextlib
+from datetime import datetime
+
+STAGES = ('connect', 'execute', 'fetch', 'frame', 'cache_write')
+
+
+class QueryProfiler:
+    """Per-query timings and sizes of sql_list extraction
+
+    For each query wall time of connect, execute, fetch, DataFrame
+    construction and cache write stages is recorded together with row and
+    column count, in-memory bytes and cache file bytes. Stages are added to
+    query profiled in current thread.
+    """
+
+    def __init__(self):
+        self.queries = dict()
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, 'current', None)
+
+    def entry(self, name, db_alias=None) -> dict:
+        """Get profile of query, create it if missing"""
+        if name not in self.queries:
+            self.queries[name] = {
+                'query': name,
+                'db_alias': db_alias,
+                'started': datetime.now().isoformat(timespec='seconds'),
+                **{stage: 0.0 for stage in STAGES},
+                'total': 0.0,
+                'rows': None,
+                'columns': None,
+                'memory_bytes': None,
+                'cache_bytes': None,
+                'query_cache_hit': False,
+            }
+        return self.queries[name]
+
+    @contextlib.contextmanager
+    def query(self, name, db_alias=None):
+        """Profile query run in current thread"""
+        entry = self.entry(name, db_alias)
+        self._local.current = entry
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['total'] += time.perf_counter() - start
+            self._local.current = None
+
+    @contextlib.contextmanager
+    def stage(self, stage, name=None):
+        """Add time of stage to named query or query of current thread
+
+        Stage of query which is not profiled is not recorded.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, name)
+
+    def add(self, stage, seconds, name=None):
+        """Add time to stage of query
+
+        Time of stage of named query run outside of its profiled block
+        is added to its total time as well.
+        """
+        entry = self.queries.get(name) if name is not None else self.current
+        if entry is None:
+            return
+        entry[stage] += seconds
+        if name is not None and entry is not self.current:
+            entry['total'] += seconds
+
+    def record(self, name=None, **values):
+        """Set values of named query or query of current thread"""
+        entry = self.queries.get(name) if name is not None else self.current
+        if entry is not None:
+            entry.update(values)
+
+    def write(self, filepath, **fields):
+        """Write profiles as JSON lines with extra fields (e.g. report)"""
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for entry in self.queries.values():
+                line = {
+                    **fields,
+                    **{
+                        k: round(v, 6) if isinstance(v, float) else v
+                        for k, v in entry.items()
+                    },
+                }
+                f.write(json.dumps(line, default=str) + '\n')
+        return filepath
@@ -0,0 +1,118 @@
+import logging
+import threading
+from collections import Counter
+from collections.abc import MutableMapping
+
+
+class LazyResult:
+    """Result read by loader (e.g. from cache file) on first access"""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def load(self):
+        return self.loader()
+
+
+class ResultsStore(MutableMapping):
+    """Results of report run: sql_list entries, df_final and processor outputs
+
+    Values are DataFrames or sql_list entries [DataFrame, join keys]. Value
+    (or DataFrame of entry) can be LazyResult which is loaded on first access.
+    Consumers of result can be counted with retain and after release by the
+    last one result is unloaded: results backed by cache file become lazy
+    again, other are removed. Results without counted consumers are kept.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger('dummy')
+        self._data = dict()
+        self._backing = dict()
+        self._consumers = Counter()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            value = self._data[name]
+            if isinstance(value, LazyResult):
+                self.logger.debug(f'- loading result {name}')
+                value = self._data[name] = value.load()
+            elif isinstance(value, list) and value and isinstance(value[0], LazyResult):
+                self.logger.debug(f'- loading result {name}')
+                value = self._data[name] = [value[0].load(), *value[1:]]
+            return value
+
+    def __setitem__(self, name, value):
+        lazy = value[0] if isinstance(value, list) and value else value
+        with self._lock:
+            self._data[name] = value
+            if isinstance(lazy, LazyResult):
+                self._backing[name] = lazy
+            else:
+                self._backing.pop(name, None)
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self._data[name]
+            self._backing.pop(name, None)
+            self._consumers.pop(name, None)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self._data)})'
+
+    def clear(self):
+        """Remove all results without loading lazy ones"""
+        with self._lock:
+            self._data.clear()
+            self._backing.clear()
+            self._consumers.clear()
+
+    def back(self, name, loader):
+        """Set loader of result stored in cache file, used after release"""
+        with self._lock:
+            self._backing[name] = LazyResult(loader)
+
+    def is_loaded(self, name) -> bool:
+        value = self._data.get(name)
+        if isinstance(value, list) and value:
+            value = value[0]
+        return name in self._data and not isinstance(value, LazyResult)
+
+    def retain(self, name, count=1):
+        """Add consumers of result"""
+        with self._lock:
+            self._consumers[name] += count
+
+    def release(self, name):
+        """Mark one consumer of result done, unload result after last one"""
+        with self._lock:
+            if name not in self._consumers:
+                return
+            self._consumers[name] -= 1
+            if self._consumers[name] > 0:
+                return
+            del self._consumers[name]
+            self.unload(name)
+
+    def unload(self, name):
+        """Free memory of result, keep it lazy if backed by cache file"""
+        with self._lock:
+            if name not in self._data:
+                return
+            backing = self._backing.get(name)
+            value = self._data[name]
+            if backing is None:
+                del self._data[name]
+                self.logger.debug(f'- result {name} released')
+            elif isinstance(value, list):
+                self._data[name] = [backing, *value[1:]]
+                self.logger.debug(f'- result {name} unloaded')
+            else:
+                self._data[name] = backing
+                self.logger.debug(f'- result {name} unloaded')
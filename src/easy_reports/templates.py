@@ -0,0 +1,55 @@
+import re
+import threading
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+
+_templates = dict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=256)
+def compile_placeholders(names: tuple) -> re.Pattern:
+    """Compile placeholders to one regex, longer ones matched first"""
+    return re.compile(
+        '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    )
+
+
+class Template:
+    """Text with @name placeholders and {date}
+
+    All placeholders are replaced in one pass over text. When one name is
+    prefix of another, longer one is replaced.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def render(self, placeholders=None, today=None) -> str:
+        values = {'@' + str(k): str(v) for k, v in (placeholders or {}).items()}
+        values['{date}'] = (today or date.today()).strftime("%Y-%m-%d")
+        pattern = compile_placeholders(tuple(sorted(values)))
+        return pattern.sub(lambda m: values[m.group(0)], self.text)
+
+
+def load_template(filepath) -> Template:
+    """Get template of file, read again only when file changed"""
+    filepath = Path(filepath)
+    stat = filepath.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = str(filepath.resolve())
+    with _lock:
+        cached = _templates.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    with open(filepath, 'r', encoding='UTF8') as f:
+        template = Template(f.read())
+    with _lock:
+        _templates[key] = (version, template)
+    return template
+
+
+def render(text, placeholders=None, today=None) -> str:
+    """Replace placeholders in text"""
+    return Template(text).render(placeholders, today)
@@ -0,0 +1,195 @@
+import io
+import logging
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import date
+from pathlib import Path
+from collections.abc import Mapping
+
+import pandas as pd
+
+from .results import ResultsStore
+
+
+class FileWriter(ABC):
+    """Base of report file writers
+
+    Writer gets rpt_config entry, writes its sheets with write_sheets and
+    returns written file (or list of files) from close.
+    """
+
+    extension = ''
+
+    def __init__(
+        self, file_config=None, config=None, data_results=None, logger=None, **kwargs
+    ):
+        # perform checks
+        if not file_config:
+            raise ValueError("Empty File config!")
+
+        if not config:
+            raise ValueError("Empty Report config!")
+
+        if not data_results:
+            raise ValueError("Empty Data Results!")
+
+        self.file_config = file_config
+        self.config = config
+        self.data_results = data_results
+        self.logger = logger or logging.getLogger('dummy')
+
+        self.filepath = self.config.report_arch_path / self.format_filename(
+            self.file_config.get('filename')
+        )
+        if self.extension:
+            self.filepath = self.filepath.with_suffix(self.extension)
+
+    def format_filename(self, filename, options=None):
+        """Replace known placeholders in filename
+        or passed as tuples({placeholder}, value)
+        """
+
+        f = filename.replace(r'{date}', date.today().strftime("%Y-%m-%d"))
+        if options:
+            for placeholder, value in options:
+                f = f.replace(placeholder, value)
+        return f
+
+    def get_df(self, sheet_config) -> pd.DataFrame:
+        """Get DataFrame of sheet data_src with output_columns"""
+        df = None
+        if isinstance(self.data_results, Mapping):
+            df = self.data_results.get(sheet_config.get('data_src'), None)
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(
+                f"Sheet's '{sheet_config.get('sheet_name')}' data_src points to not existing DataFrame!"
+            )
+
+        output_columns = sheet_config.get('output_columns', [])
+        if len(output_columns):
+            df = df[output_columns]
+        return df
+
+    def release(self, sheet_config):
+        """Mark sheet done as consumer of its data_src in results store"""
+        if isinstance(self.data_results, ResultsStore):
+            self.data_results.release(sheet_config.get('data_src'))
+
+    @abstractmethod
+    def write_sheet(self, sheet_id):
+        """Write sheet of file config"""
+
+    def write_sheets(self):
+        """Write all sheets"""
+
+        for sheet_id in self.file_config.get('sheets'):
+            self.write_sheet(sheet_id)
+
+    def close(self):
+        return self.filepath
+
+
+class TableWriter(FileWriter):
+    """Writer of each sheet to separate file of table format
+
+    File of single sheet report is named as report file, files of more
+    sheets get sheet name suffix. With 'compression': 'zip' all files are
+    put in one zip archive named as report file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compression = self.file_config.get('compression')
+        self.filepaths = []
+        self.archive = None
+        if self.compression == 'zip':
+            self.archive = zipfile.ZipFile(
+                self.filepath.with_name(self.filepath.name + '.zip'),
+                'w',
+                compression=zipfile.ZIP_DEFLATED,
+            )
+        elif self.compression not in (None, 'gzip'):
+            raise ValueError(f'Unknown compression {self.compression}!')
+
+    def sheet_filename(self, sheet_config) -> str:
+        if len(self.file_config.get('sheets')) == 1:
+            return self.filepath.name
+        name = sheet_config.get('sheet_name')
+        return f'{self.filepath.stem}_{name}{self.filepath.suffix}'
+
+    @abstractmethod
+    def write_frame(self, df, target, compression=None):
+        """Write DataFrame to path or binary file, return written path"""
+
+    def write_sheet(self, sheet_id):
+        sheet_config = self.file_config['sheets'][sheet_id]
+        df = self.get_df(sheet_config)
+        filename = self.sheet_filename(sheet_config)
+        if self.archive is not None:
+            with self.archive.open(filename, 'w') as f:
+                self.write_frame(df, f)
+        else:
+            filepath = self.filepath.with_name(filename)
+            filepath = self.write_frame(df, filepath, self.compression)
+            self.filepaths.append(filepath)
+        self.logger.debug(f'- sheet {sheet_config.get("sheet_name")} written')
+        self.release(sheet_config)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            return Path(self.archive.filename)
+        if len(self.filepaths) == 1:
+            return self.filepaths[0]
+        return self.filepaths
+
+
+class CsvWriter(TableWriter):
+    """CSV (or TSV) writer, optionally compressed with gzip or zip"""
+
+    def __init__(self, *args, **kwargs):
+        file_config = args[0] if args else kwargs.get('file_config')
+        self.sep = '\t' if (file_config or {}).get('format') == 'tsv' else ','
+        self.extension = '.tsv' if self.sep == '\t' else '.csv'
+        super().__init__(*args, **kwargs)
+
+    def write_frame(self, df, target, compression=None):
+        encoding = self.file_config.get('encoding', 'utf-8')
+        if compression == 'gzip':
+            target = target.with_name(target.name + '.gz')
+        if isinstance(target, Path):
+            df.to_csv(
+                target,
+                sep=self.sep,
+                index=False,
+                encoding=encoding,
+                compression=compression,
+            )
+        else:
+            with io.TextIOWrapper(target, encoding=encoding, newline='') as f:
+                df.to_csv(f, sep=self.sep, index=False)
+        return target
+
+
+class ParquetWriter(TableWriter):
+    """Parquet writer, 'compression': 'gzip' sets gzip codec of file"""
+
+    extension = '.parquet'
+
+    def write_frame(self, df, target, compression=None):
+        df.to_parquet(
+            target, index=False, compression='gzip' if compression else 'snappy'
+        )
+        return target
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'tsv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def register_writer(name, writer_cls):
+    """Add writer class of rpt_config format"""
+    WRITERS[name] = writer_cls
@@ -0,0 +1,125 @@
+import copy
+import sqlite3
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from easy_reports.base import ReportConfig
+from easy_reports.config import Config
+
+from .smtp_server import SMTPServer
+
+USERS = [
+    (1, 'Tom', 20),
+    (2, 'Kate', 15),
+    (3, 'Sebastian', 34),
+    (4, 'Patric', 47),
+]
+
+LANGUAGES = [
+    (1, 'English', 1),
+    (2, 'Polish', 3),
+    (3, 'German', 2),
+]
+
+USER_LANGUAGE = [
+    (1, 1, 'good'),
+    (2, 2, 'poor'),
+    (3, 1, 'moderate'),
+    (4, 3, 'excelent'),
+]
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """Local SQLite database used as stand-in for report databases"""
+
+    db_path = tmp_path / 'easy_reports.db'
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('create table users (id integer, name text, age integer)')
+        conn.execute(
+            'create table languages (id integer, language text, difficulty integer)'
+        )
+        conn.execute(
+            'create table user_language (user_id integer, language_id integer, level text)'
+        )
+        conn.executemany('insert into users values (?, ?, ?)', USERS)
+        conn.executemany('insert into languages values (?, ?, ?)', LANGUAGES)
+        conn.executemany('insert into user_language values (?, ?, ?)', USER_LANGUAGE)
+    return db_path
+
+
+@pytest.fixture
+def sqlite_config(tmp_path, sqlite_db):
+    """Report config with sql_list run against local SQLite database"""
+
+    sql_path = tmp_path / 'sql'
+    sql_path.mkdir()
+    (sql_path / 'users.sql').write_text('select id, name, age from users')
+    (sql_path / 'levels.sql').write_text(
+        'select ul.user_id as id, l.language, ul.level\n'
+        'from user_language ul\n'
+        'join languages l on (l.id = ul.language_id)'
+    )
+
+    options = SimpleNamespace(
+        symbol='SQLITE',
+        name='SQLite Report',
+        report_path=tmp_path,
+        db_list={'sqlite': {'url': f'sqlite:///{sqlite_db}'}},
+        sql_list=[
+            ('users', 'sqlite', ['id']),
+            ('levels', 'sqlite', ['id']),
+        ],
+    )
+    config = ReportConfig(Config(tmp_path), options)
+    config.report_cache_path.mkdir()
+    return config
+
+
+@pytest.fixture
+def sqlite_excel(sqlite_config):
+    sqlite_config.report_arch_path.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame(
+        {
+            'id': range(1, 8),
+            'name': ['a', 'b', None, 'd', 'e', 'f', 'g'],
+            'amount': [1.5, float('nan'), 3.0, 4.0, 5.0, 6.0, 7.0],
+            'created': pd.date_range('2024-01-01', periods=7),
+        }
+    )
+    file_config = copy.deepcopy(sqlite_config.report_rpt_config[1])
+    file_config['filename'] = 'streaming.xlsx'
+    file_config['write_mode'] = 'streaming'
+    file_config['sheets'][1]['column_formats'] = {'amount': 'decimal'}
+    return sqlite_config, file_config, {'df_final': df}
+
+
+@pytest.fixture
+def smtp_server():
+    with SMTPServer() as server:
+        yield server
+
+
+@pytest.fixture
+def email_config(sqlite_config, smtp_server):
+    """Report config sending emails to local SMTP server"""
+    sqlite_config.email_server = '127.0.0.1'
+    sqlite_config.email_port = smtp_server.port
+    sqlite_config.email_user = ''
+    sqlite_config.report_templ_path.mkdir(parents=True, exist_ok=True)
+    sqlite_config.report_email_config = {
+        i: {
+            'to': f'to{i}@example.com',
+            'cc': '',
+            'subject': f'Report {i} {{date}}',
+            'onbehalf': 'reports@example.com',
+            'body': '',
+            'template': '',
+            'attachments': [],
+            'attachments_rpt_id': [1],
+        }
+        for i in range(1, 4)
+    }
+    return sqlite_config
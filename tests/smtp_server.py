@@ -0,0 +1,85 @@
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server session recording received messages"""
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost test SMTP')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            server.commands.append(verb)
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250 8BITMIME\r\n')
+            elif verb in ('HELO', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip('<>'), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:].strip('<>'))
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                envelope = {'from': None, 'to': []}
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b'.\r\n', b''):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                if server.delay:
+                    server.delay_event.wait(server.delay)
+                with server.lock:
+                    server.messages.append({**envelope, 'data': b''.join(data)})
+                    count = len(server.messages)
+                self.reply('250 OK')
+                if server.drop_after and count % server.drop_after == 0:
+                    # server closes session without QUIT
+                    return
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP stand-in for tests, run in background thread"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after=None, delay=None):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.port = self.server_address[1]
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands = []
+        self.messages = []
+        self.drop_after = drop_after
+        self.delay = delay
+        self.delay_event = threading.Event()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.delay_event.set()
+        self.shutdown()
+        self.server_close()
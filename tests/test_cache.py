@@ -0,0 +1,340 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import pandas as pd
+import pytest
+from easy_reports.cache import FileLock, QueryCache, ProcessorCache, fingerprint
+from easy_reports.data import DataCreator
+
+
+def test_cache_query_cache_make_key():
+    key = QueryCache.make_key('select 1', 'sqlite://', session_params=['set a = 1'])
+
+    assert key == QueryCache.make_key(
+        'select 1', 'sqlite://', session_params=['set a = 1']
+    )
+    assert key != QueryCache.make_key('select 1', 'sqlite://')
+    assert key != QueryCache.make_key('select 1', 'sqlite:///db')
+    assert key != QueryCache.make_key(
+        'select 2', 'sqlite://', session_params=['set a = 1']
+    )
+
+
+def test_cache_query_cache_put_get_expire(tmp_path):
+    cache = QueryCache(tmp_path, ttl=60)
+    df = pd.DataFrame({'a': [1, 2]})
+
+    assert cache.get('key') is None
+    cache.put('key', df)
+    pd.testing.assert_frame_equal(pd.read_parquet(cache.get('key')), df)
+
+    # make entry older than ttl
+    old = time.time() - 120
+    os.utime(cache.filepath('key'), (old, old))
+    assert cache.get('key') is None
+    assert not cache.filepath('key').exists()
+
+
+def test_cache_query_cache_evicts_least_recently_used(tmp_path):
+    cache = QueryCache(tmp_path, ttl=60)
+    df = pd.DataFrame({'a': range(100)})
+    for i, key in enumerate(['k1', 'k2', 'k3']):
+        cache.put(key, df)
+        os.utime(cache.filepath(key), (time.time() - 10 + i, time.time()))
+    # k1 used recently
+    cache.get('k1')
+
+    cache.max_size = 2 * cache.filepath('k1').stat().st_size
+    cache.evict()
+
+    assert [cache.get(key) is not None for key in ['k1', 'k2', 'k3']] == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_cache_file_lock_single_flight(tmp_path):
+    calls = []
+
+    def run():
+        with FileLock(tmp_path / 'key.lock', poll_interval=0.01):
+            if not calls:
+                time.sleep(0.1)
+                calls.append(1)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert not (tmp_path / 'key.lock').exists()
+
+
+def test_cache_file_lock_released_by_stopped_process(tmp_path):
+    """Test lock held by other process blocks until the process is gone"""
+
+    import subprocess
+    import sys
+
+    path = tmp_path / 'key.lock'
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            '-c',
+            'import sys, time\n'
+            'from easy_reports.cache import FileLock\n'
+            f'FileLock({str(path)!r}).acquire()\n'
+            'print("locked", flush=True)\n'
+            'time.sleep(60)',
+        ],
+        stdout=subprocess.PIPE,
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+    )
+    try:
+        assert holder.stdout.readline().strip() == b'locked'
+        with pytest.raises(TimeoutError):
+            FileLock(path, timeout=0.2, poll_interval=0.05).acquire()
+    finally:
+        holder.kill()
+        holder.wait()
+
+    # lock file is left, but its lock was released with the process
+    assert path.exists()
+    with FileLock(path, timeout=1, poll_interval=0.05):
+        assert path.read_text() == str(os.getpid())
+    assert not path.exists()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='flock lock files')
+def test_cache_file_lock_removed_file_not_acquired(tmp_path):
+    """Test lock file removed by previous owner after opening is not used"""
+
+    path = tmp_path / 'key.lock'
+    owner = FileLock(path).acquire()
+    fd = os.open(path, os.O_RDWR)
+    owner.release()
+    other = FileLock(path).acquire()
+
+    waiter = FileLock(path)
+    try:
+        assert waiter.lock_file(fd)
+        assert not waiter.is_current(fd)
+    finally:
+        os.close(fd)
+        other.release()
+
+
+def test_cache_data_creator_query_cache_shared_across_reports(
+    tmp_path, sqlite_config, sqlite_db
+):
+    sqlite_config.report_query_cache_path = tmp_path / 'query_cache'
+    sqlite_config.report_query_cache_ttl = 60
+
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    expected = data.get_results()['df_final']
+    assert len(list((tmp_path / 'query_cache').glob('*.parquet'))) == 2
+
+    # queries are not run again
+    with sqlite3.connect(sqlite_db) as conn:
+        conn.execute('drop table users')
+
+    for kwargs in [{}, {'parallel_queries': 2, 'stream_results': True}]:
+        data = DataCreator(config=sqlite_config, **kwargs)
+        data.run(**kwargs)
+        pd.testing.assert_frame_equal(data.get_results()['df_final'], expected)
+
+
+def test_cache_manifest_records_cache_files(sqlite_config):
+    data = DataCreator(config=sqlite_config, cache_format='feather')
+    data.run(cache_format='feather')
+
+    manifest = data.manifest.load()
+    entry = manifest['df_users__cache.feather']
+    assert entry['format'] == 'feather'
+    assert entry['rows'] == 4
+    assert [name for name, _ in entry['schema']] == ['id', 'name', 'age']
+    assert entry['sql_hash'] == data.sql_hash('users')
+    assert (
+        entry['bytes']
+        == (sqlite_config.report_cache_path / 'df_users__cache.feather').stat().st_size
+    )
+    assert data.manifest.verify(
+        sqlite_config.report_cache_path / 'df_users__cache.feather'
+    )
+    assert 'df_final.parquet' in manifest
+
+
+def test_cache_manifest_from_cache_columns_and_stale_warning(sqlite_config, caplog):
+    data = DataCreator(config=sqlite_config, cache_format='feather')
+    data.run(cache_format='feather')
+    (sqlite_config.report_sql_path / 'users.sql').write_text('select id from users')
+
+    data = DataCreator(
+        config=sqlite_config, from_cache=True, logger=logging.getLogger('test')
+    )
+    with caplog.at_level(logging.WARNING):
+        data.load_from_cache('feather', columns={'df_users': ['id', 'name']})
+
+    assert data.get_results()['df_users'][0].columns.tolist() == ['id', 'name']
+    assert 'Cache file of users is stale' in caplog.text
+
+
+def test_cache_fingerprint_and_processor_key(tmp_path):
+    """Test fingerprint follows content and schema, key follows source"""
+
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']})
+    assert fingerprint(df) == fingerprint(df.copy())
+    assert fingerprint(df) != fingerprint(df.astype({'a': 'int32'}))
+    assert fingerprint(df) != fingerprint(df.assign(b=['x', 'z']))
+
+    def p01(self):
+        return {}
+
+    def p02(self):
+        return {'changed': True}
+
+    cache = ProcessorCache(tmp_path)
+    assert cache.make_key(p01, {'df': df}) == cache.make_key(p01, {'df': df.copy()})
+    assert cache.make_key(p01, {'df': df}) != cache.make_key(p02, {'df': df})
+
+
+def test_cache_query_cache_bound_params(sqlite_config, tmp_path):
+    """Test query results with different bound params are cached separately"""
+
+    (sqlite_config.report_sql_path / 'users.sql').write_text(
+        'select id, name, age from users where age >= :min_age'
+    )
+    sqlite_config.report_query_cache_path = tmp_path / '_query_cache'
+    sqlite_config.report_query_cache_ttl = 60
+
+    for min_age, rows in [(18, 3), (40, 1), (18, 3)]:
+        data = DataCreator(config=sqlite_config)
+        data.run(params={'min_age': min_age})
+        assert len(data.get_results()['df_users'][0]) == rows
+    # levels and users with two different params
+    assert len(list((tmp_path / '_query_cache').glob('*.parquet'))) == 3
+
+
+def test_cache_query_cache_evicted_hit_and_lock_timeout(
+    tmp_path, sqlite_config, monkeypatch
+):
+    """Test query is fetched when cache entry is gone or lock times out"""
+
+    sqlite_config.report_query_cache_path = tmp_path / 'query_cache'
+    sqlite_config.report_query_cache_ttl = 60
+    sqlite_config.report_query_cache_lock_timeout = 0.1
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    expected = data.get_results()['df_final']
+
+    # entry evicted by other query between get and read
+    monkeypatch.setattr(QueryCache, 'get', lambda self, key: tmp_path / 'gone')
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    pd.testing.assert_frame_equal(data.get_results()['df_final'], expected)
+    monkeypatch.undo()
+
+    # lock held by hung run of the same query
+    for lock in (tmp_path / 'query_cache').glob('*.parquet'):
+        lock.with_suffix('.lock').write_text('')
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    pd.testing.assert_frame_equal(data.get_results()['df_final'], expected)
+
+
+def test_cache_manifest_checksum_computed_while_written(sqlite_config, monkeypatch):
+    """Test cache files are not read again to compute or verify checksum"""
+
+    from easy_reports.cache import CacheManifest
+
+    checksum = CacheManifest.checksum
+
+    def fail(filepath):
+        raise AssertionError('cache file read again')
+
+    monkeypatch.setattr(CacheManifest, 'checksum', staticmethod(fail))
+    data = DataCreator(config=sqlite_config, cache_format='feather')
+    data.run(cache_format='feather')
+    data = DataCreator(config=sqlite_config, stream_results=True)
+    data.run(stream_results=True)
+
+    path = sqlite_config.report_cache_path
+    for name, entry in data.manifest.load().items():
+        assert entry['checksum'] == checksum(path / name)
+        assert data.manifest.verify(path / name)
+
+    # changed file is hashed again
+    monkeypatch.setattr(CacheManifest, 'checksum', staticmethod(checksum))
+    filepath = path / 'df_users__cache.feather'
+    content = filepath.read_bytes()
+    filepath.write_bytes(content[:-1] + bytes([content[-1] ^ 1]))
+    assert not data.manifest.verify(filepath)
+
+
+def test_cache_manifest_changed_cache_file_not_loaded(sqlite_config):
+    """Test cache file not matching recorded checksum is refused"""
+
+    data = DataCreator(config=sqlite_config, cache_format='feather')
+    data.run(cache_format='feather')
+    filepath = sqlite_config.report_cache_path / 'df_users__cache.feather'
+    content = filepath.read_bytes()
+    filepath.write_bytes(content[:-1] + bytes([content[-1] ^ 1]))
+
+    data = DataCreator(config=sqlite_config, from_cache=True)
+    with pytest.raises(ValueError, match='does not match its checksum'):
+        data.load_from_cache('feather')
+
+
+def test_cache_columns_from_sheets_output_columns(sqlite_config):
+    """Test only columns of sheets and join keys are read from cache"""
+
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    sheet_config = sqlite_config.report_rpt_config[1]['sheets'][1]
+    sheet_config['output_columns'] = ['name', 'language']
+
+    data = DataCreator(config=sqlite_config, from_cache=True)
+    assert data.cache_columns() == {}
+    data.track_consumers([])
+    assert data.cache_columns() == {
+        'df_users': ['id', 'name'],
+        'df_levels': ['id', 'language'],
+    }
+    data.run(from_cache=True)
+    assert data.get_results()['df_final'].columns.tolist() == [
+        'id',
+        'name',
+        'language',
+    ]
+
+    # processors can read any column
+    data.track_consumers([lambda data_results: None])
+    assert data.cache_columns() == {}
+    sheet_config['output_columns'] = []
+    data.track_consumers([])
+    assert data.cache_columns() == {}
+
+
+def test_cache_processor_cache_keeps_other_processors(tmp_path):
+    """Test storing outputs removes only old entries of the same processor"""
+
+    df = pd.DataFrame({'a': [1, 2]})
+    cache = ProcessorCache(tmp_path)
+    keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(3)]
+    cache.put('agg__x', keys[0], {'df': df})
+    cache.put('agg_extra', keys[0], {'df': df})
+    cache.put('agg', keys[1], {'df': df})
+    cache.put('agg', keys[2], {'df': df})
+
+    assert cache.get('agg__x', keys[0]) is not None
+    assert cache.get('agg_extra', keys[0]) is not None
+    assert cache.get('agg', keys[1]) is None
+    assert cache.get('agg', keys[2]) is not None
+    assert len(list(tmp_path.iterdir())) == 6
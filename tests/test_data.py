@@ -1,9 +1,13 @@
 import pytest
 import copy
+import sqlite3
 from easy_reports import EasyReport
-from easy_reports.data import DataCreator
+from easy_reports.data import DataCreator, unify_schemas, incremental_sql
+from easy_reports.results import ResultsStore
 import sqlalchemy
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import tempfile
 from pathlib import Path
 
@@ -106,7 +110,7 @@ def test_data_data_creator_write_to_read_from_cache(data):
 
 
 def test_data_data_creator_get_results(data):
-    assert type(data.get_results()) == type(dict())
+    assert isinstance(data.get_results(), ResultsStore)
 
 
 def test_data_data_creator_get_result_df(data):
@@ -121,7 +125,7 @@ def test_data_data_creator_load_from_database(data):
 
     data.load_from_database()
 
-    assert type(data.get_results()) == type(dict())
+    assert isinstance(data.get_results(), ResultsStore)
     assert len(data.get_results()) == len(data.config.report_sql_list)
 
 
@@ -169,3 +173,252 @@ def test_data_data_creator_set_def_params(data):
         print(sql)
         print(df)
         assert str(df.iloc[0, 0]) == '2023-01-01'
+
+
+def test_data_data_creator_load_from_database_parallel(sqlite_config):
+    """Test parallel queries keep sql_list order and give same result"""
+
+    data = DataCreator(config=sqlite_config)
+    data.open_db_conn()
+    data.load_from_database()
+    data.close_db_conn()
+    expected = {name: value[0] for name, value in data.get_results().items()}
+
+    data = DataCreator(config=sqlite_config)
+    data.load_from_database(parallel_queries=2)
+
+    assert list(data.get_results().keys()) == list(expected.keys())
+    for name, value in data.get_results().items():
+        pd.testing.assert_frame_equal(value[0], expected[name])
+
+
+def test_data_data_creator_load_from_database_parallel_error(sqlite_config):
+    """Test failing query in parallel mode raises its error"""
+
+    (sqlite_config.report_sql_path / 'levels.sql').write_text('select * from missing')
+    data = DataCreator(config=sqlite_config)
+
+    with pytest.raises(Exception, match='no such table'):
+        data.load_from_database(parallel_queries=2)
+    assert data.get_results() == {}
+
+
+def test_data_data_creator_load_from_database_stream_results(sqlite_config):
+    """Test streamed query results are written to cache and loaded on merge"""
+
+    data = DataCreator(config=sqlite_config)
+    data.load_from_database(parallel_queries=2)
+    expected = data.merge_data_frames(list(data.get_results().values()))
+
+    data = DataCreator(config=sqlite_config, stream_results=True, chunksize=2)
+    data.load_from_database(parallel_queries=2)
+    for filename, *_ in sqlite_config.report_sql_list:
+        filepath = data.get_result_df(f'df_{filename}')[0]
+        assert (
+            filepath
+            == sqlite_config.report_cache_path / f'df_{filename}__cache.parquet'
+        )
+        assert filepath.exists()
+
+    df = data.merge_data_frames(list(data.get_results().values()))
+    pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize('fetch_mode', ['pandas', 'arrow'])
+def test_data_data_creator_stream_results_widened_types(
+    sqlite_config, sqlite_db, fetch_mode
+):
+    """Test types of later chunks not fitting first chunk widen schema"""
+
+    with sqlite3.connect(sqlite_db) as conn:
+        conn.execute('create table amounts (id integer, amount, note text)')
+        conn.executemany(
+            'insert into amounts values (?, ?, ?)',
+            [(1, 1, None), (2, 2, None), (3, 2.5, 'x'), (4, None, None), (5, 7, None)],
+        )
+    (sqlite_config.report_sql_path / 'amounts.sql').write_text(
+        'select id, amount, note, null as empty from amounts order by id'
+    )
+    sqlite_config.report_sql_list = [('amounts', 'sqlite', ['id'])]
+    sqlite_config.report_db_list['sqlite']['arraysize'] = 2
+
+    data = DataCreator(
+        config=sqlite_config, stream_results=True, chunksize=2, fetch_mode=fetch_mode
+    )
+    data.load_from_database(parallel_queries=2)
+    filepath = data.get_result_df('df_amounts')[0]
+    table = pq.read_table(filepath)
+
+    assert table.schema.field('amount').type == pa.float64()
+    for name in ['note', 'empty']:
+        field_type = table.schema.field(name).type
+        assert pa.types.is_string(field_type) or pa.types.is_large_string(field_type)
+    assert table.column('amount').to_pylist() == [1, 2, 2.5, None, 7]
+    assert table.column('note').to_pylist() == [None, None, 'x', None, None]
+    df = data.load_df(filepath)
+    assert df['amount'].tolist()[:3] == [1, 2, 2.5]
+    assert data.manifest.verify(filepath)
+    assert list(sqlite_config.report_cache_path.glob('*.tmp')) == []
+
+
+@pytest.mark.parametrize('stream_results', [False, True])
+def test_data_data_creator_load_from_database_arrow(sqlite_config, stream_results):
+    """Test Arrow-native fetch gives Arrow-backed DataFrames with same data"""
+
+    data = DataCreator(config=sqlite_config)
+    data.load_from_database(parallel_queries=2)
+    expected = data.merge_data_frames(list(data.get_results().values()))
+
+    sqlite_config.report_db_list['sqlite']['arraysize'] = 2
+    data = DataCreator(
+        config=sqlite_config, fetch_mode='arrow', stream_results=stream_results
+    )
+    data.load_from_database(parallel_queries=2)
+    df = data.merge_data_frames(list(data.get_results().values()))
+
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+    pd.testing.assert_frame_equal(
+        df.astype(object), expected.astype(object), check_dtype=False
+    )
+
+
+@pytest.mark.parametrize('stream_results', [False, True])
+def test_data_data_creator_native_arrow_fetch(
+    sqlite_config, tmp_path, monkeypatch, stream_results
+):
+    """Test drivers with Arrow fetch return batches without row tuples"""
+
+    pytest.importorskip('duckdb_engine')
+    from easy_reports import data as data_module
+
+    db_path = tmp_path / 'easy_reports.duckdb'
+    sqlite_config.report_db_list = {'duckdb': {'url': f'duckdb:///{db_path}'}}
+    sqlite_config.report_sql_list = [('facts', 'duckdb')]
+    (sqlite_config.report_sql_path / 'facts.sql').write_text(
+        "select range as id, range / 3 as x, 'v' || range::varchar as s "
+        'from range(5)'
+    )
+    # row tuples are not converted
+    monkeypatch.setattr(data_module, 'rows_to_array', None)
+
+    data = DataCreator(
+        config=sqlite_config,
+        fetch_mode='arrow',
+        stream_results=stream_results,
+        chunksize=2,
+    )
+    data.load_from_database(parallel_queries=2)
+    df = data.load_df(data.get_result_df('df_facts')[0])
+
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+    assert df['id'].tolist() == list(range(5))
+    assert df['s'].tolist() == [f'v{i}' for i in range(5)]
+
+
+def test_data_unify_schemas():
+    """Test NULL-only and mixed numeric columns of batches are unified"""
+
+    batches = [
+        pa.record_batch([pa.array([None]), pa.array([1])], names=['a', 'b']),
+        pa.record_batch([pa.array(['x']), pa.array([1.5])], names=['a', 'b']),
+    ]
+    schema = unify_schemas([b.schema for b in batches])
+
+    assert schema.field('a').type == pa.string()
+    assert schema.field('b').type == pa.float64()
+
+
+def test_data_data_creator_incremental_watermark(sqlite_config, sqlite_db):
+    """Test watermark entry fetches only new rows and appends partition"""
+
+    sqlite_config.report_sql_list = [('users', 'sqlite', ['id'], {'watermark': 'id'})]
+    (sqlite_config.report_sql_path / 'users.sql').write_text(
+        'select id, name, age from users order by id;\n'
+    )
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    assert len(data.get_results()['df_final']) == 4
+
+    with sqlite3.connect(sqlite_db) as conn:
+        conn.execute("insert into users values (5, 'Luke', 60)")
+
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    df = data.get_results()['df_final']
+    dataset_path = data.dataset_path('users')
+
+    assert len(list(dataset_path.glob('*.parquet'))) == 2
+    assert df['id'].tolist() == [1, 2, 3, 4, 5]
+    assert data.get_watermark('users', 'id') == 5
+
+    # watermark is taken from partition statistics without reading rows
+    def read_table(*args, **kwargs):
+        raise AssertionError('partition read')
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr('pyarrow.parquet.read_table', read_table)
+        assert data.get_watermark('users', 'id') == 5
+
+    # from_cache run covers full history without database
+    data = DataCreator(config=sqlite_config, from_cache=True)
+    data.run(from_cache=True)
+    pd.testing.assert_frame_equal(data.get_results()['df_final'], df)
+
+
+def test_data_incremental_sql():
+    """Test watermark filter wraps query text valid for dialect"""
+
+    from sqlalchemy.dialects import mssql, postgresql
+
+    sql = incremental_sql(
+        'select * from t order by id;\n', 'Order', postgresql.dialect()
+    )
+    assert sql == (
+        'SELECT * FROM (\nselect * from t order by id\n) wm_src '
+        'WHERE wm_src."Order" > :watermark'
+    )
+    sql = incremental_sql(
+        "select a, (select max(b) from u order by 1) b from t "
+        "where c = 'order by' order by a ;",
+        'order',
+        mssql.dialect(),
+    )
+    assert "where c = 'order by'\n)" in sql
+    assert sql.endswith('wm_src.[order] > :watermark')
+    sql = incremental_sql('select top 10 a from t order by a', 'a', mssql.dialect())
+    assert 'order by a\n)' in sql
+
+
+def test_data_data_creator_run_compact_dtypes(sqlite_config):
+    """Test extracted DataFrames are compacted before merge"""
+
+    data = DataCreator(config=sqlite_config)
+    data.run(compact_dtypes=True, max_category_ratio=1)
+    results = data.get_results()
+
+    assert results['df_users'][0]['age'].dtype == 'int8'
+    assert results['df_levels'][0]['level'].dtype == 'category'
+    # join keys are not converted to category
+    assert results['df_users'][0]['id'].dtype == 'int8'
+    assert len(results['df_final']) == 4
+
+
+@pytest.mark.parametrize('parallel_queries', [1, 2])
+def test_data_data_creator_bound_params(sqlite_config, parallel_queries):
+    """Test dict sql_params and run params are bound into sql queries"""
+
+    (sqlite_config.report_sql_path / 'users.sql').write_text(
+        'select id, name, age from users where age >= :min_age'
+    )
+    sqlite_config.report_sql_params = {'min_age': 18}
+
+    data = DataCreator(config=sqlite_config)
+    data.run(parallel_queries=parallel_queries)
+    assert data.get_results()['df_users'][0]['age'].min() >= 18
+    assert len(data.get_results()['df_users'][0]) == 3
+
+    # run params override definition params
+    data = DataCreator(config=sqlite_config)
+    data.run(parallel_queries=parallel_queries, params={'min_age': 40})
+    assert data.get_results()['df_users'][0]['id'].tolist() == [4]
+    assert data.get_session_params('sqlite', params={'min_age': 40}) == []
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from easy_reports.dtypes import compact_dtypes, memory_usage
+
+
+def test_dtypes_compact_dtypes():
+    """Test numeric downcast, category and Arrow strings without value loss"""
+
+    df = pd.DataFrame(
+        {
+            'id': np.arange(100, dtype='int64'),
+            'amount': np.arange(100, dtype='float64') / 2,
+            'rate': np.arange(100, dtype='float64') / 10,
+            'country': pd.Series(['PL', 'DE'] * 50, dtype=object),
+            'name': pd.Series([f'name_{i}' for i in range(100)], dtype=object),
+            'mixed': pd.Series([1, 'a'] * 50, dtype=object),
+        }
+    )
+    compacted = compact_dtypes(df, exclude=['country'])
+
+    assert compacted['id'].dtype == 'int8'
+    assert compacted['amount'].dtype == 'float32'
+    # 0.1 is not representable as float32
+    assert compacted['rate'].dtype == 'float64'
+    assert compacted['country'].dtype != 'category'
+    assert compacted['name'].dtype == 'string[pyarrow]'
+    assert compacted['mixed'].dtype == object
+    assert memory_usage(compacted) < memory_usage(df)
+    for col in df.columns:
+        assert compacted[col].astype(object).tolist() == df[col].tolist()
+
+    assert compact_dtypes(df)['country'].dtype == 'category'
@@ -0,0 +1,266 @@
+import io
+import logging
+import zipfile
+import email as email_parser
+
+from easy_reports.email import EmailCreator, EmailDispatcher
+from easy_reports.email_smtplib import SMTPSessionPool, AttachmentCache
+
+from .smtp_server import SMTPServer
+
+
+def send(pool, server, count):
+    for i in range(count):
+        pool.sendmail(
+            '127.0.0.1',
+            server.port,
+            '',
+            '',
+            'reports@example.com',
+            [f'to{i}@example.com'],
+            f'Subject: {i}\r\n\r\nbody {i}',
+        )
+
+
+def test_email_pool_reuses_session(smtp_server):
+    """Test messages are sent in one session reset between messages"""
+
+    pool = SMTPSessionPool()
+    send(pool, smtp_server, 3)
+    pool.close()
+
+    assert smtp_server.connections == 1
+    assert [m['to'] for m in smtp_server.messages] == [
+        ['to0@example.com'],
+        ['to1@example.com'],
+        ['to2@example.com'],
+    ]
+    assert smtp_server.commands.count('RSET') == 3
+    assert smtp_server.commands[-1] == 'QUIT'
+
+
+def test_email_pool_max_messages(smtp_server):
+    """Test session is closed after max messages"""
+
+    pool = SMTPSessionPool(max_messages=2)
+    send(pool, smtp_server, 5)
+    pool.close()
+
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections == 3
+
+
+def test_email_pool_reconnect():
+    """Test message is sent again with new session after disconnect"""
+
+    with SMTPServer(drop_after=2) as server:
+        pool = SMTPSessionPool()
+        send(pool, server, 3)
+        pool.close()
+
+        assert len(server.messages) == 3
+        assert server.connections == 2
+
+
+def test_email_creator_shared_session(email_config, smtp_server):
+    """Test all emails of run are sent in one session"""
+
+    email = EmailCreator(config=email_config, logger=logging.getLogger('dummy'))
+    email.run()
+
+    assert smtp_server.connections == 1
+    assert [m['to'] for m in smtp_server.messages] == [
+        [f'to{i}@example.com'] for i in range(1, 4)
+    ]
+
+
+def test_email_dispatcher(email_config):
+    """Test emails are queued and delivered concurrently in background"""
+
+    with SMTPServer(delay=10) as server:
+        email_config.email_port = server.port
+        dispatcher = EmailDispatcher(max_workers=3)
+        email = EmailCreator(
+            config=email_config,
+            logger=logging.getLogger('dummy'),
+            email_dispatcher=dispatcher,
+        )
+        email.run()
+        # run returns while server still holds messages
+        assert len(dispatcher.futures) == 3 and server.messages == []
+
+        server.delay_event.set()
+        results = dispatcher.close()
+
+        assert len(server.messages) == 3 and server.connections == 3
+        assert sorted(r['subject'][:8] for r in results) == [
+            'Report 1',
+            'Report 2',
+            'Report 3',
+        ]
+        assert all(r['sent'] and r['report'] == 'SQLITE' for r in results)
+
+
+def test_email_dispatcher_failed_delivery(email_config, smtp_server):
+    """Test failed delivery is collected in results"""
+
+    email_config.email_port = smtp_server.port
+    smtp_server.shutdown()
+    smtp_server.server_close()
+    dispatcher = EmailDispatcher()
+    email = EmailCreator(
+        config=email_config,
+        logger=logging.getLogger('dummy'),
+        email_dispatcher=dispatcher,
+    )
+    email.run()
+    results = dispatcher.close()
+
+    assert len(results) == 3
+    assert not any(r['sent'] for r in results)
+    assert all(r['error'] for r in results)
+
+
+def test_email_easy_report_waits_for_emails(monkeypatch):
+    """Test reports only queue emails and EasyReport.run waits for them"""
+
+    import time
+    from types import SimpleNamespace
+
+    from easy_reports import EasyReport
+
+    delivered = []
+
+    class FakeEmail:
+        subject = 'Report'
+        to = 'to@example.com'
+        logger = None
+
+        def send(self):
+            time.sleep(0.2)
+            delivered.append(self)
+            return True
+
+    def run(**kwargs):
+        kwargs['email_dispatcher'].submit(FakeEmail())
+        queued.append(len(delivered))
+
+    queued = []
+    app = EasyReport()
+    monkeypatch.setattr(app, '_reports', [SimpleNamespace(run=run)] * 2)
+    app.run(parallel_emails=2)
+
+    assert queued == [0, 0] and len(delivered) == 2
+
+
+def received_attachments(message) -> dict:
+    msg = email_parser.message_from_bytes(message['data'])
+    return {
+        part.get_filename(): part.get_payload(decode=True)
+        for part in msg.walk()
+        if part.get_filename()
+    }
+
+
+def test_email_streamed_attachments(email_config, smtp_server, tmp_path):
+    """Test attachments are encoded once and streamed in all messages"""
+
+    import os
+
+    data = os.urandom(200 * 1024)
+    (tmp_path / 'report.xlsx').write_bytes(data)
+    (tmp_path / 'report.csv').write_text('a,b\n' + '1,2\n' * 1000)
+    for config in email_config.report_email_config.values():
+        config['attachments_rpt_id'] = [1, 2]
+    email_config.report_email_config[1]['body'] = '<p>a</p>\n.\n..dots\n'
+
+    cache = AttachmentCache(zip_threshold=1000)
+    email = EmailCreator(
+        config=email_config,
+        logger=logging.getLogger('dummy'),
+        attachments={1: tmp_path / 'report.xlsx', 2: tmp_path / 'report.csv'},
+        attachment_cache=cache,
+    )
+    email.run()
+
+    assert cache.count == 2
+    assert len(smtp_server.messages) == 3
+    for message in smtp_server.messages:
+        attachments = received_attachments(message)
+        assert list(attachments) == ['report.xlsx.zip', 'report.csv.zip']
+        with zipfile.ZipFile(io.BytesIO(attachments['report.xlsx.zip'])) as z:
+            assert z.read('report.xlsx') == data
+    body = email_parser.message_from_bytes(smtp_server.messages[0]['data'])
+    assert body.get_payload()[0].get_payload() == '<p>a</p>\r\n.\r\n..dots\r\n'
+    cache.close()
+
+
+def test_email_attachment_not_compressed(email_config, smtp_server, tmp_path):
+    """Test attachments are sent as they are without zip threshold"""
+
+    (tmp_path / 'report.csv').write_text('a,b\n1,2\n')
+    email = EmailCreator(
+        config=email_config,
+        logger=logging.getLogger('dummy'),
+        attachments={1: tmp_path / 'report.csv'},
+    )
+    email.run()
+
+    assert received_attachments(smtp_server.messages[0]) == {
+        'report.csv': b'a,b\n1,2\n'
+    }
+
+
+def test_email_template(email_config, smtp_server):
+    """Test template body and subject rendered with placeholders"""
+
+    (email_config.report_templ_path / 'email.html').write_text(
+        '<p>@name @name_full</p>', encoding='UTF8'
+    )
+    for config in email_config.report_email_config.values():
+        config.update(template='email.html', subject='Report @name')
+    email = EmailCreator(
+        config=email_config,
+        logger=logging.getLogger('dummy'),
+        placeholders={'name': 'R001', 'name_full': 'Sales'},
+    )
+    email.run()
+
+    msg = email_parser.message_from_bytes(smtp_server.messages[2]['data'])
+    assert msg['Subject'] == 'Report R001'
+    assert msg.get_payload()[0].get_payload() == '<p>R001 Sales</p>'
+
+
+def test_email_non_ascii_headers(email_config, smtp_server, tmp_path):
+    """Test non-ASCII subject and attachment name are encoded in headers"""
+
+    from email.header import decode_header, make_header
+
+    filepath = tmp_path / 'raport_zażółć.csv'
+    filepath.write_text('a,b\n1,2\n')
+    email_config.report_email_config = {
+        1: dict(
+            email_config.report_email_config[1],
+            subject='Raport zażółć gęślą jaźń',
+            body='<p>Dzień dobry</p>',
+        )
+    }
+    email = EmailCreator(
+        config=email_config,
+        logger=logging.getLogger('dummy'),
+        attachments={1: filepath},
+    )
+    email.run()
+
+    assert len(smtp_server.messages) == 1
+    data = smtp_server.messages[0]['data']
+    assert data.isascii()
+    msg = email_parser.message_from_bytes(data)
+    assert str(make_header(decode_header(msg['Subject']))) == (
+        'Raport zażółć gęślą jaźń'
+    )
+    assert received_attachments(smtp_server.messages[0]) == {
+        'raport_zażółć.csv': b'a,b\n1,2\n'
+    }
+    body = msg.get_payload()[0].get_payload(decode=True).decode()
+    assert body == '<p>Dzień dobry</p>'
@@ -0,0 +1,66 @@
+import pytest
+import sqlalchemy
+from easy_reports.data import DataCreator
+from easy_reports.engines import EngineRegistry, registry
+
+
+@pytest.fixture
+def engines():
+    engines = EngineRegistry()
+    yield engines
+    engines.dispose()
+
+
+def test_engines_get_engine_shared_by_url_and_pool_options(engines, sqlite_db):
+    url = f'sqlite:///{sqlite_db}'
+
+    engine = engines.get_engine({'url': url, 'pool_size': 2})
+    assert engines.get_engine({'url': url, 'pool_size': 2}) is engine
+    assert engines.get_engine({'url': url, 'pool_size': 3}) is not engine
+    assert engine.pool.size() == 2
+    assert len(engines) == 2
+
+
+def test_engines_connect_and_dispose(engines, sqlite_db):
+    with engines.connect({'url': f'sqlite:///{sqlite_db}'}) as conn:
+        assert isinstance(conn, sqlalchemy.Connection)
+        assert conn.execute(sqlalchemy.text('select 1')).scalar() == 1
+
+    engines.dispose()
+    assert len(engines) == 0
+
+
+def test_engines_warm_up_does_not_raise(engines, sqlite_db):
+    engines.warm_up(
+        {
+            'sqlite': {'url': f'sqlite:///{sqlite_db}'},
+            'broken': {'url': 'sqlite:////not/existing/dir/db.sqlite'},
+        }
+    )
+    assert len(engines) == 2
+
+
+def test_engines_data_creator_runs_reuse_registry_engine(sqlite_config):
+    db_config = sqlite_config.report_db_list['sqlite']
+    engines_count = len(registry)
+    for parallel_queries in [1, 2, 1]:
+        data = DataCreator(config=sqlite_config)
+        data.run(parallel_queries=parallel_queries)
+        assert 'df_final' in data.get_results()
+
+    assert len(registry) == engines_count + 1
+    assert registry.get_engine(db_config).pool.checkedout() == 0
+
+
+def test_engines_disposed_after_easy_report_run(sqlite_db, monkeypatch):
+    from types import SimpleNamespace
+    from easy_reports import EasyReport
+
+    def run(**kwargs):
+        registry.connect({'url': f'sqlite:///{sqlite_db}'}).close()
+
+    app = EasyReport()
+    monkeypatch.setattr(app, '_reports', [SimpleNamespace(run=run)])
+    app.run()
+
+    assert len(registry) == 0
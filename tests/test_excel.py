@@ -1,8 +1,17 @@
+import os
+import logging
 import pytest
 import copy
 from easy_reports import EasyReport
 from easy_reports.data import DataCreator
-from easy_reports.excel import ExcelCreator, Excel
+from easy_reports.excel import (
+    ExcelCreator,
+    Excel,
+    StreamingSheet,
+    ColumnStats,
+    share_frame,
+    load_shared_frame,
+)
 import sqlalchemy
 import pandas as pd
 import tempfile
@@ -61,9 +70,9 @@ def test_excel_excel_creator_init_no_config_exception():
 
 def test_excel_excel_creator_set_data_results(rpt, excel):
 
-    # dataframes expected: df_final, df_result_processed
-    assert len(excel.data_results) == 2
-    for name in excel.data_results.keys():
+    # results store is shared with data creator
+    assert excel.data_results is rpt._data.get_results()
+    for name in ['df_final', 'df_result_processed']:
         pd.testing.assert_frame_equal(
             excel.data_results[name], rpt._data.get_result_df(name)
         )
@@ -117,3 +126,297 @@ def test_excel_excel_write_sheet_data_src_exception(excel, xls):
     xls.data_results = {'df_result_processed': None}
     with pytest.raises(ValueError):
         assert xls.write_sheet(1)
+
+
+def xlsx_sheets(filepath) -> dict:
+    """Get sheet names and xml of xlsx file"""
+    import re
+    import zipfile
+
+    with zipfile.ZipFile(filepath) as z:
+        names = re.findall(r'<sheet name="([^"]+)"', z.read('xl/workbook.xml').decode())
+        return {
+            name: z.read(f'xl/worksheets/sheet{i}.xml').decode()
+            for i, name in enumerate(names, start=1)
+        }
+
+
+def test_excel_streaming_sheet(sqlite_excel):
+    """Test streaming sheet writes rows with blanks for missing values"""
+
+    config, file_config, results = sqlite_excel
+    xls = Excel(file_config, config, results)
+    xls.write_sheets()
+    sheets = xlsx_sheets(xls.close())
+
+    assert list(sheets) == ['dane']
+    xml = sheets['dane']
+    assert xml.count('<row ') == 8
+    # missing values are not written
+    assert '<c r="B4"' not in xml and '<c r="C3"' not in xml
+    assert '<autoFilter ref="A1:E8"/>' in xml
+
+
+def test_excel_streaming_sheet_split(sqlite_excel, monkeypatch):
+    """Test rows over sheet limit continue on next sheets with header"""
+
+    monkeypatch.setattr(StreamingSheet, 'max_rows', 3)
+    config, file_config, results = sqlite_excel
+    xls = Excel(file_config, config, results)
+    xls.write_sheets()
+    sheets = xlsx_sheets(xls.close())
+
+    assert list(sheets) == ['dane', 'dane_2', 'dane_3']
+    assert [xml.count('<row ') for xml in sheets.values()] == [4, 4, 2]
+    for xml in sheets.values():
+        assert '<pane ' in xml and '<cols>' in xml
+
+
+def xlsx_cells(filepath, sheet='dane') -> dict:
+    """Get cell values of xlsx sheet with shared strings resolved"""
+    import re
+    import zipfile
+
+    xml = xlsx_sheets(filepath)[sheet]
+    with zipfile.ZipFile(filepath) as z:
+        # streaming mode writes inline strings
+        names = z.namelist()
+        sst = (
+            z.read('xl/sharedStrings.xml').decode()
+            if 'xl/sharedStrings.xml' in names
+            else ''
+        )
+    strings = re.findall(r'<t[^>]*>([^<]*)</t>', sst)
+    cells = dict()
+    for ref, attrs, value in re.findall(
+        r'<c r="([A-Z]+[0-9]+)"([^>]*?)(?:/>|>(?:<v>([^<]*)</v>)?</c>)', xml
+    ):
+        if 't="s"' in attrs:
+            cells[ref] = strings[int(value)]
+        elif 't="b"' in attrs:
+            cells[ref] = bool(int(value))
+        elif value:
+            cells[ref] = round(float(value), 6)
+    return cells
+
+
+def xlsx_number_formats(filepath, sheet='dane') -> dict:
+    """Get number format codes of styled cells of xlsx sheet"""
+    import re
+    import zipfile
+
+    xml = xlsx_sheets(filepath)[sheet]
+    with zipfile.ZipFile(filepath) as z:
+        styles = z.read('xl/styles.xml').decode()
+    codes = {
+        int(i): code
+        for i, code in re.findall(
+            r'<numFmt numFmtId="(\d+)" formatCode="([^"]*)"', styles
+        )
+    }
+    cell_xfs = re.search(r'<cellXfs[^>]*>(.*)</cellXfs>', styles, re.S).group(1)
+    xf_formats = [int(i) for i in re.findall(r'<xf numFmtId="(\d+)"', cell_xfs)]
+    return {
+        ref: codes.get(xf_formats[int(xf)])
+        for ref, xf in re.findall(r'<c r="([A-Z]+[0-9]+)" s="(\d+)"', xml)
+    }
+
+
+@pytest.mark.parametrize('write_mode', ['streaming', 'fast', 'default'])
+def test_excel_date_object_columns(sqlite_excel, write_mode):
+    """Test columns of date objects are written as formatted dates"""
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = write_mode
+    df = results['df_final']
+    df['day'] = [date(2024, 1, i) for i in range(1, 8)]
+    df.loc[2, 'day'] = None
+    df['moment'] = df['created'].dt.to_pydatetime().tolist()
+    df['moment'] = df['moment'].astype(object)
+
+    stats = ColumnStats(df)
+    assert stats['day'] == {'kind': 'date', 'nulls': 1, 'width': 10}
+    assert stats['moment']['kind'] == 'datetime'
+
+    xls = Excel(file_config, config, results)
+    xls.write_sheets()
+    filepath = xls.close()
+    cells = xlsx_cells(filepath)
+    formats = xlsx_number_formats(filepath)
+
+    assert cells['E2'] == 45292 and 'E4' not in cells
+    assert formats['E2'].lower() == 'yyyy-mm-dd'
+    assert cells['F2'] == 45292
+    assert formats['F2'].lower() == 'yyyy-mm-dd hh:mm:ss'
+
+
+@pytest.mark.parametrize('write_mode', ['streaming', 'fast', 'default'])
+def test_excel_arrow_date_columns(sqlite_excel, write_mode):
+    """Test Arrow date and timestamp columns are written as formatted dates"""
+
+    import pyarrow as pa
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = write_mode
+    df = results['df_final']
+    df['day'] = pd.array(
+        [date(2024, 1, i) for i in range(1, 8)], dtype=pd.ArrowDtype(pa.date32())
+    )
+    df.loc[2, 'day'] = None
+    df['moment'] = df['created'].astype(pd.ArrowDtype(pa.timestamp('us')))
+
+    assert ColumnStats(df)['day'] == {'kind': 'date', 'nulls': 1, 'width': 10}
+
+    xls = Excel(file_config, config, results)
+    xls.write_sheets()
+    filepath = xls.close()
+    cells = xlsx_cells(filepath)
+    formats = xlsx_number_formats(filepath)
+
+    assert cells['E2'] == 45292 and 'E4' not in cells
+    assert formats['E2'].lower() == 'yyyy-mm-dd'
+    assert cells['F2'] == 45292
+    assert formats['F2'].lower() == 'yyyy-mm-dd hh:mm:ss'
+
+
+def test_excel_fast_write_mode(sqlite_excel):
+    """Test columnar writer writes the same cells as DataFrame.to_excel"""
+
+    config, file_config, results = sqlite_excel
+    df = results['df_final']
+    df['flag'] = [True, False, None, True, False, True, False]
+    df['ratio'] = [0.5, float('inf'), -float('inf'), 1, 2, 3, None]
+    df['kind'] = pd.Categorical(['x', 'y', 'x', None, 'y', 'x', 'y'])
+    df.loc[3, 'created'] = pd.NaT
+
+    cells = dict()
+    for write_mode in ['default', 'fast']:
+        file_config = dict(file_config, filename=f'{write_mode}.xlsx')
+        file_config['write_mode'] = write_mode
+        xls = Excel(file_config, config, results)
+        xls.write_sheets()
+        cells[write_mode] = xlsx_cells(xls.close())
+
+    assert cells['fast'] == cells['default']
+    assert cells['fast']['F3'] == 'inf' and 'D5' not in cells['fast']
+
+
+def test_excel_column_stats(sqlite_excel):
+    """Test column statistics of DataFrame with and without sampling"""
+
+    df = sqlite_excel[2]['df_final']
+    stats = ColumnStats(df)
+
+    assert stats['id'] == {'kind': 'integer', 'nulls': 0, 'width': 1}
+    assert stats['name'] == {'kind': 'text', 'nulls': 1, 'width': 1}
+    assert stats['amount'] == {'kind': 'float', 'nulls': 1, 'width': 3}
+    assert stats['created'] == {'kind': 'datetime', 'nulls': 0, 'width': 10}
+    # nulls are counted in all rows with sampling
+    assert ColumnStats(df, sample_size=3).nulls('name') == 1
+
+
+def test_excel_column_stats_shared(sqlite_excel, monkeypatch):
+    """Test statistics are computed once for sheets with the same data_src"""
+
+    calls = []
+
+    def column_width(s, kind=None):
+        calls.append(s.name)
+        return 5
+
+    monkeypatch.setattr('easy_reports.excel.column_width', column_width)
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = 'default'
+    file_config['sheets'][2] = dict(file_config['sheets'][1], sheet_name='dane2')
+    creator = ExcelCreator(config)
+    creator.set_data_results(results)
+    creator.create_file(1, file_config)
+
+    assert sorted(calls) == sorted(results['df_final'].columns)
+
+
+def test_excel_column_width_keeps_format(sqlite_excel):
+    """Test width adjustment does not reset column format"""
+
+    import re
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = 'default'
+    xls = Excel(file_config, config, results)
+    xls.write_sheets()
+    xml = xlsx_sheets(xls.close())['dane']
+
+    col = re.search(r'<col min="3" max="3"[^>]*/>', xml).group()
+    assert 'style=' in col and 'width="9.7' in col
+
+
+def test_excel_parallel_files(sqlite_excel):
+    """Test files written in worker processes match sequentially written"""
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = 'default'
+    file_config['send_email'] = True
+    results['df_other'] = results['df_final'].iloc[::-1].copy()
+    other_config = copy.deepcopy(file_config)
+    other_config['sheets'][1]['data_src'] = 'df_other'
+    other_config['send_email'] = False
+
+    cells = dict()
+    for parallel_files in [1, 2]:
+        config.report_rpt_config = {
+            1: dict(file_config, filename=f'a_{parallel_files}.xlsx'),
+            2: dict(other_config, filename=f'b_{parallel_files}.xlsx'),
+            3: dict(file_config, filename=f'c_{parallel_files}.xlsx'),
+        }
+        creator = ExcelCreator(config)
+        creator.set_data_results(results)
+        creator.run(parallel_files=parallel_files)
+        attachments = creator.get_email_attachments()
+        assert list(attachments) == [1, 3]
+        cells[parallel_files] = [
+            xlsx_cells(
+                config.report_arch_path / config.report_rpt_config[i]['filename']
+            )
+            for i in [1, 2, 3]
+        ]
+
+    assert cells[2] == cells[1]
+    assert cells[2][0] != cells[2][1]
+
+
+def test_excel_parallel_files_logs(sqlite_excel, caplog):
+    """Test log records of worker processes are handled by parent loggers"""
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = 'default'
+    config.report_rpt_config = {
+        1: dict(file_config, filename='a.xlsx'),
+        2: dict(file_config, filename='b.xlsx'),
+    }
+    caplog.set_level(logging.DEBUG, logger='easy_reports_test')
+    creator = ExcelCreator(config, logging.getLogger('easy_reports_test'))
+    creator.set_data_results(results)
+    creator.run(parallel_files=2)
+
+    records = [
+        r for r in caplog.records if r.message == '- appying columns width adjustment'
+    ]
+    assert len(records) == 2
+    assert {r.name for r in records} == {'easy_reports_test'}
+    assert {r.process for r in records}.isdisjoint({os.getpid()})
+
+
+def test_excel_share_frame(tmp_path):
+    """Test DataFrames passed to workers by Arrow IPC or pickle"""
+
+    df = pd.DataFrame({'a': [1, 2], 'b': pd.Categorical(['x', 'y'])}, index=[5, 6])
+    filepath = share_frame(df, tmp_path, 'df')
+    assert filepath.suffix == '.arrow'
+    pd.testing.assert_frame_equal(
+        load_shared_frame(filepath), df.reset_index(drop=True)
+    )
+
+    mixed = pd.DataFrame({'a': [1, 'x']})
+    filepath = share_frame(mixed, tmp_path, 'mixed')
+    assert filepath.suffix == '.pkl'
+    pd.testing.assert_frame_equal(load_shared_frame(filepath), mixed)
@@ -0,0 +1,78 @@
+import copy
+
+import pytest
+import xlsxwriter
+
+from easy_reports.excel import Excel
+from easy_reports.formats import FormatRegistry, FormatPlan
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    workbook = xlsxwriter.Workbook(tmp_path / 'formats.xlsx')
+    yield workbook
+    workbook.close()
+
+
+def test_formats_registry_dedup(workbook):
+    """Test equal format definitions share one workbook format"""
+
+    formats = FormatRegistry(workbook, {'integer': {'num_format': '#,##0'}})
+
+    fmt = formats.add({'num_format': '#,##0'})
+    assert fmt is formats['integer']['format_obj']
+    assert formats.add({'bold': True, 'border': 1}) is formats.add(
+        {'border': 1, 'bold': True}
+    )
+    assert formats.count == 2
+    assert formats.format_obj('integer') is fmt
+    assert formats.format_obj('missing') is None
+
+
+def test_formats_plan(workbook):
+    """Test rules of sheet config matched by range, pattern and header"""
+
+    formats = FormatRegistry(workbook, {'decimal': {'num_format': '#,##0.0'}})
+    plan = FormatPlan(
+        {
+            'column_formats': {
+                'A:B': {'bold': True},
+                'amount_*': 'decimal',
+                'name': {'italic': True},
+            },
+            'column_options': {'C:C': {'hidden': True}, 'amount_*': {'level': 1}},
+            'header_formats': {'*': 'header_wrap', 'name': {'bold': True}},
+        },
+        formats,
+    )
+
+    assert plan.column_format(0, 'name') == {'bold': True, 'italic': True}
+    assert plan.column_format(2, 'amount_pln') == {'num_format': '#,##0.0'}
+    assert plan.column_format(3, 'other') == {}
+    # options match only ranges and exact headers
+    assert plan.column_options(2, 'amount_pln') == {'hidden': True}
+    assert plan.column_options(3, 'other') == {}
+    assert plan.header_format('name') == {'bold': True}
+    assert plan.header_format('other') == 'header_wrap'
+
+
+def test_formats_excel_scoped(sqlite_excel):
+    """Test formats are kept per workbook and config is not changed"""
+
+    config, file_config, results = sqlite_excel
+    file_config['write_mode'] = 'default'
+    file_config['sheets'][1]['conditional_formats'] = {
+        'amount': {'type': 'cell', 'criteria': '>', 'value': 3, 'format': {'bold': 1}}
+    }
+    expected = copy.deepcopy(file_config)
+
+    registries = []
+    for i in range(2):
+        xls = Excel(dict(file_config, filename=f'{i}.xlsx'), config, results)
+        xls.write_sheets()
+        xls.close()
+        registries.append(xls.formats)
+
+    assert file_config == expected
+    assert registries[0] is not registries[1]
+    assert registries[0].count == registries[1].count
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.errors import MergeError
+from easy_reports.join import JoinPlanner
+
+
+def merge_loop(df_list):
+    """Reference result of chained left pd.merge"""
+    df = df_list[0][0]
+    for right, keys in df_list[1:]:
+        if keys is not None:
+            df = pd.merge(df, right, how='left', on=keys)
+    return df
+
+
+@pytest.fixture
+def df_list():
+    base = pd.DataFrame(
+        {
+            'id': [1, 2, 3, 4, 5],
+            'country': ['PL', 'DE', 'PL', None, 'FR'],
+            'value': [1.0, 2.0, 3.0, 4.0, 5.0],
+        }
+    )
+    users = pd.DataFrame(
+        {'id': [3, 1, 2, 9], 'name': ['c', 'a', 'b', 'z'], 'age': [3, 1, 2, 9]}
+    )
+    countries = pd.DataFrame(
+        {
+            'country': ['PL', 'DE', None],
+            'value': [10, 20, 30],
+            'capital': ['W', 'B', '?'],
+        }
+    )
+    pairs = pd.DataFrame({'id': [1, 3], 'country': ['PL', 'PL'], 'flag': [True, False]})
+    return [
+        [base, None],
+        [users, ['id']],
+        [countries, ['country']],
+        [pd.DataFrame({'x': [1]}), None],
+        [pairs, ['id', 'country']],
+    ]
+
+
+def test_join_planner_matches_merge_loop(df_list):
+    expected = merge_loop(df_list)
+    df = JoinPlanner().join(df_list)
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_join_planner_duplicated_keys_fallback_to_merge(df_list):
+    df_list[1][0] = pd.concat([df_list[1][0], df_list[1][0].head(1)])
+    expected = merge_loop(df_list)
+    df = JoinPlanner().join(df_list)
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(df) == 6
+
+
+def test_join_planner_key_from_joined_dataframe(df_list):
+    df_list.append([pd.DataFrame({'name': ['a', 'b'], 'score': [7, 8]}), ['name']])
+    expected = merge_loop(df_list)
+    df = JoinPlanner().join(df_list)
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_join_planner_options(df_list):
+    options = [{}, {'how': 'inner'}, {'suffixes': ('', '_country')}, {}, {}]
+    df = JoinPlanner().join(df_list, options)
+
+    assert df['id'].tolist() == [1, 2, 3]
+    assert 'value' in df.columns and 'value_country' in df.columns
+
+
+def test_join_planner_validate_and_max_expansion(df_list):
+    df_list[1][0] = pd.concat([df_list[1][0], df_list[1][0].head(1)])
+
+    with pytest.raises(MergeError):
+        JoinPlanner().join(df_list, [{}, {'validate': 'm:1'}, {}, {}, {}])
+
+    with pytest.raises(ValueError, match='expands rows'):
+        JoinPlanner(max_expansion=1.1).join(df_list)
+
+    # 6 / 5 rows is within limit
+    JoinPlanner(max_expansion=1.2).join(df_list)
+
+
+def test_join_planner_mismatched_key_dtypes():
+    base = pd.DataFrame({'id': [1, 2, 3], 'a': [1, 2, 3]})
+    right = pd.DataFrame({'id': ['1', '3'], 'b': ['x', 'y']})
+    df = JoinPlanner().join([[base, None], [right, ['id']]])
+
+    assert df['b'].tolist()[0] == 'x'
+    assert pd.isna(df['b'].tolist()[1])
+    assert df['id'].tolist() == [1, 2, 3]
+
+
+def test_join_planner_large_random_matches_merge_loop():
+    rng = np.random.default_rng(0)
+    base = pd.DataFrame(
+        {'k1': rng.integers(0, 50, 1000), 'k2': rng.integers(0, 5, 1000)}
+    )
+    df_list = [[base, None]]
+    for i in range(5):
+        keys = ['k1', 'k2'] if i % 2 else ['k1']
+        right = pd.DataFrame({'k1': np.arange(40), 'k2': np.arange(40) % 5})
+        right[f'v{i}'] = rng.random(40)
+        # same column in two joins is suffixed
+        right['v'] = i
+        df_list.append([right[keys + [f'v{i}'] + (['v'] if i < 2 else [])], keys])
+
+    pd.testing.assert_frame_equal(JoinPlanner().join(df_list), merge_loop(df_list))
+
+
+def test_join_planner_duplicate_columns_error(df_list):
+    df_list[2][0] = df_list[2][0].rename(columns={'capital': 'name_x'})
+    df_list[2][0]['name'] = 'n'
+
+    with pytest.raises(MergeError):
+        merge_loop(df_list)
+    with pytest.raises(MergeError):
+        JoinPlanner().join(df_list)
@@ -0,0 +1,184 @@
+import json
+import time
+import logging
+
+from click.testing import CliRunner
+
+from easy_reports.cli import cli
+from easy_reports.email import EmailCreator
+from easy_reports.outbox import Outbox
+
+
+def put_emails(config, outbox, attachments=None):
+    email = EmailCreator(
+        config=config,
+        logger=logging.getLogger('dummy'),
+        attachments=attachments or {},
+        outbox=outbox,
+    )
+    email.run()
+
+
+def test_outbox_put_and_send(email_config, smtp_server, tmp_path):
+    """Test emails are only written to outbox and sent by worker once"""
+
+    (tmp_path / 'report.csv').write_text('a,b\n1,2\n')
+    outbox = Outbox(tmp_path / 'outbox')
+    attachments = {1: tmp_path / 'report.csv'}
+    put_emails(email_config, outbox, attachments)
+    put_emails(email_config, outbox, attachments)
+
+    assert smtp_server.messages == []
+    assert len(outbox.entries('pending')) == 3
+    entry = json.loads(outbox.entries('pending')[0].read_text())
+    assert entry['report'] == 'SQLITE'
+    assert entry['attachments'] == [str(tmp_path / 'report.csv')]
+
+    stats = outbox.send(email_config, batch_size=2)
+
+    assert stats == {'sent': 3, 'retried': 0, 'failed': 0}
+    assert sorted(m['to'][0] for m in smtp_server.messages) == [
+        f'to{i}@example.com' for i in range(1, 4)
+    ]
+    assert smtp_server.connections == 1
+    assert len(outbox.entries('sent')) == 3
+    assert outbox.entries('pending') == outbox.entries('processing') == []
+
+    # already sent emails are not added again
+    put_emails(email_config, outbox, attachments)
+    assert outbox.entries('pending') == []
+
+
+def test_outbox_changed_attachment(email_config, smtp_server, tmp_path):
+    """Test email with rewritten attachment is added again"""
+
+    filepath = tmp_path / 'report.csv'
+    filepath.write_text('a,b\n1,2\n')
+    outbox = Outbox(tmp_path / 'outbox')
+    put_emails(email_config, outbox, {1: filepath})
+    filepath.write_text('a,b\n1,2\n3,4\n')
+    put_emails(email_config, outbox, {1: filepath})
+
+    assert len(outbox.entries('pending')) == 6
+
+
+def test_outbox_missing_attachment(email_config, smtp_server, tmp_path):
+    """Test email with missing attachment file is not added"""
+
+    outbox = Outbox(tmp_path / 'outbox')
+    put_emails(email_config, outbox, {1: tmp_path / 'missing.csv'})
+
+    assert outbox.entries('pending') == []
+
+
+def test_outbox_retry(email_config, smtp_server, tmp_path):
+    """Test not sent emails are retried and moved to failed"""
+
+    email_config.email_port = smtp_server.port
+    smtp_server.shutdown()
+    smtp_server.server_close()
+    outbox = Outbox(tmp_path / 'outbox', max_attempts=2, retry_delay=0)
+    put_emails(email_config, outbox)
+
+    # email is tried once per send call, even without retry delay
+    assert outbox.send(email_config) == {'sent': 0, 'retried': 3, 'failed': 0}
+    assert len(outbox.entries('pending')) == 3
+
+    stats = outbox.send(email_config)
+
+    assert stats == {'sent': 0, 'retried': 0, 'failed': 3}
+    assert len(outbox.entries('failed')) == 3
+    entry = json.loads(outbox.entries('failed')[0].read_text())
+    assert entry['attempts'] == 2 and entry['error']
+
+    # failed email can be added again
+    put_emails(email_config, outbox)
+    assert len(outbox.entries('pending')) == 3
+    assert outbox.entries('failed') == []
+
+
+def test_outbox_backoff(email_config, tmp_path):
+    """Test retry delay is doubled after each attempt"""
+
+    outbox = Outbox(tmp_path / 'outbox', retry_delay=10)
+    put_emails(email_config, outbox)
+    now = time.time()
+
+    entry = outbox.claim(limit=1, now=now)[0]
+    outbox.retry(entry, 'error', now=now)
+    assert entry['next_attempt'] == now + 10
+    assert [e['id'] for e in outbox.claim(now=now)] != [entry['id']]
+    assert len(outbox.entries('pending')) == 1
+
+    assert outbox.claim(now=now + 10)[0]['id'] == entry['id']
+    outbox.retry(entry, 'error', now=now + 10)
+    assert entry['next_attempt'] == now + 30
+
+
+def test_outbox_recover(email_config, tmp_path):
+    """Test emails left in processing are returned to pending"""
+
+    outbox = Outbox(tmp_path / 'outbox')
+    put_emails(email_config, outbox)
+    assert len(outbox.claim()) == 3
+
+    assert outbox.recover() == 0
+    assert outbox.recover(stale_after=0) == 3
+    assert len(outbox.entries('pending')) == 3
+
+
+def test_outbox_recover_skips_recently_claimed(email_config, tmp_path):
+    """Test email queued long ago is not recovered right after claim"""
+
+    import os
+
+    outbox = Outbox(tmp_path / 'outbox')
+    put_emails(email_config, outbox)
+    queued = time.time() - 2 * 3600
+    for filepath in outbox.entries('pending'):
+        os.utime(filepath, (queued, queued))
+
+    assert len(outbox.claim(limit=1)) == 1
+    assert outbox.recover() == 0
+    assert len(outbox.entries('processing')) == 1
+
+
+def test_outbox_claim_skips_taken(email_config, tmp_path, monkeypatch):
+    """Test email claimed by other worker after listing is skipped"""
+
+    outbox = Outbox(tmp_path / 'outbox')
+    put_emails(email_config, outbox)
+    entries = outbox.entries('pending')
+    taken = entries[0]
+    taken.replace(outbox.path / 'processing' / taken.name)
+    monkeypatch.setattr(outbox, 'entries', lambda state='pending': entries)
+
+    claimed = outbox.claim()
+
+    assert [e['id'] for e in claimed] == [e.stem for e in entries[1:]]
+
+
+def test_outbox_config(email_config, tmp_path):
+    """Test outbox of report config"""
+
+    email_config.report_outbox = True
+    email_config.report_outbox_path = tmp_path / 'outbox'
+    put_emails(email_config, None)
+
+    assert len(list((tmp_path / 'outbox' / 'pending').glob('*.json'))) == 3
+
+
+def test_outbox_cli(email_config, smtp_server, tmp_path, monkeypatch):
+    """Test send-outbox command sends emails of configured outbox"""
+
+    put_emails(email_config, Outbox(tmp_path / 'outbox'))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('EASY_REPORTS_OUTBOX_BASE_PATH', str(tmp_path / 'outbox'))
+    monkeypatch.setenv('EASY_REPORTS_EMAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('EASY_REPORTS_EMAIL_PORT', str(smtp_server.port))
+
+    result = CliRunner().invoke(cli, ['send-outbox', '--batch-size', '2'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Sent 3, retried 0, failed 0' in result.output
+    assert len(smtp_server.messages) == 3
@@ -0,0 +1,145 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from easy_reports.data import DataCreator
+from easy_reports.processors import processor, ProcessorGraph, used_results
+
+
+def sheets(*data_src):
+    return {1: {'sheets': {i: {'data_src': name} for i, name in enumerate(data_src)}}}
+
+
+@pytest.fixture
+def data(sqlite_config):
+    data = DataCreator(config=sqlite_config)
+    data.results['df_final'] = pd.DataFrame({'value': [1, 2, 3]})
+    return data
+
+
+def test_processors_processor_decorator():
+    """Test decorator works with and without declaration"""
+
+    @processor
+    def p01(self):
+        return {}
+
+    @processor(inputs=['df_final'], outputs=['df_result'])
+    def p02(self):
+        return {}
+
+    assert p01.__processor__ and p01.__outputs__ is None
+    assert p02.__inputs__ == ['df_final'] and p02.__outputs__ == ['df_result']
+
+
+def test_processors_used_results():
+    assert used_results(sheets('df_final', 'df_total')) == {'df_final', 'df_total'}
+
+
+def test_processors_dependency_order(data):
+    """Test processor runs after processor returning its input"""
+
+    @processor(inputs=['df_double'], outputs=['df_total'])
+    def a_total(self):
+        return {'df_total': self.results['df_double'].sum().to_frame()}
+
+    @processor(inputs=['df_final'], outputs=['df_double'])
+    def b_double(self):
+        return {'df_double': self.results['df_final'] * 2}
+
+    data.config.report_rpt_config = sheets('df_total')
+    data.run_processors([a_total, b_double])
+
+    assert data.results['df_total'].iloc[0, 0] == 12
+
+
+def test_processors_prune_unused(data):
+    """Test declared processor with unused outputs is skipped"""
+
+    calls = []
+
+    @processor(inputs=['df_final'], outputs=['df_unused'])
+    def p01(self):
+        calls.append('p01')
+        return {'df_unused': self.results['df_final']}
+
+    @processor(inputs=['df_final'], outputs=['df_used'])
+    def p02(self):
+        calls.append('p02')
+        return {'df_used': self.results['df_final']}
+
+    @processor
+    def p03(self):
+        calls.append('p03')
+        return {}
+
+    data.config.report_rpt_config = sheets('df_used')
+    data.run_processors([p03, p01, p02])
+    assert calls == ['p03', 'p02']
+
+    # processors followed by undeclared one are never skipped
+    calls.clear()
+    data.run_processors([p01, p02, p03])
+    assert sorted(calls) == ['p01', 'p02', 'p03'] and calls[-1] == 'p03'
+
+    calls.clear()
+    data.run_processors([p03, p01, p02], prune_processors=False)
+    assert sorted(calls) == ['p01', 'p02', 'p03']
+
+
+def test_processors_parallel(data):
+    """Test independent processors run concurrently"""
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    @processor(inputs=['df_final'], outputs=['df_a'])
+    def p01(self):
+        barrier.wait()
+        return {'df_a': self.results['df_final']}
+
+    @processor(inputs=['df_final'], outputs=['df_b'])
+    def p02(self):
+        barrier.wait()
+        return {'df_b': self.results['df_final']}
+
+    data.config.report_rpt_config = sheets('df_a', 'df_b')
+    data.run_processors([p01, p02], parallel_processors=2)
+
+    assert 'df_a' in data.results and 'df_b' in data.results
+
+
+def test_processors_dependency_cycle():
+    @processor(inputs=['df_b'], outputs=['df_a'])
+    def p01(self):
+        return {}
+
+    @processor(inputs=['df_a'], outputs=['df_b'])
+    def p02(self):
+        return {}
+
+    with pytest.raises(ValueError, match='cycle'):
+        ProcessorGraph([p01, p02])
+
+
+def test_processors_cache(data):
+    """Test cached outputs are reused until input changes"""
+
+    calls = []
+
+    @processor(inputs=['df_final'], outputs=['df_total'], cache=True)
+    def p01(self):
+        calls.append('p01')
+        return {'df_total': self.results['df_final'].sum().to_frame('total')}
+
+    data.config.report_rpt_config = sheets('df_total')
+    data.run_processors([p01])
+    data.run_processors([p01])
+    assert calls == ['p01']
+    assert data.results['df_total']['total'].tolist() == [6]
+
+    data.results['df_final'] = pd.DataFrame({'value': [1, 2, 4]})
+    data.run_processors([p01])
+    assert calls == ['p01', 'p01']
+    assert data.results['df_total']['total'].tolist() == [7]
+    assert len(list((data.config.report_cache_path / 'processors').glob('*'))) == 2
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from easy_reports.data import DataCreator
+from easy_reports.profiling import STAGES
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    [{}, {'parallel_queries': 2}, {'stream_results': True}, {'fetch_mode': 'arrow'}],
+)
+def test_profiling_query_profile(sqlite_config, kwargs):
+    """Test each sql_list query gets stage timings and sizes"""
+
+    data = DataCreator(config=sqlite_config, **kwargs)
+    data.run(**kwargs)
+
+    assert list(data.profile) == ['users', 'levels']
+    for name, entry in data.profile.items():
+        assert entry['db_alias'] == 'sqlite'
+        assert entry['rows'] == 4 and entry['columns'] == 3
+        assert entry['cache_bytes'] > 0
+        assert entry['execute'] > 0 and entry['fetch'] > 0
+        assert sum(entry[stage] for stage in STAGES) <= entry['total']
+        if kwargs.get('stream_results'):
+            assert entry['memory_bytes'] is None
+        else:
+            assert entry['memory_bytes'] > 0 and entry['cache_write'] > 0
+
+
+def test_profiling_write_profile(sqlite_config, tmp_path):
+    """Test profiles are written as JSON lines"""
+
+    data = DataCreator(config=sqlite_config)
+    data.run()
+    filepath = data.write_profile(tmp_path / 'run_profile.jsonl', report='SQLITE')
+
+    lines = [json.loads(line) for line in filepath.read_text().splitlines()]
+    assert [line['query'] for line in lines] == ['users', 'levels']
+    assert all(line['report'] == 'SQLITE' for line in lines)
+
+    data = DataCreator(config=sqlite_config, from_cache=True)
+    data.run()
+    assert data.write_profile(tmp_path / 'cache_profile.jsonl') is None
+
+
+def test_profiling_sql_to_df_uses_read_sql(sqlite_config):
+    """Test profiled sql_to_df returns pd.read_sql DataFrame"""
+
+    import pandas as pd
+    from sqlalchemy import text
+    from easy_reports.engines import registry
+
+    data = DataCreator(config=sqlite_config)
+    sql = text('select id, name, age from users')
+    with registry.connect(sqlite_config.report_db_list['sqlite']) as conn:
+        listeners = len(conn.dispatch.before_cursor_execute)
+        with data.profiler.query('users'):
+            df = data.sql_to_df(sql, conn)
+        pd.testing.assert_frame_equal(df, pd.read_sql(sql, con=conn))
+        # timing listeners are removed
+        assert len(conn.dispatch.before_cursor_execute) == listeners
+
+    entry = data.profile['users']
+    assert entry['execute'] > 0 and entry['fetch'] > 0
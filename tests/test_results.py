@@ -0,0 +1,85 @@
+import pandas as pd
+
+from easy_reports.data import DataCreator
+from easy_reports.excel import ExcelCreator
+from easy_reports.processors import processor
+from easy_reports.results import LazyResult, ResultsStore
+
+
+def test_results_lazy_result():
+    """Test lazy result is loaded once on first access"""
+
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return pd.DataFrame({'a': [1]})
+
+    results = ResultsStore()
+    results['df_a'] = LazyResult(loader)
+    results['df_b'] = [LazyResult(loader), ['a']]
+    assert not results.is_loaded('df_a') and calls == []
+
+    assert results['df_a']['a'].tolist() == [1]
+    assert results['df_b'][1] == ['a']
+    assert results['df_a'] is results['df_a']
+    assert results.is_loaded('df_a') and len(calls) == 2
+
+
+def test_results_release():
+    """Test result is unloaded after last consumer, backed one stays lazy"""
+
+    results = ResultsStore()
+    results['df_a'] = pd.DataFrame({'a': [1]})
+    results['df_b'] = [pd.DataFrame({'b': [1]}), ['b']]
+    results['df_c'] = pd.DataFrame({'c': [1]})
+    results.back('df_b', lambda: pd.DataFrame({'b': [2]}))
+    for name in ['df_a', 'df_b']:
+        results.retain(name, 2)
+
+    results.release('df_a')
+    results.release('df_b')
+    assert results.is_loaded('df_a') and results.is_loaded('df_b')
+
+    results.release('df_a')
+    results.release('df_b')
+    results.release('df_c')
+    assert 'df_a' not in results
+    assert not results.is_loaded('df_b')
+    assert results['df_b'][0]['b'].tolist() == [2]
+    # results without consumers are kept
+    assert results.is_loaded('df_c')
+
+
+def test_results_released_during_report_run(sqlite_config):
+    """Test raw results are unloaded after merge and outputs after sheets"""
+
+    @processor(inputs=['df_final'], outputs=['df_adults'])
+    def p01(self):
+        df = self.results['df_final']
+        return {'df_adults': df[df['age'] >= 18]}
+
+    sqlite_config.report_rpt_config = {
+        1: {
+            'filename': 'adults.xlsx',
+            'sheets': {1: {'sheet_name': 'Adults', 'data_src': 'df_adults'}},
+        }
+    }
+    sqlite_config.report_arch_path.mkdir(parents=True, exist_ok=True)
+    data = DataCreator(config=sqlite_config)
+    data.track_consumers([p01])
+    data.run()
+    results = data.get_results()
+    assert not results.is_loaded('df_users') and not results.is_loaded('df_levels')
+
+    data.run_processors([p01])
+    assert not results.is_loaded('df_final')
+    assert results.is_loaded('df_adults')
+
+    excel = ExcelCreator(config=sqlite_config)
+    excel.set_data_results(results)
+    excel.run()
+    assert 'df_adults' not in results
+    # unloaded results can be read again from cache
+    assert len(results['df_users'][0]) == 4
+    assert len(results['df_final']) == 4
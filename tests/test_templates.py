@@ -0,0 +1,33 @@
+import os
+from datetime import date
+
+from easy_reports import templates
+from easy_reports.templates import Template, load_template
+
+
+def test_templates_render():
+    """Test placeholders replaced in one pass, longer names first"""
+
+    template = Template('@total / @total_pln @name {date} @missing')
+    text = template.render(
+        {'total': 10, 'total_pln': '@name', 'name': 'R001'}, today=date(2024, 1, 2)
+    )
+
+    assert text == '10 / @name R001 2024-01-02 @missing'
+    assert templates.render('{date}', today=date(2024, 1, 2)) == '2024-01-02'
+
+
+def test_templates_load_template(tmp_path):
+    """Test template file is read once and again after change"""
+
+    filepath = tmp_path / 'email.html'
+    filepath.write_text('<p>@name</p>', encoding='UTF8')
+
+    template = load_template(filepath)
+    assert load_template(filepath) is template
+    assert template.render({'name': 'R001'}) == '<p>R001</p>'
+
+    filepath.write_text('<p>@name changed</p>', encoding='UTF8')
+    stat = filepath.stat()
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_template(filepath).render({'name': 'R001'}) == '<p>R001 changed</p>'
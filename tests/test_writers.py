@@ -0,0 +1,136 @@
+import copy
+import zipfile
+
+import pandas as pd
+import pytest
+
+from easy_reports.email_smtplib import SMTPSessionPool
+from easy_reports.excel import ExcelCreator, get_writer, Excel
+from easy_reports.writers import CsvWriter, ParquetWriter, TableWriter
+
+
+@pytest.fixture
+def writer_config(sqlite_excel):
+    config, file_config, results = sqlite_excel
+    file_config = copy.deepcopy(file_config)
+    file_config['write_mode'] = 'default'
+    file_config['send_email'] = True
+    file_config['filename'] = 'report_{date}.xlsx'
+    return config, file_config, results
+
+
+def create_file(config, file_config, results, **kwargs):
+    creator = ExcelCreator(config)
+    creator.set_data_results(results)
+    filepath = creator.create_file(1, file_config, **kwargs)
+    assert creator.get_email_attachments()[1] == filepath
+    return filepath
+
+
+def test_writers_get_writer():
+    """Test writer class is selected by format, xlsx by default"""
+
+    assert get_writer({}) is Excel
+    assert get_writer({'format': 'tsv'}) is CsvWriter
+    assert get_writer({'format': 'parquet'}) is ParquetWriter
+    with pytest.raises(ValueError, match='Unknown file format'):
+        get_writer({'format': 'ods'})
+
+
+def test_writers_abstract(writer_config):
+    """Test writer without write_frame can not be created"""
+
+    class Writer(TableWriter):
+        pass
+
+    with pytest.raises(TypeError, match='write_frame'):
+        Writer(*writer_config)
+
+
+@pytest.mark.parametrize(
+    'file_format, compression, suffix, sep',
+    [
+        ('csv', None, '.csv', ','),
+        ('tsv', None, '.tsv', '\t'),
+        ('csv', 'gzip', '.csv.gz', ','),
+    ],
+)
+def test_writers_csv(writer_config, file_format, compression, suffix, sep):
+    """Test sheet written to CSV file named as report file"""
+
+    config, file_config, results = writer_config
+    file_config.update(format=file_format, compression=compression)
+    filepath = create_file(config, file_config, results)
+
+    assert filepath.name.endswith(suffix) and filepath.name.startswith('report_')
+    df = pd.read_csv(filepath, sep=sep, parse_dates=['created'])
+    pd.testing.assert_frame_equal(df, results['df_final'], check_dtype=False)
+
+
+def test_writers_zip(writer_config):
+    """Test CSV files of all sheets are put in one zip archive"""
+
+    config, file_config, results = writer_config
+    file_config.update(format='csv', compression='zip')
+    file_config['sheets'][2] = dict(
+        file_config['sheets'][1], sheet_name='ids', output_columns=['id']
+    )
+    filepath = create_file(config, file_config, results)
+
+    assert filepath.suffixes == ['.csv', '.zip']
+    with zipfile.ZipFile(filepath) as z:
+        names = z.namelist()
+        with z.open(names[1]) as f:
+            assert pd.read_csv(f)['id'].tolist() == list(range(1, 8))
+    stem = filepath.name[: -len('.csv.zip')]
+    assert names == [f'{stem}_dane.csv', f'{stem}_ids.csv']
+
+
+def test_writers_parquet(writer_config):
+    """Test sheet written to Parquet file"""
+
+    config, file_config, results = writer_config
+    file_config.update(format='parquet', compression='gzip')
+    filepath = create_file(config, file_config, results)
+
+    assert filepath.suffix == '.parquet'
+    pd.testing.assert_frame_equal(pd.read_parquet(filepath), results['df_final'])
+
+
+def test_writers_csv_fallback(writer_config):
+    """Test sheet over row threshold is written to compressed CSV"""
+
+    config, file_config, results = writer_config
+    file_config['sheets'][2] = dict(
+        file_config['sheets'][1], sheet_name='small', data_src='df_small'
+    )
+    results['df_small'] = results['df_final'].head(2)
+    filepaths = create_file(config, file_config, results, csv_fallback_rows=5)
+
+    assert [p.suffixes[-2:] for p in filepaths] == [['.xlsx'], ['.csv', '.gz']]
+    assert filepaths[1].name.endswith('_dane.csv.gz')
+    assert len(pd.read_csv(filepaths[1])) == 7
+
+    # excel without sheets is not kept
+    del file_config['sheets'][2]
+    filepath = create_file(config, file_config, results, csv_fallback_rows=5)
+    assert filepath.name.endswith('_dane.csv.gz')
+    assert not (config.report_arch_path / filepaths[0].name).exists()
+
+
+def test_writers_csv_fallback_parallel(writer_config):
+    """Test run kwargs are passed to files written in worker processes"""
+
+    config, file_config, results = writer_config
+    config.report_rpt_config = {
+        1: dict(file_config, filename='a.xlsx'),
+        2: dict(file_config, filename='b.xlsx', send_email=False),
+    }
+    creator = ExcelCreator(config)
+    creator.set_data_results(results)
+    creator.run(parallel_files=2, csv_fallback_rows=5, smtp_pool=SMTPSessionPool())
+
+    filepath = creator.get_email_attachments()[1]
+    assert filepath.name == 'a_dane.csv.gz'
+    assert len(pd.read_csv(filepath)) == 7
+    assert not (config.report_arch_path / 'a.xlsx').exists()